@@ -1,156 +1,717 @@
+import copy
+import threading
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import StandardScaler
-from typing import List, Dict
+from typing import List, Dict, Tuple, NamedTuple
+from backend.database import MusicDatabase
+from backend import model_store
+from backend.metrics import phase, timed
+from backend.catalog import Catalog, AUDIO_FEATURES, search_sorted
+from backend.cache import ResultCache, cached
+from backend.collaborative import (ItemItemCF, ImplicitALS, build_rating_matrix, item_user_scores,
+                                   als_user_scores)
+from backend.neighbor_index import NeighborIndex, top_k_rows
+from backend.user_profiles import UserProfileStore, normalized_audio
+
+MAX_TEXT_FEATURES = 1000
+
+# Drift since the last full fit that triggers a background refit
+MAX_OOV_RATE = 0.2
+MAX_MEAN_SHIFT = 0.25
+MAX_VARIANCE_RATIO = 2.0
+
+# Collaborative filtering is refit once this share of ratings arrived since the last fit
+CF_REFIT_FRACTION = 0.1
+
+# User ids of a collaborative model fitted without ratings
+NO_USERS = np.empty(0, dtype=object)
+
+# Full refits attempted in a row while catalog updates keep invalidating them
+MAX_REFIT_ATTEMPTS = 3
+
+class ModelState(NamedTuple):
+    """Catalog and the models fitted on it, replaced as one snapshot
+    
+    Updates build a new state beside the current one and swap it in with a
+    single assignment, so a reader holding a state never sees a catalog and
+    matrices (or a neighbor index) of different sizes.
+    """
+    catalog: Catalog = None
+    tfidf: TfidfVectorizer = None
+    tfidf_matrix: sparse.csr_matrix = None
+    feature_matrix: np.ndarray = None
+    scaler: StandardScaler = None
+    neighbor_index: NeighborIndex = None
+    catalog_version: str = None
+    model_version: str = None
+    
+    def rows_for_ids(self, song_ids) -> np.ndarray:
+        """Catalog row of each song id (-1 for unknown ids)"""
+        return self.catalog.rows_for_ids(song_ids)
+    
+    @property
+    def audio_vectors(self) -> np.ndarray:
+        """L2-normalized audio rows; the neighbor index keeps them, so they are not recomputed per request"""
+        if self.neighbor_index is not None:
+            return self.neighbor_index.audio_vectors
+        return normalized_audio(self.feature_matrix)
+
+class _StateField:
+    """Engine attribute backed by a field of its current ModelState"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, engine, owner=None):
+        return self if engine is None else getattr(engine.state, self.name)
+    
+    def __set__(self, engine, value):
+        engine.state = engine.state._replace(**{self.name: value})
+
+def _is_mapped(array) -> bool:
+    """Whether an array is (a view of) a memory-mapped file"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
 
 class AIRecommendationEngine:
     """Core AI engine for music recommendations"""
     
-    def __init__(self, database: MusicDatabase):
+    catalog = _StateField()
+    tfidf = _StateField()
+    tfidf_matrix = _StateField()
+    feature_matrix = _StateField()
+    scaler = _StateField()
+    neighbor_index = _StateField()
+    catalog_version = _StateField()
+    model_version = _StateField()
+    
+    def __init__(self, database: MusicDatabase, neighbor_k: int = 20, neighbor_method: str = 'auto',
+                 artifact_dir: str = None, cf_method: str = 'item', cf_weight: float = 0.3,
+                 cache_size: int = 1024, cache_ttl: float = 300.0, catalog: Catalog = None,
+                 compact: bool = False, neighbor_memory_budget: int = None, neighbor_workers: int = 1):
         self.db = database
-        self.songs_df = None
-        self.tfidf_matrix = None
-        self.feature_matrix = None
-        self.scaler = StandardScaler()
+        # Compact mode keeps float32 matrices and a catalog without the DataFrame
+        self.compact = compact
+        # A catalog already loaded by the caller (e.g. the GUI) is reused while it is current
+        self.state = ModelState(catalog=catalog, scaler=StandardScaler())
+        self.neighbor_k = neighbor_k
+        self.neighbor_method = neighbor_method
+        # Exact similarity is scored in tiles within this many bytes, on this many processes
+        self.neighbor_memory_budget = neighbor_memory_budget
+        self.neighbor_workers = neighbor_workers
+        self.artifact_dir = artifact_dir
+        self._feature_buffer = None
+        self._drift = None
+        self._update_lock = threading.RLock()
+        self._refit_thread = None
+        self.profiles = UserProfileStore(self)
+        # Taste vectors are stored per database: one engine folds each rating in
+        self.db.add_rating_listener(self.profiles.on_rating, key='user_taste')
+        if cf_method not in ('item', 'als'):
+            raise ValueError(f"Unknown collaborative filtering method: {cf_method}")
+        self.cf_method = cf_method
+        self.cf_weight = cf_weight
+        self._cf_state = {}
+        self._cf_new_ratings = 0
+        # Serializes the start of collaborative refits across request threads
+        self._cf_lock = threading.Lock()
+        self._cf_thread = None
+        self.db.add_rating_listener(self._on_rating_for_cf)
+        self.db.add_ratings_import_listener(self._on_ratings_imported)
+        
+        # Results only change with the catalog, the models or a user's own ratings
+        self.cache = ResultCache(cache_size, cache_ttl) if cache_size > 0 else None
+        if self.cache is not None:
+            self.db.add_rating_listener(self._on_rating_for_cache, after_commit=True)
+            self.db.add_catalog_listener(self.cache.clear)
         self.load_data()
     
-    def load_data(self):
-        """Load and preprocess music data"""
-        self.songs_df = self.db.get_all_songs()
-        if len(self.songs_df) == 0:
-            return
+    def close(self):
+        """Detach from the database so it no longer updates (or keeps alive) this engine"""
+        self.db.remove_rating_listener(self.profiles.on_rating)
+        self.db.remove_rating_listener(self._on_rating_for_cf)
+        self.db.remove_ratings_import_listener(self._on_ratings_imported)
+        if self.cache is not None:
+            self.db.remove_rating_listener(self._on_rating_for_cache)
+            self.db.remove_catalog_listener(self.cache.clear)
+    
+    @property
+    def data_version(self):
+        """Version of the data behind cached results"""
+        state = self.state
+        return state.catalog_version, state.model_version, self._cf_state.get('version')
+    
+    @property
+    def songs_df(self) -> pd.DataFrame:
+        """Songs table behind the catalog"""
+        return None if self.catalog is None else self.catalog.frame
+    
+    @timed
+    def load_data(self, force_refit: bool = False):
+        """Load and preprocess music data
         
-        # Create text features for content-based filtering
-        self.songs_df['text_features'] = (
-            self.songs_df['genre'] + ' ' + 
-            self.songs_df['artist'] + ' ' + 
-            self.songs_df['year'].astype(str)
-        )
+        When an artifact directory is configured and holds models fitted for the
+        current catalog version, they are memory-mapped instead of refitted.
+        The models are loaded on a shadow copy and swapped in once complete.
+        """
+        with self._update_lock:
+            shadow = copy.copy(self)
+            shadow._load_models(force_refit)
+            self._adopt(shadow)
+    
+    def _adopt(self, shadow: 'AIRecommendationEngine'):
+        """Take over the models a shadow copy loaded (hold _update_lock)"""
+        self._feature_buffer = shadow._feature_buffer
+        self._drift = shadow._drift
+        self.state = shadow.state
+    
+    def _load_models(self, force_refit: bool = False):
+        """Read the catalog and load or fit its models, one attribute at a time (shadow copies only)"""
+        with phase('load_data.sql_read'):
+            # Read the version first: a concurrent write then only makes the artifact look stale
+            self.catalog_version = self.db.get_catalog_version()
+            if (self.catalog is None or self.catalog.version != self.catalog_version
+                    or self.catalog.compact != self.compact):
+                self.catalog = Catalog(self.db.get_all_songs(), self.catalog_version, self.compact)
+        with phase('load_data.genre_index'):
+            # Build the genre and popularity rankings now rather than on the first request
+            self.catalog.genre_index
+        self._feature_buffer = None
+        self._drift = None
+        if len(self.catalog) == 0:
+            # Nothing to fit: the next add_songs then starts over with a full load
+            self.tfidf = self.tfidf_matrix = self.feature_matrix = None
+            self.neighbor_index = None
+            return
         
+        with phase('load_data.artifact_load'):
+            loaded = not force_refit and self._load_artifact()
+        if not loaded:
+            self._fit_models()
+            with phase('load_data.neighbor_index'):
+                self.build_neighbor_index()
+            with phase('load_data.artifact_save'):
+                self._save_artifact()
+        self._reset_drift()
+    
+    @property
+    def _float_dtype(self):
+        return np.float32 if self.compact else np.float64
+    
+    def _fit_models(self):
+        """Fit TF-IDF and the feature scaler on the loaded catalog"""
         # TF-IDF for text features
-        tfidf = TfidfVectorizer(stop_words='english', max_features=1000)
-        self.tfidf_matrix = tfidf.fit_transform(self.songs_df['text_features'])
+        with phase('load_data.tfidf_fit'):
+            self.tfidf = TfidfVectorizer(stop_words='english', max_features=MAX_TEXT_FEATURES,
+                                         dtype=self._float_dtype)
+            self.tfidf_matrix = self.tfidf.fit_transform(self.catalog.text_features())
+        
+        with phase('load_data.scaling'):
+            self.scaler = StandardScaler()
+            self.feature_matrix = self.scaler.fit_transform(self.catalog.audio).astype(self._float_dtype, copy=False)
         
-        # Numerical features for audio characteristics
-        audio_features = ['energy', 'danceability', 'valence', 'acousticness', 'popularity']
-        feature_data = self.songs_df[audio_features].fillna(0)
-        self.feature_matrix = self.scaler.fit_transform(feature_data)
+        # Taste vectors live in this model space; a refit invalidates them
+        self.model_version = self.catalog_version
     
-    def get_content_based_recommendations(self, song_id: int, n_recommendations: int = 5) -> List[Dict]:
-        """Get recommendations based on song content similarity"""
-        if self.songs_df is None or len(self.songs_df) == 0:
-            return []
+    @timed
+    def rows_for_ids(self, song_ids) -> np.ndarray:
+        """Catalog row of each song id (-1 for unknown ids)"""
+        return self.state.rows_for_ids(song_ids)
+    
+    def _artifact_params(self) -> Dict:
+        """Settings that must match for a saved artifact to be reusable"""
+        return {
+            'max_features': MAX_TEXT_FEATURES,
+            'audio_features': AUDIO_FEATURES,
+            'neighbor_k': self.neighbor_k,
+            'neighbor_method': self.neighbor_method,
+            'compact': self.compact,
+        }
+    
+    def _load_artifact(self) -> bool:
+        """Adopt the saved models for the current catalog version, if any"""
+        if self.artifact_dir is None:
+            return False
+        artifact = model_store.load_artifact(self.artifact_dir, self.catalog_version, self._artifact_params())
+        if artifact is None or not np.array_equal(artifact['song_ids'], self.catalog.ids):
+            return False
         
-        # Find the song index
-        song_idx = self.songs_df[self.songs_df['id'] == song_id].index
-        if len(song_idx) == 0:
-            return []
+        self.model_version = self.catalog_version
+        self.tfidf = artifact['vectorizer']
+        self.scaler = artifact['scaler']
+        self.tfidf_matrix = artifact['tfidf_matrix']
+        self.feature_matrix = artifact['feature_matrix']
+        if artifact['neighbor_indices'] is not None:
+            self.neighbor_index = self._new_neighbor_index().restore(
+                self.tfidf_matrix, self.feature_matrix,
+                artifact['neighbor_indices'], artifact['neighbor_scores'], artifact['neighbor_method'],
+                artifact['neighbor_audio'])
+        else:
+            self.build_neighbor_index()
+        return True
+    
+    def _save_artifact(self):
+        """Persist the fitted models for fast startup"""
+        if self.artifact_dir is None:
+            return
+        model_store.save_artifact(self.artifact_dir, self.catalog_version, self._artifact_params(),
+                                  self.catalog.ids, self.tfidf, self.scaler,
+                                  self.tfidf_matrix, self.feature_matrix, self.neighbor_index)
+    
+    def _reset_drift(self):
+        """Start drift tracking from the statistics the scaler was fitted on"""
+        n = float(self.scaler.n_samples_seen_)
+        mean = np.asarray(self.scaler.mean_, dtype=np.float64)
+        var = np.asarray(self.scaler.var_, dtype=np.float64)
+        self._drift = {
+            'tokens': 0,
+            'oov_tokens': 0,
+            'count': n,
+            'sum': mean * n,
+            'sum_sq': (var + mean ** 2) * n,
+        }
+    
+    @timed
+    def add_songs(self, songs: List[Dict]) -> List[int]:
+        """Add songs to the catalog without refitting
         
-        song_idx = song_idx[0]
+        New rows are transformed with the existing vocabulary and scaler and
+        appended to the matrices; only the neighbor lists the new songs enter are
+        updated. A background refit starts once drift exceeds the thresholds.
+        """
+        with self._update_lock:
+            song_ids = self.db.add_songs(songs)
+            state = self.state
+            if state.tfidf is None:
+                # Nothing fitted yet (empty catalog): a full load is the incremental step
+                self.load_data()
+                return song_ids
+            
+            added = Catalog(self.db.get_songs_by_ids(song_ids), compact=self.compact)
+            text = added.text_features()
+            new_tfidf = state.tfidf.transform(text)
+            new_features = state.scaler.transform(added.audio).astype(self._float_dtype, copy=False)
+            
+            # Grow copies beside the current state; readers keep using it until the swap
+            neighbor_index = None
+            if state.neighbor_index is not None:
+                neighbor_index = copy.copy(state.neighbor_index)
+                neighbor_index.add_rows(new_tfidf, new_features)
+            catalog_version = self.db.get_catalog_version()
+            catalog = state.catalog.appended(added, catalog_version)
+            catalog.genre_index
+            self.state = state._replace(
+                catalog=catalog,
+                tfidf_matrix=sparse.vstack([state.tfidf_matrix, new_tfidf]).tocsr(),
+                feature_matrix=self._append_features(state.feature_matrix, new_features),
+                neighbor_index=neighbor_index,
+                catalog_version=catalog_version)
+            
+            analyzer = state.tfidf.build_analyzer()
+            for doc in text:
+                tokens = analyzer(doc)
+                self._drift['tokens'] += len(tokens)
+                self._drift['oov_tokens'] += sum(token not in state.tfidf.vocabulary_ for token in tokens)
+            self._track_features(added.audio, 1)
+            self._maybe_refit()
+        return song_ids
+    
+    @timed
+    def remove_songs(self, song_ids: List[int]):
+        """Remove songs from the catalog without refitting"""
+        with self._update_lock:
+            self.db.remove_songs(song_ids)
+            state = self.state
+            if state.catalog is None or len(state.catalog) == 0:
+                return
+            
+            remove_mask = np.isin(state.catalog.ids, np.asarray(song_ids, dtype=np.int64))
+            if not remove_mask.any():
+                return
+            if remove_mask.all():
+                self.load_data()
+                return
+            
+            keep = ~remove_mask
+            self._track_features(state.catalog.audio[remove_mask], -1)
+            neighbor_index = None
+            if state.neighbor_index is not None:
+                neighbor_index = copy.copy(state.neighbor_index)
+                neighbor_index.remove_rows(np.flatnonzero(remove_mask))
+            catalog_version = self.db.get_catalog_version()
+            catalog = state.catalog.without_rows(remove_mask, catalog_version)
+            catalog.genre_index
+            self._feature_buffer = None
+            self.state = state._replace(
+                catalog=catalog,
+                tfidf_matrix=state.tfidf_matrix[keep],
+                feature_matrix=np.asarray(state.feature_matrix)[keep],
+                neighbor_index=neighbor_index,
+                catalog_version=catalog_version)
+            self._maybe_refit()
+    
+    def _append_features(self, feature_matrix: np.ndarray, new_rows: np.ndarray) -> np.ndarray:
+        """Feature matrix with rows appended, in a spare-capacity buffer grown geometrically
         
-        # Calculate similarities
-        text_sim = cosine_similarity(self.tfidf_matrix[song_idx:song_idx+1], self.tfidf_matrix).flatten()
-        audio_sim = cosine_similarity(self.feature_matrix[song_idx:song_idx+1], self.feature_matrix).flatten()
+        Only rows past the current matrix are written, so states still viewing
+        the buffer are unaffected.
+        """
+        n_used = feature_matrix.shape[0]
+        n_total = n_used + new_rows.shape[0]
+        buffer = self._feature_buffer
+        if buffer is None or feature_matrix.base is not buffer or buffer.shape[0] < n_total:
+            buffer = np.empty((max(n_total, 2 * n_used), feature_matrix.shape[1]), dtype=feature_matrix.dtype)
+            buffer[:n_used] = feature_matrix
+        buffer[n_used:n_total] = new_rows
+        self._feature_buffer = buffer
+        return buffer[:n_total]
+    
+    def _track_features(self, raw_rows: np.ndarray, sign: int):
+        """Update running feature moments for added (+1) or removed (-1) rows"""
+        raw_rows = np.asarray(raw_rows, dtype=np.float64)
+        self._drift['count'] += sign * raw_rows.shape[0]
+        self._drift['sum'] += sign * raw_rows.sum(axis=0)
+        self._drift['sum_sq'] += sign * (raw_rows ** 2).sum(axis=0)
+    
+    @timed
+    def get_drift(self) -> Dict:
+        """Drift of the catalog from the data the models were fitted on"""
+        if self._drift is None:
+            return {}
+        drift = self._drift
+        count = max(drift['count'], 1.0)
+        mean = drift['sum'] / count
+        var = np.maximum(drift['sum_sq'] / count - mean ** 2, 0.0)
+        scale = np.asarray(self.scaler.scale_, dtype=np.float64)
+        fitted_var = np.maximum(np.asarray(self.scaler.var_, dtype=np.float64), 1e-12)
+        ratio = np.maximum(var, 1e-12) / fitted_var
+        return {
+            'oov_rate': drift['oov_tokens'] / drift['tokens'] if drift['tokens'] else 0.0,
+            'mean_shift': float(np.max(np.abs(mean - self.scaler.mean_) / scale)),
+            'variance_ratio': float(np.max(np.maximum(ratio, 1.0 / ratio))),
+        }
+    
+    def _maybe_refit(self):
+        """Start a background full refit when drift exceeds the thresholds"""
+        drift = self.get_drift()
+        if (drift['oov_rate'] <= MAX_OOV_RATE and drift['mean_shift'] <= MAX_MEAN_SHIFT
+                and drift['variance_ratio'] <= MAX_VARIANCE_RATIO):
+            return
+        if self._refit_thread is not None and self._refit_thread.is_alive():
+            return
+        self._refit_thread = threading.Thread(target=self._background_refit, daemon=True)
+        self._refit_thread.start()
+    
+    def _background_refit(self):
+        """Refit on a shadow copy, then swap its models in if no update raced it
+        
+        Gives up after MAX_REFIT_ATTEMPTS raced refits; the drift is still
+        tracked, so the next catalog update starts another one.
+        """
+        for _ in range(MAX_REFIT_ATTEMPTS):
+            shadow = copy.copy(self)
+            shadow._load_models(force_refit=True)
+            with self._update_lock:
+                if shadow.catalog_version == self.db.get_catalog_version():
+                    self._adopt(shadow)
+                    return
+    
+    @timed
+    def wait_for_refit(self, timeout: float = None):
+        """Block until a running background refit has finished"""
+        if self._refit_thread is not None:
+            self._refit_thread.join(timeout)
+    
+    @timed
+    def build_neighbor_index(self):
+        """Precompute the top-K similar songs for every song in the catalog"""
+        state = self.state
+        if state.catalog is None or len(state.catalog) == 0:
+            self.neighbor_index = None
+            return
+        
+        neighbor_index = self._new_neighbor_index()
+        neighbor_index.build(state.tfidf_matrix, state.feature_matrix)
+        self.neighbor_index = neighbor_index
+    
+    def _new_neighbor_index(self) -> NeighborIndex:
+        return NeighborIndex(k=self.neighbor_k, method=self.neighbor_method,
+                             memory_budget=self.neighbor_memory_budget, workers=self.neighbor_workers)
+    
+    @timed
+    @cached()
+    def get_content_based_recommendations(self, song_id: int, n_recommendations: int = 5) -> List[Dict]:
+        """Get recommendations based on song content similarity"""
+        if self.catalog is None or len(self.catalog) == 0:
+            return []
         
-        # Combine similarities (weighted)
-        combined_sim = 0.3 * text_sim + 0.7 * audio_sim
+        # O(K) lookup in the precomputed neighbor lists, with an exact pass when they
+        # are shorter than the request (beyond K, or sparse LSH buckets)
+        return self._retrieve(n_recommendations, song_id)
+    
+    @timed
+    def get_neighbor_index_report(self, sample_size: int = 200) -> Dict:
+        """Build time of the neighbor index and its recall against brute force"""
+        if self.neighbor_index is None:
+            return {}
+        self.neighbor_index.measure_recall(sample_size)
+        return self.neighbor_index.stats()
+    
+    @timed
+    def get_memory_report(self) -> Dict:
+        """Bytes held by the catalog and each fitted model
         
-        # Get top similar songs (excluding the input song)
-        similar_indices = combined_sim.argsort()[::-1][1:n_recommendations+1]
+        Arrays memory-mapped from an artifact are paged in by the OS on demand;
+        'mapped' sums them. Arrays shared by two components (the TF-IDF matrix
+        and the index's text vectors) are counted once.
+        """
+        if self.catalog is None:
+            return {}
+        report = {f"catalog.{name}": size for name, size in self.catalog.memory_usage().items()}
+        counted = []
         
-        recommendations = []
-        for idx in similar_indices:
-            song = self.songs_df.iloc[idx]
-            recommendations.append({
-                'id': int(song['id']),
-                'title': song['title'],
-                'artist': song['artist'],
-                'genre': song['genre'],
-                'year': int(song['year']),
-                'similarity_score': float(combined_sim[idx])
-            })
+        def add(name, arrays):
+            arrays = [array for array in arrays if not any(array is seen for seen in counted)]
+            counted.extend(arrays)
+            report[name] = sum(array.nbytes for array in arrays)
         
-        return recommendations
+        if self.tfidf_matrix is not None:
+            add('tfidf_matrix', [self.tfidf_matrix.data, self.tfidf_matrix.indices, self.tfidf_matrix.indptr])
+        if self.feature_matrix is not None:
+            add('feature_matrix', [self.feature_matrix])
+        if self._feature_buffer is not None:
+            # Spare rows beyond the live feature matrix
+            report['feature_buffer'] = self._feature_buffer.nbytes - report.get('feature_matrix', 0)
+        if self.neighbor_index is not None:
+            add('neighbor_index', self.neighbor_index.arrays())
+        cf_model = self._cf_state.get('model')
+        if cf_model is not None:
+            arrays = [getattr(cf_model, name, None) for name in ('user_factors', 'item_factors')]
+            similarity = getattr(cf_model, 'similarity', None)
+            if similarity is not None:
+                arrays += [similarity.data, similarity.indices, similarity.indptr]
+            report['cf_model'] = sum(array.nbytes for array in arrays if array is not None)
+        report['total'] = sum(report.values())
+        report['mapped'] = sum(array.nbytes for array in counted if _is_mapped(array))
+        return report
     
+    @timed
+    @cached()
     def get_genre_based_recommendations(self, preferred_genres: List[str], n_recommendations: int = 5) -> List[Dict]:
-        """Get recommendations based on preferred genres"""
-        if self.songs_df is None or len(self.songs_df) == 0:
+        """Get recommendations based on preferred genres
+        
+        Genre names are matched case-insensitively; a parent genre such as
+        "Alternative" also matches "Alternative Rock".
+        """
+        catalog = self.catalog
+        if catalog is None or len(catalog) == 0:
             return []
         
-        # Filter songs by preferred genres
-        genre_mask = self.songs_df['genre'].isin(preferred_genres)
-        genre_songs = self.songs_df[genre_mask]
+        # Merge the popularity-sorted lists of the preferred genres
+        top_rows = catalog.genre_index.top_rows(preferred_genres, n_recommendations)
         
-        if len(genre_songs) == 0:
+        if len(top_rows) == 0:
             # Fallback to popular songs
-            genre_songs = self.songs_df.nlargest(n_recommendations, 'popularity')
-        
-        # Sort by popularity and get top recommendations
-        recommendations = []
-        for _, song in genre_songs.nlargest(n_recommendations, 'popularity').iterrows():
-            recommendations.append({
-                'id': int(song['id']),
-                'title': song['title'],
-                'artist': song['artist'],
-                'genre': song['genre'],
-                'year': int(song['year']),
-                'popularity': int(song['popularity'])
-            })
+            top_rows = catalog.genre_index.popular(n_recommendations)
         
-        return recommendations
+        return catalog.records(top_rows, with_popularity=True)
     
+    @timed
+    @cached(user_arg='user_id')
     def get_hybrid_recommendations(self, user_id: str, n_recommendations: int = 10) -> List[Dict]:
-        """Get hybrid recommendations combining multiple approaches"""
-        user_ratings = self.db.get_user_ratings(user_id)
+        """Get hybrid recommendations combining multiple approaches
+        
+        Scores the whole catalog once against the user's stored taste vector,
+        so the cost does not grow with the number of ratings, then adds the
+        weighted collaborative score.
+        """
+        if self.catalog is None or len(self.catalog) == 0:
+            return []
         
-        if len(user_ratings) == 0:
-            # New user - recommend popular songs
-            return self.get_popular_recommendations(n_recommendations)
+        # New users and users without favorites (rating >= 4) get popular songs they have not rated
+        return self._retrieve(n_recommendations, user_id=user_id)
+    
+    @timed
+    @cached(user_arg='user_id')
+    def get_filtered_recommendations(self, n_recommendations: int = 10, song_id: int = None, user_id: str = None,
+                                     genres: List[str] = None, year_range: Tuple = None,
+                                     energy_range: Tuple = None, exclude_ids: List[int] = None) -> List[Dict]:
+        """Get the best songs passing the filters, ranked by song similarity, taste or popularity
+        
+        Songs are ranked by similarity to song_id if given, else by the hybrid
+        score for user_id, else by popularity. genres, inclusive
+        (low, high) year and energy ranges and the excluded ids become one row
+        mask applied before top-K selection, so n_recommendations songs come
+        back whenever that many pass. The seed song and the user's rated songs
+        are always excluded.
+        """
+        if self.catalog is None or len(self.catalog) == 0:
+            return []
+        return self._retrieve(n_recommendations, song_id, user_id, genres, year_range, energy_range, exclude_ids)
+    
+    def _retrieve(self, n_recommendations: int, song_id: int = None, user_id: str = None,
+                  genres: List[str] = None, year_range: Tuple = None, energy_range: Tuple = None,
+                  exclude_ids: List[int] = None) -> List[Dict]:
+        # One state for the whole request: a concurrent update swaps in another
+        state = self.state
+        catalog = state.catalog
+        excluded = [] if exclude_ids is None else list(exclude_ids)
+        scores = None
+        if song_id is None and user_id is not None:
+            # Taste plus collaborative score, with the user's rated songs at -inf
+            scores = self.profiles.scores(user_id, state, lambda: self._collaborative_scores(user_id, state),
+                                          self.cf_weight)
+        if user_id is not None and scores is None:
+            excluded += self.db.get_rated_song_ids(user_id)
+        allowed = catalog.filter_mask(genres, year_range, energy_range, excluded)
+        
+        if song_id is not None:
+            song_idx = catalog.row_of(song_id)
+            if song_idx is None:
+                return []
+            rows, scores = state.neighbor_index.neighbors(song_idx)
+            keep = np.ones(len(rows), dtype=bool) if allowed is None else allowed[rows]
+            if keep.sum() < n_recommendations:
+                # The stored K cannot fill the request: one exact pass over the allowed rows
+                rows, scores = state.neighbor_index.search(song_idx, n_recommendations, allowed)
+                keep = np.ones(len(rows), dtype=bool)
+            rows, scores = rows[keep][:n_recommendations], scores[keep][:n_recommendations]
+            return catalog.records(rows, {'similarity_score': scores})
         
-        # Get user's favorite songs (rating >= 4)
-        favorite_songs = user_ratings[user_ratings['rating'] >= 4]
+        if scores is None:
+            ranking = catalog.genre_index.ranking
+            if allowed is not None:
+                ranking = ranking[allowed[ranking]]
+            return catalog.records(ranking[:n_recommendations], with_popularity=True)
+        
+        if allowed is not None:
+            scores[~allowed] = -np.inf
+        n_valid = int(np.isfinite(scores).sum())
+        top_idx, top_scores = top_k_rows(scores[None, :], min(n_recommendations, n_valid))
+        return catalog.records(top_idx[0], {'similarity_score': top_scores[0]})
+    
+    @timed
+    def get_personal_recommendations(self, user_id: str, n_recommendations: int = 10) -> List[Dict]:
+        """Get the nightly batch results while they are fresh, else hybrid recommendations"""
+        recommendations = self.db.get_stored_recommendations(user_id, self.catalog_version, n_recommendations)
+        if recommendations is None:
+            recommendations = self.get_hybrid_recommendations(user_id, n_recommendations)
+        return recommendations
+    
+    def _on_rating_for_cache(self, user_id: str, song_id: int, rating: int, previous_rating):
+        """Drop the rating user's cached results once the rating is committed"""
+        self.cache.invalidate_user(user_id)
+    
+    def _on_rating_for_cf(self, user_id: str, song_id: int, rating: int, previous_rating):
+        """Count ratings that the collaborative model has not seen yet"""
+        self._cf_new_ratings += 1
+    
+    def _on_ratings_imported(self, user_ids: List[str], n_ratings: int):
+        """Account for a committed chunk of bulk-imported ratings"""
+        self._cf_new_ratings += n_ratings
+        if self.cache is not None:
+            for user_id in user_ids:
+                self.cache.invalidate_user(user_id)
+    
+    @timed
+    def get_collaborative_model(self, wait: bool = False) -> Tuple[object, np.ndarray]:
+        """Fitted collaborative model and the sorted user ids of its user rows
         
-        if len(favorite_songs) == 0:
-            return self.get_popular_recommendations(n_recommendations)
+        A stale model is refit on a background thread while callers keep the
+        current one (None before the first fit, or when no rating refers to a
+        catalog song); wait=True blocks until that refit has finished.
+        """
+        cf_state = self._collaborative_state(wait)
+        return cf_state.get('model'), cf_state.get('users', NO_USERS)
+    
+    def _collaborative_state(self, wait: bool = False) -> Dict:
+        """Current collaborative state, starting a background refit when it is stale"""
+        with self._cf_lock:
+            cf_state = self._cf_state
+            stale = (not cf_state or cf_state['catalog_version'] != self.catalog_version or
+                     self._cf_new_ratings > max(1, CF_REFIT_FRACTION * cf_state['n_ratings']))
+            refitting = self._cf_thread is not None and self._cf_thread.is_alive()
+            if stale and not refitting:
+                # Reset before reading, so ratings committed during the fit count toward the next one
+                self._cf_new_ratings = 0
+                self._cf_thread = threading.Thread(target=self._refit_collaborative, args=(self.state,),
+                                                   daemon=True)
+                self._cf_thread.start()
+            thread = self._cf_thread
+        if wait and thread is not None:
+            thread.join()
+        return self._cf_state
+    
+    def _refit_collaborative(self, state: ModelState):
+        """Fit the collaborative model over the sparse rating matrix and swap it in"""
+        user_ids, song_ids, ratings = self.db.get_rating_triples()
+        item_rows = state.rows_for_ids(song_ids)
+        known = item_rows >= 0
+        model = None
+        users = NO_USERS
+        if known.any():
+            users, user_rows = np.unique(user_ids[known], return_inverse=True)
+            matrix = build_rating_matrix(user_rows, item_rows[known], ratings[known],
+                                         len(users), len(state.catalog))
+            model = ImplicitALS().fit(matrix) if self.cf_method == 'als' else ItemItemCF().fit(matrix)
+        # Cached results blend in collaborative scores, so each fit is a new data version
+        self._cf_state = {
+            'model': model,
+            'users': users,
+            'catalog_version': state.catalog_version,
+            'n_ratings': int(known.sum()),
+            'version': self._cf_state.get('version', 0) + 1,
+        }
+    
+    def _collaborative_scores(self, user_id: str, state: ModelState) -> np.ndarray:
+        """Collaborative score of every song for a user in [-1, 1] (-inf where unknown)"""
+        cf_state = self._collaborative_state()
+        model = cf_state.get('model')
+        # A model fitted on another catalog has other rows; skip it until the refit lands
+        if model is None or cf_state['catalog_version'] != state.catalog_version:
+            return None
+        if self.cf_method == 'als':
+            user_row = search_sorted(cf_state['users'], [user_id])[0]
+            return None if user_row < 0 else als_user_scores(model, user_row)
         
-        # Get content-based recommendations for each favorite song
-        all_recommendations = []
-        for _, song in favorite_songs.iterrows():
-            recs = self.get_content_based_recommendations(song['song_id'], 3)
-            all_recommendations.extend(recs)
+        song_ids, ratings = self.db.get_latest_user_ratings(user_id)
+        rows = state.rows_for_ids(song_ids)
+        known = rows >= 0
+        if not known.any():
+            return None
+        return item_user_scores(model, rows[known], np.asarray(ratings)[known], len(state.catalog))
+    
+    @timed
+    @cached(user_arg='user_id')
+    def get_collaborative_recommendations(self, user_id: str, n_recommendations: int = 10) -> List[Dict]:
+        """Get recommendations from what users with similar ratings liked"""
+        state = self.state
+        if state.catalog is None or len(state.catalog) == 0:
+            return []
         
-        # Remove duplicates and already rated songs
-        rated_song_ids = set(user_ratings['song_id'].values)
-        unique_recs = []
-        seen_ids = set()
+        scores = self._collaborative_scores(user_id, state)
+        if scores is None:
+            return []
+        rated_rows = state.rows_for_ids(self.db.get_rated_song_ids(user_id))
+        scores[rated_rows[rated_rows >= 0]] = -np.inf
         
-        for rec in all_recommendations:
-            if rec['id'] not in seen_ids and rec['id'] not in rated_song_ids:
-                unique_recs.append(rec)
-                seen_ids.add(rec['id'])
+        n_valid = int(np.isfinite(scores).sum())
+        top_idx, top_scores = top_k_rows(scores[None, :], min(n_recommendations, n_valid))
         
-        # Sort by similarity score and return top N
-        unique_recs.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return unique_recs[:n_recommendations]
+        return state.catalog.records(top_idx[0], {'similarity_score': top_scores[0]})
     
+    @timed
+    @cached()
     def get_popular_recommendations(self, n_recommendations: int = 5) -> List[Dict]:
         """Get popular song recommendations"""
-        if self.songs_df is None or len(self.songs_df) == 0:
+        catalog = self.catalog
+        if catalog is None or len(catalog) == 0:
             return []
         
-        popular_songs = self.songs_df.nlargest(n_recommendations, 'popularity')
-        recommendations = []
-        
-        for _, song in popular_songs.iterrows():
-            recommendations.append({
-                'id': int(song['id']),
-                'title': song['title'],
-                'artist': song['artist'],
-                'genre': song['genre'],
-                'year': int(song['year']),
-                'popularity': int(song['popularity'])
-            })
-        
-        return recommendations
\ No newline at end of file
+        return catalog.records(catalog.genre_index.popular(n_recommendations), with_popularity=True)
\ No newline at end of file
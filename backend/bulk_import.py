@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Column name -> (converter, required, (min, max) or None), mirroring the songs table
+SONG_SCHEMA = [
+    ('title', str, True, None),
+    ('artist', str, True, None),
+    ('genre', str, True, None),
+    ('year', int, False, (0, 9999)),
+    ('duration', int, False, (0, None)),
+    ('energy', float, False, (0.0, 1.0)),
+    ('danceability', float, False, (0.0, 1.0)),
+    ('valence', float, False, (0.0, 1.0)),
+    ('acousticness', float, False, (0.0, 1.0)),
+    ('popularity', int, False, (0, 100)),
+]
+
+SONG_COLUMNS = [column for column, _, _, _ in SONG_SCHEMA]
+
+# SQLite's CURRENT_TIMESTAMP layout (UTC), so imported and live timestamps compare as text
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_timestamp(value) -> str:
+    """Normalize epoch seconds or an ISO 8601 string to a UTC TIMESTAMP_FORMAT string"""
+    try:
+        moment = datetime.fromtimestamp(float(value), timezone.utc)
+    except (OverflowError, OSError):
+        raise ValueError(f"timestamp out of range: {value!r}")
+    except ValueError:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+# Same layout for the user_ratings table
+RATING_SCHEMA = [
+    ('user_id', str, True, None),
+    ('song_id', int, True, (1, None)),
+    ('rating', int, True, (1, 5)),
+    ('timestamp', parse_timestamp, False, None),
+]
+
+RATING_COLUMNS = [column for column, _, _, _ in RATING_SCHEMA]
+
+
+def detect_format(path: str) -> str:
+    """Guess the record format from the file extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    raise ValueError(f"Cannot detect import format for {path}; pass fmt='csv' or 'jsonl'")
+
+
+def iter_records(path: str, fmt: str = None) -> Iterator[Dict]:
+    """Stream records from a CSV or JSON-lines file without loading it whole"""
+    fmt = fmt or detect_format(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        elif fmt == 'jsonl':
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def chunked(records: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most size items"""
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_record(record: Dict, schema=SONG_SCHEMA) -> Tuple:
+    """Convert a raw record into a row tuple, raising ValueError if it is invalid"""
+    row = []
+    for column, convert, required, bounds in schema:
+        value = record.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            if required:
+                raise ValueError(f"missing {column}")
+            row.append(None)
+            continue
+        try:
+            # CSV gives '1975.0'-style strings for integers written by pandas
+            value = convert(float(value)) if convert is int else convert(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {column}: {value!r}")
+        if bounds is not None:
+            low, high = bounds
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise ValueError(f"{column} out of range: {value!r}")
+        row.append(value)
+    return tuple(row)
+
+
+def validate_rating(record: Dict) -> Tuple:
+    """Row tuple of a rating record; a missing timestamp means now"""
+    row = validate_record(record, RATING_SCHEMA)
+    if row[3] is None:
+        row = row[:3] + (datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT),)
+    return row
+
+
+def file_fingerprint(path: str) -> str:
+    """Identify a source file version so a resumed import reads the same data"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def validate_chunk(records: List[Dict], validate: Callable, errors: List[str],
+                   row_offset: int, max_errors: int = 20) -> List[Tuple]:
+    """Validate a chunk, collecting the first few error messages"""
+    rows = []
+    for i, record in enumerate(records):
+        try:
+            rows.append(validate(record))
+        except ValueError as e:
+            if len(errors) < max_errors:
+                errors.append(f"row {row_offset + i + 1}: {e}")
+    return rows
@@ -0,0 +1,159 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, Hashable
+
+
+def _freeze(value) -> Hashable:
+    """Turn list/dict/set/array arguments into hashable equivalents for cache keys"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, np.ndarray):
+        return tuple(_freeze(v) for v in value.tolist())
+    if hasattr(value, 'item'):
+        # numpy scalars (e.g. an id read from a DataFrame)
+        return value.item()
+    return value
+
+
+class ResultCache:
+    """Bounded LRU cache with TTL for recommendation results"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._generation = 0
+        self._user_generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return (True, value) on a fresh hit, else (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            value, expires_at, user_id = entry
+            if expires_at < time.monotonic():
+                self._remove(key, user_id)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def generation(self, user_id=None):
+        """Token that changes whenever entries of this user (or all entries) are invalidated"""
+        with self._lock:
+            return self._generation, self._user_generations.get(user_id, 0)
+
+    def put(self, key, value, user_id=None, generation=None):
+        """Store a value, evicting the least recently used entries beyond the bound
+
+        A value computed before an invalidation (generation no longer current)
+        is not stored, so a slow reader cannot re-insert stale results.
+        """
+        with self._lock:
+            if generation is not None and generation != (self._generation, self._user_generations.get(user_id, 0)):
+                return
+            if key in self._entries:
+                self._remove(key, self._entries[key][2])
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, user_id)
+            if user_id is not None:
+                self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, _, old_user) = next(iter(self._entries.items()))
+                self._remove(old_key, old_user)
+                self.evictions += 1
+
+    def _remove(self, key, user_id):
+        del self._entries[key]
+        if user_id is not None:
+            keys = self._user_keys.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._user_keys[user_id]
+
+    def invalidate_user(self, user_id):
+        """Drop every entry computed for one user"""
+        with self._lock:
+            self._user_generations[user_id] = self._user_generations.get(user_id, 0) + 1
+            for key in self._user_keys.pop(user_id, ()):
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self) -> Dict:
+        """Counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+def cached(user_arg: str = None):
+    """Cache an engine method's results in self.cache
+
+    Keys combine the method name, its normalized arguments and the engine's
+    data version. Entries are tagged with the user_arg argument, if given, so
+    that a user's new rating drops only that user's entries. Ratings the user
+    queued on self.db are committed before the lookup (read-your-writes).
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments['self']
+            key = (method.__name__, _freeze(arguments), self.data_version)
+            user_id = _freeze(arguments[user_arg]) if user_arg else None
+            if user_id is not None:
+                # Committing invalidates the user's entries before we look them up
+                self.db.wait_for_user(user_id)
+            hit, value = cache.get(key)
+            if not hit:
+                generation = cache.generation(user_id)
+                value = method(self, *args, **kwargs)
+                cache.put(key, [dict(item) for item in value], user_id, generation)
+                return value
+            # Hand out copies so callers cannot mutate the cached results
+            return [dict(item) for item in value]
+        return wrapper
+    return decorator
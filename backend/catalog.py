@@ -0,0 +1,244 @@
+import sys
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+from backend.genre_index import GenreIndex
+
+# Fields every recommendation dict carries
+RECORD_FIELDS = ('id', 'title', 'artist', 'genre', 'year')
+
+# Numerical features for audio characteristics
+AUDIO_FEATURES = ['energy', 'danceability', 'valence', 'acousticness', 'popularity']
+
+# Compact catalogs store years as int32 with this value for a missing year
+MISSING_YEAR = -1
+
+
+def _encode(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """int32 codes and the distinct values they index (first-seen order)"""
+    codes, names = pd.factorize(values, use_na_sentinel=False)
+    return codes.astype(np.int32), np.asarray(names, dtype=object)
+
+
+def _merge_codes(codes: np.ndarray, names: np.ndarray, new_codes: np.ndarray,
+                 new_names: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Append coded values, extending the name table with names it lacks"""
+    position = {name: code for code, name in enumerate(names.tolist())}
+    extra = [name for name in new_names.tolist() if name not in position]
+    for name in extra:
+        position[name] = len(position)
+    remap = np.array([position[name] for name in new_names.tolist()], dtype=np.int32)
+    merged_names = np.concatenate([names, np.asarray(extra, dtype=object)]) if extra else names
+    return np.concatenate([codes, remap[new_codes]]), merged_names
+
+
+def _in_range(values: np.ndarray, bounds: Tuple) -> np.ndarray:
+    """values within inclusive (low, high) bounds, either of which may be None"""
+    low, high = bounds
+    mask = np.ones(len(values), dtype=bool)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+
+def search_sorted(sorted_keys: np.ndarray, keys) -> np.ndarray:
+    """Position of each key in a sorted array (-1 for keys it does not hold)"""
+    keys = np.asarray(keys)
+    if len(sorted_keys) == 0:
+        return np.full(keys.shape, -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[positions] == keys, positions, -1)
+
+
+def _id_index(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Ids in sorted order and the row of each, for binary-search lookups"""
+    order = np.argsort(ids, kind='stable').astype(ids.dtype)
+    return ids[order], order
+
+
+def deep_nbytes(array: np.ndarray) -> int:
+    """Bytes held by an array, including the Python objects of an object array"""
+    if array.dtype == object:
+        return array.nbytes + sum(sys.getsizeof(value) for value in array.tolist())
+    return array.nbytes
+
+
+class Catalog:
+    """In-memory song catalog shared by the GUI and the engine
+
+    Holds the songs table once, a sorted id index and columnar arrays of the
+    display fields, so a batch of id lookups is one vectorized binary search
+    and building K result dicts is O(K) regardless of catalog size. Genre and
+    artist are stored as codes into tables of distinct names.
+
+    A compact catalog does not keep the DataFrame, and stores ids and years as
+    int32 and popularity and raw audio features as float32.
+    """
+
+    def __init__(self, frame: pd.DataFrame, version: str = None, compact: bool = False):
+        self.version = version
+        self.compact = compact
+        self.frame = None if compact else frame.reset_index(drop=True)
+        float_dtype = np.float32 if compact else np.float64
+        self.ids = frame['id'].to_numpy(dtype=np.int32 if compact else np.int64)
+        self.titles = frame['title'].to_numpy(dtype=object)
+        self.genre_codes, self.genre_names = _encode(frame['genre'])
+        self.artist_codes, self.artist_names = _encode(frame['artist'])
+        if compact:
+            self.years = frame['year'].fillna(MISSING_YEAR).to_numpy(dtype=np.int32)
+        else:
+            self.years = frame['year'].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.popularity = frame['popularity'].to_numpy(dtype=float_dtype, na_value=np.nan)
+        # Raw (unscaled) audio features, the input of the engine's scaler
+        self.audio = frame.reindex(columns=AUDIO_FEATURES).fillna(0).to_numpy(dtype=float_dtype)
+        self._sorted_ids, self._id_rows = _id_index(self.ids)
+
+    @classmethod
+    def load(cls, db, compact: bool = False) -> 'Catalog':
+        """Read the songs table once"""
+        # Read the version first: a concurrent write then only makes the catalog look stale
+        version = db.get_catalog_version()
+        return cls(db.get_all_songs(), version, compact)
+
+    @cached_property
+    def genre_index(self) -> GenreIndex:
+        """Popularity-sorted rows per genre, built on first use"""
+        return GenreIndex(self.genre_codes, self.genre_names, self.popularity)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, song_id) -> Optional[int]:
+        """Row of a song id, or None (O(log n))"""
+        row = self.rows_for_ids([song_id])[0]
+        return None if row < 0 else int(row)
+
+    def rows_for_ids(self, song_ids) -> np.ndarray:
+        """Row of each song id (-1 for unknown ids)"""
+        positions = search_sorted(self._sorted_ids, np.asarray(song_ids, dtype=np.int64))
+        rows = np.full(len(positions), -1, dtype=np.int64)
+        found = positions >= 0
+        rows[found] = self._id_rows[positions[found]]
+        return rows
+
+    def _derived(self, version: str, **columns) -> 'Catalog':
+        """Copy of this catalog with some columns replaced"""
+        catalog = object.__new__(Catalog)
+        catalog.__dict__.update({name: value for name, value in self.__dict__.items() if name != 'genre_index'})
+        catalog.__dict__.update(columns)
+        catalog.version = version
+        return catalog
+
+    def appended(self, added: 'Catalog', version: str = None) -> 'Catalog':
+        """New catalog with the rows of another catalog added at the end
+
+        Existing rows keep their positions. The old catalog stays valid for
+        whoever still holds it.
+        """
+        ids = np.concatenate([self.ids, added.ids.astype(self.ids.dtype)])
+        sorted_ids, id_rows = _id_index(ids)
+        genre_codes, genre_names = _merge_codes(self.genre_codes, self.genre_names,
+                                                added.genre_codes, added.genre_names)
+        artist_codes, artist_names = _merge_codes(self.artist_codes, self.artist_names,
+                                                  added.artist_codes, added.artist_names)
+        frame = None if self.compact else pd.concat([self.frame, added.frame], ignore_index=True)
+        return self._derived(
+            version, frame=frame, ids=ids, _sorted_ids=sorted_ids, _id_rows=id_rows,
+            genre_codes=genre_codes, genre_names=genre_names,
+            artist_codes=artist_codes, artist_names=artist_names,
+            **{name: np.concatenate([getattr(self, name), getattr(added, name).astype(getattr(self, name).dtype)])
+               for name in ('titles', 'years', 'popularity', 'audio')})
+
+    def without_rows(self, remove_mask: np.ndarray, version: str = None) -> 'Catalog':
+        """New catalog without the masked rows (renumbers the rest)"""
+        keep = ~remove_mask
+        ids = self.ids[keep]
+        sorted_ids, id_rows = _id_index(ids)
+        frame = None if self.compact else self.frame[keep].reset_index(drop=True)
+        return self._derived(
+            version, frame=frame, ids=ids, _sorted_ids=sorted_ids, _id_rows=id_rows,
+            **{name: getattr(self, name)[keep]
+               for name in ('titles', 'genre_codes', 'artist_codes', 'years', 'popularity', 'audio')})
+
+    def filter_mask(self, genres: List[str] = None, year_range: Tuple = None, energy_range: Tuple = None,
+                    exclude_ids=None) -> Optional[np.ndarray]:
+        """Boolean mask of the rows that pass every given filter (None when no filter is given)
+
+        Genres match as in the genre index. Ranges are inclusive (low, high)
+        pairs where None leaves that side open; songs without a year fail a
+        year range.
+        """
+        has_exclusions = exclude_ids is not None and len(exclude_ids) > 0
+        if not genres and year_range is None and energy_range is None and not has_exclusions:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        if genres:
+            mask &= self.genre_index.genre_mask(genres)
+        if year_range is not None:
+            mask &= self.years != MISSING_YEAR if self.years.dtype.kind == 'i' else ~np.isnan(self.years)
+            mask &= _in_range(self.years, year_range)
+        if energy_range is not None:
+            mask &= _in_range(self.audio[:, AUDIO_FEATURES.index('energy')], energy_range)
+        if has_exclusions:
+            rows = self.rows_for_ids(np.asarray(list(exclude_ids)))
+            mask[rows[rows >= 0]] = False
+        return mask
+
+    def _optional_ints(self, values: np.ndarray) -> List:
+        """Python ints, with None for missing values (NaN or MISSING_YEAR)"""
+        if values.dtype.kind == 'f':
+            return [None if value != value else int(value) for value in values.tolist()]
+        return [None if value == MISSING_YEAR else value for value in values.tolist()]
+
+    def records(self, rows, scores: Dict[str, np.ndarray] = None, with_popularity: bool = False) -> List[Dict]:
+        """Result dicts for the given rows, gathered column-wise
+
+        scores maps extra keys (e.g. 'similarity_score') to arrays aligned with rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = [self.ids[rows].tolist(), self.titles[rows].tolist(),
+                   self.artist_names[self.artist_codes[rows]].tolist(),
+                   self.genre_names[self.genre_codes[rows]].tolist(), self._optional_ints(self.years[rows])]
+        names = list(RECORD_FIELDS)
+        if with_popularity:
+            names.append('popularity')
+            columns.append(self._optional_ints(self.popularity[rows]))
+        for name, values in (scores or {}).items():
+            names.append(name)
+            columns.append(np.asarray(values, dtype=np.float64).tolist())
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def text_features(self) -> List[str]:
+        """'genre artist year' text of every song for TF-IDF (built on demand, not kept)"""
+        years = ['' if year is None else year for year in self._optional_ints(self.years)]
+        return [f"{genre} {artist} {year}" for genre, artist, year in
+                zip(self.genre_names[self.genre_codes].tolist(), self.artist_names[self.artist_codes].tolist(),
+                    years)]
+
+    def display_labels(self) -> List[str]:
+        """'Title - Artist (Genre, Year)' for every song, in row order"""
+        years = ['' if year is None else year for year in self._optional_ints(self.years)]
+        return [f"{title} - {artist} ({genre}, {year})"
+                for title, artist, genre, year in zip(self.titles.tolist(),
+                                                      self.artist_names[self.artist_codes].tolist(),
+                                                      self.genre_names[self.genre_codes].tolist(), years)]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by each component of the catalog"""
+        usage = {
+            'ids': self.ids.nbytes,
+            'titles': deep_nbytes(self.titles),
+            'genres': self.genre_codes.nbytes + deep_nbytes(self.genre_names),
+            'artists': self.artist_codes.nbytes + deep_nbytes(self.artist_names),
+            'years': self.years.nbytes,
+            'popularity': self.popularity.nbytes,
+            'audio': self.audio.nbytes,
+            'id_index': self._sorted_ids.nbytes + self._id_rows.nbytes,
+            'frame': 0 if self.frame is None else int(self.frame.memory_usage(deep=True).sum()),
+        }
+        if 'genre_index' in self.__dict__:
+            usage['genre_index'] = self.genre_index.nbytes()
+        return usage
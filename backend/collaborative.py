@@ -0,0 +1,174 @@
+import time
+import numpy as np
+from scipy import sparse
+
+# Ratings are centered on each user's mean, so scores fall in [-MAX_DEVIATION, MAX_DEVIATION]
+MAX_DEVIATION = 4.0
+
+# Ratings at or above this count as a positive preference for implicit ALS
+LIKE_RATING = 4
+
+
+def build_rating_matrix(user_rows: np.ndarray, item_rows: np.ndarray, ratings: np.ndarray,
+                        n_users: int, n_items: int) -> sparse.csr_matrix:
+    """Sparse user x item rating matrix"""
+    return sparse.csr_matrix((np.asarray(ratings, dtype=np.float32), (user_rows, item_rows)),
+                             shape=(n_users, n_items))
+
+
+def center_ratings(ratings: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Subtract each user's mean rating from their stored ratings (stays sparse)"""
+    ratings = sparse.csr_matrix(ratings, dtype=np.float64, copy=True)
+    counts = np.diff(ratings.indptr)
+    sums = np.asarray(ratings.sum(axis=1)).ravel()
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    ratings.data -= np.repeat(means, counts)
+    return ratings
+
+
+def prune_rows(matrix: sparse.csr_matrix, k: int) -> sparse.csr_matrix:
+    """Keep the k largest positive entries of every row"""
+    matrix = sparse.csr_matrix(matrix)
+    matrix.data[matrix.data <= 0] = 0
+    matrix.eliminate_zeros()
+    indptr = [0]
+    indices, data = [np.empty(0, dtype=matrix.indices.dtype)], [np.empty(0)]
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        row_data = matrix.data[start:end]
+        keep = np.argpartition(-row_data, k - 1)[:k] if end - start > k else np.arange(end - start)
+        indices.append(matrix.indices[start:end][keep])
+        data.append(row_data[keep])
+        indptr.append(indptr[-1] + len(keep))
+    return sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), np.array(indptr)),
+                             shape=matrix.shape)
+
+
+class ItemItemCF:
+    """Item-item collaborative filtering over adjusted-cosine similarity pruned to top-K"""
+
+    def __init__(self, k: int = 50, shrinkage: float = 10.0, block_size: int = 4096):
+        self.k = k
+        self.shrinkage = shrinkage
+        self.block_size = block_size
+        self.similarity = None
+        self.fit_seconds = 0.0
+
+    def fit(self, ratings: sparse.csr_matrix) -> 'ItemItemCF':
+        """Build the pruned item x item similarity matrix block by block"""
+        start = time.perf_counter()
+        centered = sparse.csc_matrix(center_ratings(ratings))
+        norms = np.sqrt(np.asarray(centered.multiply(centered).sum(axis=0)).ravel())
+        inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        normalized = sparse.csc_matrix(centered @ sparse.diags(inv_norms))
+        support = sparse.csc_matrix(ratings, dtype=np.float64, copy=True)
+        support.data[:] = 1.0
+
+        n_items = ratings.shape[1]
+        blocks = []
+        for block_start in range(0, n_items, self.block_size):
+            cols = slice(block_start, min(block_start + self.block_size, n_items))
+            # Rows of this block only ever hold co-rated items, so the product stays sparse
+            sims = sparse.csr_matrix(normalized[:, cols].T @ normalized)
+            if self.shrinkage > 0:
+                # Damp similarities supported by only a few co-raters
+                co_counts = sparse.csr_matrix(support[:, cols].T @ support)
+                sims = sparse.csr_matrix(sims.multiply(_shrink(co_counts, self.shrinkage)))
+            sims = sims.tocoo()
+            off_diagonal = sims.col != sims.row + block_start
+            sims = sparse.csr_matrix((sims.data[off_diagonal], (sims.row[off_diagonal], sims.col[off_diagonal])),
+                                     shape=sims.shape)
+            blocks.append(prune_rows(sims, self.k))
+        self.similarity = sparse.vstack(blocks).tocsr() if blocks else sparse.csr_matrix((0, 0))
+        self.fit_seconds = time.perf_counter() - start
+        return self
+
+    def score_user(self, user_ratings: sparse.csr_matrix) -> np.ndarray:
+        """Predicted rating deviation of every item for one user row (-inf without support)"""
+        centered = center_ratings(user_ratings)
+        rated = sparse.csr_matrix(user_ratings, copy=True)
+        rated.data[:] = 1.0
+        numerator = np.asarray((centered @ self.similarity).todense()).ravel()
+        denominator = np.asarray((rated @ abs(self.similarity)).todense()).ravel()
+        return np.divide(numerator, denominator, out=np.full_like(numerator, -np.inf), where=denominator > 0)
+
+
+def _shrink(co_counts: sparse.csr_matrix, shrinkage: float) -> sparse.csr_matrix:
+    """Elementwise n / (n + shrinkage) over the stored co-rating counts"""
+    shrunk = sparse.csr_matrix(co_counts, copy=True)
+    shrunk.data = shrunk.data / (shrunk.data + shrinkage)
+    return shrunk
+
+
+class ImplicitALS:
+    """Implicit-feedback matrix factorization (confidence-weighted ALS) in NumPy"""
+
+    def __init__(self, factors: int = 32, regularization: float = 0.1, alpha: float = 10.0,
+                 iterations: int = 10, seed: int = 0):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.seed = seed
+        self.user_factors = None
+        self.item_factors = None
+        self.fit_seconds = 0.0
+
+    def fit(self, ratings: sparse.csr_matrix) -> 'ImplicitALS':
+        """Alternate closed-form solves for user and item factors
+
+        Every rating is an observation with confidence 1 + alpha; only ratings of
+        LIKE_RATING or more count as a positive preference.
+        """
+        start = time.perf_counter()
+        ratings = sparse.csr_matrix(ratings, dtype=np.float64)
+        ratings_t = ratings.T.tocsr()
+
+        rng = np.random.default_rng(self.seed)
+        n_users, n_items = ratings.shape
+        self.user_factors = 0.01 * rng.standard_normal((n_users, self.factors))
+        self.item_factors = 0.01 * rng.standard_normal((n_items, self.factors))
+        for _ in range(self.iterations):
+            self.user_factors = self._solve(ratings, self.item_factors)
+            self.item_factors = self._solve(ratings_t, self.user_factors)
+        self.fit_seconds = time.perf_counter() - start
+        return self
+
+    def _solve(self, ratings: sparse.csr_matrix, fixed: np.ndarray) -> np.ndarray:
+        """x_u = (YtY + Yt(C_u - I)Y + reg*I)^-1 Yt C_u p_u for every row u"""
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors)
+        solved = np.zeros((ratings.shape[0], self.factors))
+        for row in range(ratings.shape[0]):
+            start, end = ratings.indptr[row], ratings.indptr[row + 1]
+            if start == end:
+                continue
+            factors = fixed[ratings.indices[start:end]]
+            liked = ratings.data[start:end] >= LIKE_RATING
+            a = gram + self.alpha * (factors.T @ factors)
+            b = (1.0 + self.alpha) * factors[liked].sum(axis=0)
+            solved[row] = np.linalg.solve(a, b)
+        return solved
+
+    def score_user(self, user_row: int) -> np.ndarray:
+        """Preference score of every item for a trained user"""
+        return self.item_factors @ self.user_factors[user_row]
+
+
+def item_user_scores(model: ItemItemCF, item_rows: np.ndarray, ratings, n_items: int) -> np.ndarray:
+    """Item-item scores of one user's ratings, scaled to [-1, 1] (-inf without support)"""
+    user_vector = build_rating_matrix(np.zeros(len(item_rows), dtype=np.int64), item_rows,
+                                      ratings, 1, n_items)
+    return model.score_user(user_vector) / MAX_DEVIATION
+
+
+def als_user_scores(model: ImplicitALS, user_row: int) -> np.ndarray:
+    """ALS preference scores of a trained user, clipped to [-1, 1]"""
+    return np.clip(model.score_user(user_row), -1.0, 1.0)
+
+
+def blend_scores(content_scores: np.ndarray, cf_scores: np.ndarray, cf_weight: float) -> np.ndarray:
+    """Add weighted collaborative scores where they exist (in place)"""
+    if cf_scores is not None and cf_weight > 0:
+        supported = np.isfinite(cf_scores)
+        content_scores[supported] += cf_weight * cf_scores[supported]
+    return content_scores
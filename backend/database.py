@@ -1,20 +1,219 @@
+import json
+import os
 import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
+from concurrent.futures import Future
+from itertools import islice
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Callable
+from backend import bulk_import, metrics
+from backend.rating_queue import RatingWriteQueue
+
+# Hot statements are kept as constants so sqlite3's per-connection
+# statement cache reuses the prepared statement on every call
+SELECT_ALL_SONGS = "SELECT * FROM songs"
+SELECT_ANY_SONG = "SELECT 1 FROM songs LIMIT 1"
+INSERT_RATING = '''
+    INSERT INTO user_ratings (user_id, song_id, rating)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id, song_id) DO UPDATE SET
+        rating = excluded.rating,
+        timestamp = CURRENT_TIMESTAMP
+'''
+# Bulk-imported ratings replace a stored rating unless they are older
+UPSERT_IMPORTED_RATING = '''
+    ON CONFLICT(user_id, song_id) DO UPDATE SET
+        rating = excluded.rating,
+        timestamp = excluded.timestamp
+    WHERE excluded.timestamp >= user_ratings.timestamp
+'''
+SELECT_PREVIOUS_RATING = '''
+    SELECT rating FROM user_ratings
+    WHERE user_id = ? AND song_id = ?
+'''
+SELECT_LATEST_USER_RATINGS = '''
+    SELECT song_id, rating FROM user_ratings
+    WHERE user_id = ?
+'''
+SELECT_USER_TASTE = '''
+    SELECT model_version, text_vector, audio_vector, weight
+    FROM user_taste WHERE user_id = ?
+'''
+UPSERT_USER_TASTE = '''
+    INSERT INTO user_taste (user_id, model_version, text_vector, audio_vector, weight, updated_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        model_version = excluded.model_version,
+        text_vector = excluded.text_vector,
+        audio_vector = excluded.audio_vector,
+        weight = excluded.weight,
+        updated_at = excluded.updated_at
+'''
+SELECT_USER_RATINGS = '''
+    SELECT ur.*, s.title, s.artist, s.genre 
+    FROM user_ratings ur
+    JOIN songs s ON ur.song_id = s.id
+    WHERE ur.user_id = ?
+'''
+
+# Schema migrations in order; a database at PRAGMA user_version N gets MIGRATIONS[N:]
+MIGRATIONS = [
+    # 1: one rating per (user, song) and indexes for the hot rating and song queries.
+    # The unique (user_id, song_id) index also serves every lookup by user_id alone.
+    [
+        '''DELETE FROM user_ratings
+           WHERE id NOT IN (SELECT MAX(id) FROM user_ratings GROUP BY user_id, song_id)''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_ratings_user_song ON user_ratings (user_id, song_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_ratings_song ON user_ratings (song_id)",
+        "CREATE INDEX IF NOT EXISTS idx_songs_genre_popularity ON songs (genre, popularity)",
+        "CREATE INDEX IF NOT EXISTS idx_songs_popularity ON songs (popularity)",
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
 
 class MusicDatabase:
     """Handles all database operations for the music recommendation system"""
     
-    def __init__(self, db_path="music_recommendations.db"):
+    def __init__(self, db_path="music_recommendations.db", cache_size_kb: int = 65536,
+                 mmap_size: int = 268435456, statement_cache_size: int = 256):
         self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache_size = statement_cache_size
+        
+        # File databases get one long-lived connection per thread so WAL readers
+        # run concurrently; in-memory databases share a single connection,
+        # otherwise every connect would see a fresh, empty database
+        self.is_memory = db_path == ":memory:" or str(db_path).startswith("file::memory:")
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._shared_conn = None
+        self._connections = []
+        self._rating_listeners = []
+        self._committed_rating_listeners = []
+        self._catalog_listeners = []
+        self._import_listeners = []
+        # Write-behind queue for ratings, started by start_write_behind()
+        self.rating_queue = None
+        
         self.init_database()
         self.seed_sample_data()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with WAL journaling and tuned pragmas"""
+        # Statements are only timed on connections opened while metrics are enabled
+        factory = metrics.TimedConnection if metrics.registry.enabled else sqlite3.Connection
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                               cached_statements=self.statement_cache_size,
+                               uri=str(self.db_path).startswith("file:"), factory=factory)
+        if not self.is_memory:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Long-lived connection for the calling thread"""
+        if self.is_memory:
+            if self._shared_conn is None:
+                with self._lock:
+                    if self._shared_conn is None:
+                        self._shared_conn = self._connect()
+                        self._connections.append(self._shared_conn)
+            return self._shared_conn
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def reading(self):
+        """Yield a connection for read queries"""
+        # A shared in-memory connection must not interleave with another thread's transaction
+        with self._lock if self.is_memory else nullcontext():
+            yield self.connection
+    
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one transaction, committing on success
+        
+        Nested use joins the outer transaction. Writers are serialized within the
+        process, so they never contend for the database write lock.
+        """
+        committed = []
+        with self._lock:
+            conn = self.connection
+            depth = getattr(self._local, 'depth', 0)
+            if depth == 0:
+                conn.execute("BEGIN IMMEDIATE")
+                self._local.after_commit = []
+            self._local.depth = depth + 1
+            try:
+                yield conn
+            except BaseException:
+                self._local.depth = depth
+                if depth == 0:
+                    self._local.after_commit = []
+                    conn.rollback()
+                raise
+            self._local.depth = depth
+            if depth == 0:
+                conn.commit()
+                committed, self._local.after_commit = self._local.after_commit, []
+        
+        # Outside the lock, so callbacks may read or write the database again
+        for callback in committed:
+            callback()
+    
+    def _after_commit(self, callback: Callable[[], None]):
+        """Run callback once the current transaction commits (dropped on rollback)"""
+        self._local.after_commit.append(callback)
+    
+    def close(self):
+        """Commit queued ratings, then close every connection opened by this database"""
+        if self.rating_queue is not None:
+            self.rating_queue.close()
+            self.rating_queue = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._shared_conn = None
+            self._local = threading.local()
+    
     def init_database(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # A database already at the current schema needs no write transaction
+        with self.reading() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
+        with self.transaction() as conn:
+            self._create_tables(conn.cursor())
+            self._migrate(conn.cursor())
+    
+    def _migrate(self, cursor: sqlite3.Cursor):
+        """Apply the schema migrations this database has not seen yet"""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], version + 1):
+            for sql in statements:
+                cursor.execute(sql)
+            # user_version is part of the transaction, so a failed migration is retried
+            cursor.execute(f"PRAGMA user_version = {number}")
+    
+    def _create_tables(self, cursor: sqlite3.Cursor):
+        """Create the base tables if they do not exist"""
         
         # Songs table
         cursor.execute('''
@@ -57,17 +256,74 @@ class MusicDatabase:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Rating-weighted taste vectors (float32 blobs) in the engine's model space
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_taste (
+                user_id TEXT PRIMARY KEY,
+                model_version TEXT NOT NULL,
+                text_vector BLOB NOT NULL,
+                audio_vector BLOB NOT NULL,
+                weight REAL NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Precomputed personal recommendations written by the batch job
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recommendations (
+                user_id TEXT NOT NULL,
+                rank INTEGER NOT NULL,
+                song_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                catalog_version TEXT NOT NULL,
+                generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, rank)
+            )
+        ''')
+        
+        # Users already processed by a batch run, for resuming
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS batch_progress (
+                run_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                PRIMARY KEY (run_id, user_id)
+            )
+        ''')
+        
+        # Change counter bumped by every write to the songs table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        
+        # Progress of resumable bulk imports, one row per source file
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                source TEXT PRIMARY KEY,
+                target_table TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                rows_read INTEGER NOT NULL DEFAULT 0,
+                rows_inserted INTEGER NOT NULL DEFAULT 0,
+                rows_skipped INTEGER NOT NULL DEFAULT 0,
+                deferred_indexes TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
     
     def seed_sample_data(self):
         """Add sample music data if database is empty"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM songs")
-        if cursor.fetchone()[0] > 0:
-            conn.close()
+        with self.reading() as conn:
+            if conn.execute(SELECT_ANY_SONG).fetchone() is not None:
+                return
+        with self.transaction() as conn:
+            self._seed_sample_data(conn.cursor())
+    
+    def _seed_sample_data(self, cursor: sqlite3.Cursor):
+        """Insert the sample songs when the songs table is empty"""
+        # Checking for one row stays O(1), unlike COUNT(*) over a large catalog
+        if cursor.execute(SELECT_ANY_SONG).fetchone() is not None:
             return
         
         # Sample songs with audio features
@@ -99,38 +355,409 @@ class MusicDatabase:
                              danceability, valence, acousticness, popularity)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', sample_songs)
-        
-        conn.commit()
-        conn.close()
+        self._bump_catalog_version(cursor)
+    
+    def _bump_catalog_version(self, cursor):
+        """Record a change to the songs table (call inside the writing transaction)"""
+        cursor.execute('''
+            INSERT INTO catalog_meta (key, value) VALUES ('change_counter', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+        ''')
+        for listener in self._catalog_listeners:
+            if listener not in self._local.after_commit:
+                self._after_commit(listener)
+    
+    def add_catalog_listener(self, listener: Callable[[], None]):
+        """Call listener() after every committed change to the songs table"""
+        self._catalog_listeners = self._catalog_listeners + [listener]
+    
+    def remove_catalog_listener(self, listener: Callable[[], None]):
+        """Stop calling a catalog listener"""
+        self._catalog_listeners = [entry for entry in self._catalog_listeners if entry != listener]
+    
+    def get_catalog_version(self) -> str:
+        """Version string that changes whenever the song catalog changes"""
+        with self.reading() as conn:
+            max_id, count = conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM songs").fetchone()
+            row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'change_counter'").fetchone()
+        return f"{max_id}-{count}-{row[0] if row else 0}"
     
     def get_all_songs(self) -> pd.DataFrame:
         """Retrieve all songs as a DataFrame"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM songs", conn)
-        conn.close()
-        return df
+        with self.reading() as conn:
+            return pd.read_sql_query(SELECT_ALL_SONGS, conn)
+    
+    def get_songs_by_ids(self, song_ids: List[int]) -> pd.DataFrame:
+        """Retrieve specific songs as a DataFrame, ordered by id"""
+        with self.reading() as conn:
+            placeholders = ', '.join('?' for _ in song_ids)
+            return pd.read_sql_query(f"SELECT * FROM songs WHERE id IN ({placeholders}) ORDER BY id",
+                                     conn, params=[int(song_id) for song_id in song_ids])
+    
+    def add_songs(self, songs: List[Dict]) -> List[int]:
+        """Insert songs (dicts keyed by songs column) and return their new ids"""
+        rows = [bulk_import.validate_record(song) for song in songs]
+        insert_sql = (f"INSERT INTO songs ({', '.join(bulk_import.SONG_COLUMNS)}) "
+                      f"VALUES ({', '.join('?' for _ in bulk_import.SONG_COLUMNS)})")
+        with self.transaction() as conn:
+            ids = [conn.execute(insert_sql, row).lastrowid for row in rows]
+            self._bump_catalog_version(conn)
+        return ids
+    
+    def remove_songs(self, song_ids: List[int]):
+        """Delete songs together with their ratings"""
+        params = [(int(song_id),) for song_id in song_ids]
+        with self.transaction() as conn:
+            # Taste vectors of users who rated these songs are rebuilt on next use
+            conn.executemany(
+                "DELETE FROM user_taste WHERE user_id IN (SELECT user_id FROM user_ratings WHERE song_id = ?)",
+                params)
+            conn.executemany("DELETE FROM user_ratings WHERE song_id = ?", params)
+            conn.executemany("DELETE FROM songs WHERE id = ?", params)
+            self._bump_catalog_version(conn)
+    
+    def add_rating_listener(self, listener: Callable[[str, int, int, int], None], after_commit: bool = False,
+                            key: str = None):
+        """Call listener(user_id, song_id, rating, previous_rating) on every add_rating
+        
+        Listeners run inside the rating transaction, or after it commits when
+        after_commit is set (for caches that must not refill from stale reads).
+        Of the listeners registered under the same key only the earliest one
+        still registered runs, so several engines sharing this database update
+        shared state such as the taste vectors once per rating.
+        """
+        if after_commit:
+            self._committed_rating_listeners = self._committed_rating_listeners + [(key, listener)]
+        else:
+            self._rating_listeners = self._rating_listeners + [(key, listener)]
+    
+    def remove_rating_listener(self, listener: Callable[[str, int, int, int], None]):
+        """Stop calling a rating listener"""
+        self._rating_listeners = [entry for entry in self._rating_listeners if entry[1] != listener]
+        self._committed_rating_listeners = [entry for entry in self._committed_rating_listeners
+                                            if entry[1] != listener]
+    
+    def add_ratings_import_listener(self, listener: Callable[[List[str], int], None]):
+        """Call listener(user_ids, n_ratings) after each committed chunk of import_ratings
+        
+        Imported ratings do not reach the rating listeners, so caches and
+        models keyed on ratings are told about each chunk in bulk.
+        """
+        self._import_listeners = self._import_listeners + [listener]
+    
+    def remove_ratings_import_listener(self, listener: Callable[[List[str], int], None]):
+        """Stop calling an import listener"""
+        self._import_listeners = [entry for entry in self._import_listeners if entry != listener]
+    
+    @staticmethod
+    def _active_listeners(entries: List[Tuple[str, Callable]]) -> List[Callable]:
+        """Listeners to call: every unkeyed one and the first one per key"""
+        keys = set()
+        listeners = []
+        for key, listener in entries:
+            if key is not None:
+                if key in keys:
+                    continue
+                keys.add(key)
+            listeners.append(listener)
+        return listeners
     
     def add_rating(self, user_id: str, song_id: int, rating: int):
-        """Add or update a user rating for a song"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Add or update a user rating for a song
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_ratings (user_id, song_id, rating)
-            VALUES (?, ?, ?)
-        ''', (user_id, song_id, rating))
+        While write-behind runs, the rating goes through the queue and this
+        waits for its commit, so it lands after the ratings queued before it.
+        """
+        queue = self.rating_queue
+        if queue is not None and not getattr(self._local, 'depth', 0):
+            future = queue.submit(user_id, song_id, rating)
+            # Commits the waiting batch now rather than after the batch delay
+            queue.wait_for_user(user_id)
+            future.result()
+            return
+        self.add_ratings([(user_id, song_id, rating)])
+    
+    def add_ratings(self, ratings: List[Tuple[str, int, int]]):
+        """Add or update several (user_id, song_id, rating) ratings in one transaction"""
+        listeners = self._active_listeners(self._rating_listeners)
+        committed_listeners = self._active_listeners(self._committed_rating_listeners)
+        with self.transaction() as conn:
+            for user_id, song_id, rating in ratings:
+                previous = conn.execute(SELECT_PREVIOUS_RATING, (user_id, song_id)).fetchone()
+                conn.execute(INSERT_RATING, (user_id, song_id, rating))
+                # Precomputed recommendations no longer reflect this user's taste
+                conn.execute("DELETE FROM recommendations WHERE user_id = ?", (user_id,))
+                previous = previous[0] if previous else None
+                for listener in listeners:
+                    listener(user_id, song_id, rating, previous)
+                for listener in committed_listeners:
+                    self._after_commit(lambda listener=listener, user_id=user_id, song_id=song_id,
+                                       rating=rating, previous=previous:
+                                       listener(user_id, song_id, rating, previous))
+    
+    def start_write_behind(self, max_batch: int = 500, max_delay: float = 0.05) -> RatingWriteQueue:
+        """Route queue_rating through a group-committing writer thread"""
+        with self._lock:
+            if self.rating_queue is None:
+                self.rating_queue = RatingWriteQueue(self, max_batch, max_delay)
+            return self.rating_queue
+    
+    def queue_rating(self, user_id: str, song_id: int, rating: int) -> Future:
+        """Add a rating without waiting for its commit (synchronously without write-behind)
         
-        conn.commit()
-        conn.close()
+        The returned future completes once the rating is committed.
+        """
+        queue = self.rating_queue
+        if queue is not None:
+            return queue.submit(user_id, song_id, rating)
+        future = Future()
+        try:
+            self.add_rating(user_id, song_id, rating)
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
+        return future
+    
+    def wait_for_user(self, user_id: str):
+        """Make the user's queued ratings visible to the reads that follow
+        
+        Inside a transaction this returns at once: the writer thread needs the
+        lock the transaction holds, so waiting for it would deadlock.
+        """
+        queue = self.rating_queue
+        if queue is not None and not getattr(self._local, 'depth', 0):
+            queue.wait_for_user(user_id)
+    
+    def flush_ratings(self):
+        """Commit every queued rating"""
+        queue = self.rating_queue
+        if queue is not None:
+            queue.flush()
+    
+    def get_latest_user_ratings(self, user_id: str) -> Tuple[List[int], List[int]]:
+        """Song ids and ratings of a user (one rating per song)"""
+        self.wait_for_user(user_id)
+        with self.reading() as conn:
+            rows = conn.execute(SELECT_LATEST_USER_RATINGS, (user_id,)).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+    
+    def get_rating_triples(self, batch_size: int = 100000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """User ids, song ids and ratings of every rating, as arrays"""
+        user_ids, song_ids, ratings = [], [], []
+        with self.reading() as conn:
+            cursor = conn.execute("SELECT user_id, song_id, rating FROM user_ratings")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch_users, batch_songs, batch_ratings = zip(*rows)
+                user_ids.extend(batch_users)
+                song_ids.append(np.array(batch_songs, dtype=np.int64))
+                ratings.append(np.array(batch_ratings, dtype=np.float32))
+        if not user_ids:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.array(user_ids, dtype=object), np.concatenate(song_ids), np.concatenate(ratings)
+    
+    def get_rated_song_ids(self, user_id: str) -> List[int]:
+        """Ids of every song the user has rated"""
+        self.wait_for_user(user_id)
+        with self.reading() as conn:
+            rows = conn.execute("SELECT song_id FROM user_ratings WHERE user_id = ?",
+                                (user_id,)).fetchall()
+        return [row[0] for row in rows]
+    
+    def get_user_taste(self, user_id: str):
+        """Stored taste vector of a user, or None"""
+        self.wait_for_user(user_id)
+        with self.reading() as conn:
+            row = conn.execute(SELECT_USER_TASTE, (user_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'model_version': row[0],
+            'text_vector': np.frombuffer(row[1], dtype=np.float32).astype(np.float64),
+            'audio_vector': np.frombuffer(row[2], dtype=np.float32).astype(np.float64),
+            'weight': row[3],
+        }
+    
+    def save_user_taste(self, user_id: str, profile: Dict):
+        """Store a user's taste vector"""
+        with self.transaction() as conn:
+            conn.execute(UPSERT_USER_TASTE, (
+                user_id, profile['model_version'],
+                np.asarray(profile['text_vector'], dtype=np.float32).tobytes(),
+                np.asarray(profile['audio_vector'], dtype=np.float32).tobytes(),
+                float(profile['weight']),
+            ))
     
     def get_user_ratings(self, user_id: str) -> pd.DataFrame:
         """Get all ratings for a specific user"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query('''
-            SELECT ur.*, s.title, s.artist, s.genre 
-            FROM user_ratings ur
-            JOIN songs s ON ur.song_id = s.id
-            WHERE ur.user_id = ?
-        ''', conn, params=(user_id,))
-        conn.close()
-        return df
\ No newline at end of file
+        self.wait_for_user(user_id)
+        with self.reading() as conn:
+            return pd.read_sql_query(SELECT_USER_RATINGS, conn, params=(user_id,))
+    
+    def import_songs(self, path: str, fmt: str = None, chunk_size: int = 10000,
+                     progress: Callable[[Dict], None] = None) -> Dict:
+        """Stream a CSV/JSONL song catalog into the songs table
+        
+        Rows are validated against the songs schema and inserted with executemany,
+        one transaction per chunk. Secondary indexes on songs are dropped for the
+        load and rebuilt at the end. If the import is interrupted, calling it again
+        with the same file resumes after the last committed chunk.
+        """
+        return self._bulk_import(path, 'songs', bulk_import.SONG_COLUMNS,
+                                 bulk_import.validate_record, fmt, chunk_size, progress)
+    
+    def import_ratings(self, path: str, fmt: str = None, chunk_size: int = 50000,
+                       progress: Callable[[Dict], None] = None) -> Dict:
+        """Bulk-load a historical rating log (CSV or JSON lines)
+        
+        Records carry user_id, song_id, rating and an optional timestamp. A
+        rating replaces an existing one for the same user and song unless it is
+        older. Stored taste vectors and precomputed recommendations of the
+        imported users are dropped so they are rebuilt from the new ratings;
+        rating listeners are not called, import listeners get each chunk.
+        """
+        return self._bulk_import(path, 'user_ratings', bulk_import.RATING_COLUMNS,
+                                 bulk_import.validate_rating, fmt, chunk_size, progress,
+                                 on_conflict=UPSERT_IMPORTED_RATING)
+    
+    def _bulk_import(self, path: str, table: str, columns: List[str], validate: Callable,
+                     fmt: str = None, chunk_size: int = 10000,
+                     progress: Callable[[Dict], None] = None, on_conflict: str = '') -> Dict:
+        """Chunked, restartable bulk load of a record file into a table"""
+        source = os.path.abspath(path)
+        fingerprint = bulk_import.file_fingerprint(source)
+        insert_sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)}) {on_conflict}")
+        
+        with self.transaction() as conn:
+            checkpoint = conn.execute(
+                "SELECT fingerprint, rows_read, rows_inserted, rows_skipped, deferred_indexes "
+                "FROM import_checkpoints WHERE source = ?", (source,)).fetchone()
+            if checkpoint is not None and checkpoint[0] != fingerprint:
+                raise ValueError(f"{path} changed since its interrupted import; "
+                                 f"clear its import_checkpoints row to start over")
+            if checkpoint is None:
+                deferred = self._drop_indexes(conn, table)
+                conn.execute('''
+                    INSERT INTO import_checkpoints (source, target_table, fingerprint, deferred_indexes)
+                    VALUES (?, ?, ?, ?)
+                ''', (source, table, fingerprint, json.dumps(deferred)))
+                checkpoint = (fingerprint, 0, 0, 0, json.dumps(deferred))
+        
+        _, rows_read, rows_inserted, rows_skipped, deferred = checkpoint
+        report = {
+            'source': source,
+            'resumed_from_row': rows_read,
+            'rows_read': rows_read,
+            'rows_inserted': rows_inserted,
+            'rows_skipped': rows_skipped,
+            'errors': [],
+        }
+        
+        start = time.perf_counter()
+        inserted_this_run = 0
+        records = bulk_import.iter_records(source, fmt)
+        if rows_read:
+            records = islice(records, rows_read, None)
+        for chunk in bulk_import.chunked(records, chunk_size):
+            rows = bulk_import.validate_chunk(chunk, validate, report['errors'], report['rows_read'])
+            with self.transaction() as conn:
+                conn.executemany(insert_sql, rows)
+                if table == 'songs':
+                    self._bump_catalog_version(conn)
+                elif table == 'user_ratings':
+                    user_ids = list({row[0] for row in rows})
+                    users = [(user_id,) for user_id in user_ids]
+                    conn.executemany("DELETE FROM user_taste WHERE user_id = ?", users)
+                    conn.executemany("DELETE FROM recommendations WHERE user_id = ?", users)
+                    for listener in self._import_listeners:
+                        self._after_commit(lambda listener=listener, user_ids=user_ids, n_rows=len(rows):
+                                           listener(user_ids, n_rows))
+                report['rows_read'] += len(chunk)
+                report['rows_inserted'] += len(rows)
+                report['rows_skipped'] += len(chunk) - len(rows)
+                conn.execute('''
+                    UPDATE import_checkpoints
+                    SET rows_read = ?, rows_inserted = ?, rows_skipped = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE source = ?
+                ''', (report['rows_read'], report['rows_inserted'], report['rows_skipped'], source))
+            inserted_this_run += len(rows)
+            if progress is not None:
+                progress(dict(report))
+        
+        # Rebuild deferred indexes and clear the checkpoint in one step
+        with self.transaction() as conn:
+            for sql in json.loads(deferred or '[]'):
+                conn.execute(sql)
+            conn.execute("DELETE FROM import_checkpoints WHERE source = ?", (source,))
+        
+        report['seconds'] = time.perf_counter() - start
+        report['rows_per_sec'] = inserted_this_run / report['seconds'] if report['seconds'] > 0 else 0.0
+        return report
+    
+    @staticmethod
+    def _drop_indexes(conn: sqlite3.Connection, table: str) -> List[str]:
+        """Drop the non-unique explicit indexes on a table, returning the SQL to recreate them"""
+        # Unique indexes stay: inserts may rely on them for conflict handling
+        indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+            "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'",
+            (table,)).fetchall()
+        for name, _ in indexes:
+            conn.execute(f'DROP INDEX "{name}"')
+        return [sql for _, sql in indexes]
+    
+    def get_rating_user_ids(self) -> List[str]:
+        """Every user with at least one rating"""
+        with self.reading() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM user_ratings ORDER BY user_id")]
+    
+    def get_completed_batch_users(self, run_id: str) -> set:
+        """Users a batch run has already written recommendations for"""
+        with self.reading() as conn:
+            return {row[0] for row in conn.execute("SELECT user_id FROM batch_progress WHERE run_id = ?", (run_id,))}
+    
+    def save_recommendations(self, run_id: str, catalog_version: str, results: Dict[str, List[Tuple[int, float]]]):
+        """Replace the stored recommendations of a batch of users and checkpoint them"""
+        users = [(user_id,) for user_id in results]
+        rows = [(user_id, rank, int(song_id), float(score), catalog_version)
+                for user_id, recs in results.items()
+                for rank, (song_id, score) in enumerate(recs, 1)]
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM recommendations WHERE user_id = ?", users)
+            conn.executemany('''
+                INSERT INTO recommendations (user_id, rank, song_id, score, catalog_version)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.executemany("INSERT OR IGNORE INTO batch_progress (run_id, user_id) VALUES (?, ?)",
+                             [(run_id, user_id) for user_id in results])
+    
+    def get_stored_recommendations(self, user_id: str, catalog_version: str, n_recommendations: int = 10):
+        """Precomputed recommendations for a user, or None if missing or stale
+        
+        An entry is fresh when it was generated for the current catalog version;
+        add_rating deletes the entries of the rating user.
+        """
+        self.wait_for_user(user_id)
+        with self.reading() as conn:
+            rows = conn.execute('''
+                SELECT r.song_id, s.title, s.artist, s.genre, s.year, r.score
+                FROM recommendations r
+                JOIN songs s ON r.song_id = s.id
+                WHERE r.user_id = ? AND r.catalog_version = ?
+                ORDER BY r.rank
+                LIMIT ?
+            ''', (user_id, catalog_version, n_recommendations)).fetchall()
+        if not rows:
+            return None
+        return [{
+            'id': song_id,
+            'title': title,
+            'artist': artist,
+            'genre': genre,
+            'year': year,
+            'similarity_score': score
+        } for song_id, title, artist, genre, year, score in rows]
\ No newline at end of file
@@ -0,0 +1,94 @@
+import heapq
+import re
+import numpy as np
+from typing import Dict, List
+
+
+def genre_keys(genre, known_genres=frozenset()) -> List[str]:
+    """Index keys of a genre: its normalized name, then each parent genre among known_genres
+
+    A parent is a leading run of words that is itself a known genre, so with
+    "alternative" in the catalog "Alternative Rock" is found under both
+    "alternative rock" and "alternative", while "Hip Hop" never yields "hip".
+    """
+    words = re.sub(r'[^0-9a-z]+', ' ', str(genre).lower()).split()
+    if not words:
+        return []
+    name = ' '.join(words)
+    parents = [' '.join(words[:length]) for length in range(len(words) - 1, 0, -1)]
+    return [name] + [parent for parent in parents if parent in known_genres]
+
+
+class GenreIndex:
+    """Song rows by genre, each list pre-sorted by popularity, plus the global ranking
+
+    Ties keep catalog order; songs without a popularity rank last.
+    """
+
+    def __init__(self, genre_codes: np.ndarray, genre_names: np.ndarray, popularity: np.ndarray):
+        # Sort key: lower is more popular
+        self._key = np.where(np.isnan(popularity), np.inf, -popularity)
+        self.ranking = np.argsort(self._key, kind='stable').astype(np.int32)
+
+        # Group the ranking by genre code; each group stays in popularity order
+        by_genre = self.ranking[np.argsort(genre_codes[self.ranking], kind='stable')]
+        bounds = np.searchsorted(genre_codes[by_genre], np.arange(len(genre_names) + 1))
+        groups: Dict[str, List[np.ndarray]] = {}
+        known = {keys[0] for keys in map(genre_keys, genre_names.tolist()) if keys}
+        for code, name in enumerate(genre_names.tolist()):
+            for key in genre_keys(name, known):
+                groups.setdefault(key, []).append(by_genre[bounds[code]:bounds[code + 1]])
+
+        # Keys shared by several genres (e.g. a parent genre) merge their groups by rank
+        rank = np.empty_like(self.ranking)
+        rank[self.ranking] = np.arange(len(self.ranking), dtype=self.ranking.dtype)
+        self.postings: Dict[str, np.ndarray] = {}
+        for key, parts in groups.items():
+            rows = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            if len(parts) > 1:
+                rows = rows[np.argsort(rank[rows], kind='stable')]
+            self.postings[key] = rows
+
+    def nbytes(self) -> int:
+        """Bytes held by the ranking and the per-genre lists"""
+        return self._key.nbytes + self.ranking.nbytes + sum(rows.nbytes for rows in self.postings.values())
+
+    def popular(self, k: int) -> np.ndarray:
+        """Rows of the k most popular songs"""
+        return self.ranking[:k]
+
+    def _lists(self, genres: List[str]) -> List[np.ndarray]:
+        """Popularity-sorted rows of each requested genre that exists"""
+        lists = []
+        for genre in genres:
+            # A request is matched on its full name only
+            keys = genre_keys(genre)
+            if keys and keys[0] in self.postings:
+                lists.append(self.postings[keys[0]])
+        return lists
+
+    def genre_mask(self, genres: List[str]) -> np.ndarray:
+        """Boolean row mask of the songs in any of the genres"""
+        mask = np.zeros(len(self.ranking), dtype=bool)
+        for rows in self._lists(genres):
+            mask[rows] = True
+        return mask
+
+    def top_rows(self, genres: List[str], k: int) -> np.ndarray:
+        """Rows of the k most popular songs in any of the genres (k-way merge of the lists)"""
+        lists = self._lists(genres)
+        if len(lists) == 1:
+            return lists[0][:k]
+
+        heap = [(self._key[rows[0]], rows[0], i, 0) for i, rows in enumerate(lists)]
+        heapq.heapify(heap)
+        top, seen = [], set()
+        while heap and len(top) < k:
+            _, row, i, position = heapq.heappop(heap)
+            if row not in seen:
+                seen.add(row)
+                top.append(row)
+            if position + 1 < len(lists[i]):
+                next_row = lists[i][position + 1]
+                heapq.heappush(heap, (self._key[next_row], next_row, i, position + 1))
+        return np.asarray(top, dtype=np.int64)
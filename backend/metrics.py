@@ -0,0 +1,298 @@
+import functools
+import json
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Statement labels are the SQL with whitespace collapsed, cut to this length
+MAX_LABEL_LENGTH = 120
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        total, pairs = 0, []
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            pairs.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return pairs
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'buckets': dict(self.cumulative()),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms, counters and slow queries
+
+    Families: 'call' (public engine methods), 'query' and 'query_rows' (SQL
+    statements), 'phase' (steps of load_data) and the 'errors' counter.
+    """
+
+    def __init__(self, slow_query_seconds: float = 0.1, slow_query_log_size: int = 100):
+        self.enabled = False
+        self.slow_query_seconds = slow_query_seconds
+        self.slow_queries = deque(maxlen=slow_query_log_size)
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, family: str, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Add one observation to the histogram family{name}"""
+        with self._lock:
+            histogram = self._histograms.get((family, name))
+            if histogram is None:
+                histogram = self._histograms[(family, name)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, family: str, name: str, amount: float = 1):
+        """Add to the counter family{name}"""
+        with self._lock:
+            self._counters[(family, name)] = self._counters.get((family, name), 0) + amount
+
+    def record_query(self, sql: str, seconds: float, rows: int):
+        """Record one SQL statement, logging it if it was slow"""
+        label = statement_label(sql)
+        self.observe('query', label, seconds)
+        self.observe('query_rows', label, rows, ROW_BUCKETS)
+        if seconds >= self.slow_query_seconds:
+            with self._lock:
+                self.slow_queries.append({'sql': ' '.join(sql.split()), 'seconds': seconds, 'rows': rows,
+                                          'at': time.time()})
+
+    def phase(self, name: str):
+        """Context manager timing one phase of a larger operation"""
+        if not self.enabled:
+            return _NOOP
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('phase', name, time.perf_counter() - start)
+
+    def reset(self):
+        """Drop everything recorded so far"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.slow_queries.clear()
+
+    def to_dict(self) -> Dict:
+        """All metrics as plain data"""
+        with self._lock:
+            histograms, counters = {}, {}
+            for (family, name), histogram in sorted(self._histograms.items()):
+                histograms.setdefault(family, {})[name] = histogram.to_dict()
+            for (family, name), value in sorted(self._counters.items()):
+                counters.setdefault(family, {})[name] = value
+            return {'histograms': histograms, 'counters': counters, 'slow_queries': list(self.slow_queries)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = 'simisong') -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            families = {}
+            for (family, name), histogram in sorted(self._histograms.items()):
+                families.setdefault(family, []).append((name, histogram))
+            for family, entries in families.items():
+                metric = f"{prefix}_{family}" + ('' if family.endswith('rows') else '_seconds')
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in entries:
+                    label = f'name="{_escape(name)}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f"{metric}_sum{{{label}}} {histogram.sum!r}")
+                    lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+            counter_families = {}
+            for (family, name), value in sorted(self._counters.items()):
+                counter_families.setdefault(family, []).append((name, value))
+            for family, entries in counter_families.items():
+                metric = f"{prefix}_{family}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for name, value in entries:
+                    lines.append(f'{metric}{{name="{_escape(name)}"}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str):
+        """Write the metrics to a file: Prometheus text for .prom/.txt, JSON otherwise"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def statement_label(sql: str) -> str:
+    """Compact label for a SQL statement"""
+    label = re.sub(r'\s+', ' ', sql).strip()
+    return label if len(label) <= MAX_LABEL_LENGTH else label[:MAX_LABEL_LENGTH - 3] + '...'
+
+
+# Process-wide registry used by @timed, phase() and the database connections.
+# It starts disabled: @timed then costs one attribute check, phase() returns a
+# shared no-op context and databases open plain connections.
+registry = MetricsRegistry()
+
+
+def enable(slow_query_seconds: float = None):
+    """Start recording (databases opened afterwards time their statements)"""
+    if slow_query_seconds is not None:
+        registry.slow_query_seconds = slow_query_seconds
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
+
+
+def phase(name: str):
+    """Time a phase on the process-wide registry"""
+    return registry.phase(name)
+
+
+def timed(method):
+    """Record the latency of every call (and failed calls) under the method's qualified name"""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not registry.enabled:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            registry.increment('errors', name)
+            raise
+        finally:
+            registry.observe('call', name, time.perf_counter() - start)
+    return wrapper
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's time and row count to the registry
+
+    A statement is timed from execute until its rows are exhausted, the
+    cursor runs the next statement, or it is closed; rows are those fetched
+    (SELECT) or changed (DML).
+    """
+
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._statement = [sql, start, 0]
+        if self.description is None:
+            self._finish(max(self.rowcount, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._statement = [sql, start, 0]
+        self._finish(max(self.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is None:
+            self._finish()
+        elif self._statement is not None:
+            self._statement[2] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._statement is not None:
+            self._statement[2] += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if self._statement is not None:
+            self._statement[2] += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        if self._statement is not None:
+            self._statement[2] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _finish(self, rows: int = None):
+        statement, self._statement = self._statement, None
+        if statement is not None and registry.enabled:
+            sql, start, fetched = statement
+            registry.record_query(sql, time.perf_counter() - start, fetched if rows is None else rows)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including those behind execute) are TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
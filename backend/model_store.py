@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import StandardScaler
+from typing import Dict, Optional
+
+# meta.json is written last, so its presence marks a complete artifact
+META_FILE = 'meta.json'
+# Names the version directory holding the current artifact; replaced atomically
+CURRENT_FILE = 'CURRENT'
+
+
+def _array_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.npy")
+
+
+def save_artifact(directory: str, version: str, params: Dict, song_ids: np.ndarray,
+                  vectorizer: TfidfVectorizer, scaler: StandardScaler,
+                  tfidf_matrix, feature_matrix, neighbor_index=None):
+    """Write the fitted models and matrices for a catalog version to disk
+
+    Every save goes to a new version directory, which CURRENT then names.
+    Files another engine may have memory-mapped are never rewritten: older
+    version directories are only unlinked, which leaves existing maps valid.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix='v-', dir=directory)
+    meta_path = os.path.join(version_dir, META_FILE)
+
+    tfidf = sparse.csr_matrix(tfidf_matrix)
+    arrays = {
+        'song_ids': np.asarray(song_ids),
+        'idf': vectorizer.idf_,
+        'tfidf_data': tfidf.data,
+        'tfidf_indices': tfidf.indices,
+        'tfidf_indptr': tfidf.indptr,
+        'features': np.asarray(feature_matrix),
+    }
+    if neighbor_index is not None and neighbor_index.indices is not None:
+        arrays['neighbor_indices'] = neighbor_index.indices
+        arrays['neighbor_scores'] = neighbor_index.scores
+        arrays['neighbor_audio'] = neighbor_index.audio_vectors
+    for name, array in arrays.items():
+        np.save(_array_path(version_dir, name), array)
+
+    meta = {
+        'version': version,
+        'params': params,
+        'vocabulary': {term: int(i) for term, i in vectorizer.vocabulary_.items()},
+        'tfidf_shape': list(tfidf.shape),
+        'tfidf_dtype': np.dtype(vectorizer.dtype).name,
+        'scaler': {
+            'mean': scaler.mean_.tolist(),
+            'scale': scaler.scale_.tolist(),
+            'var': scaler.var_.tolist(),
+            'n_samples_seen': int(scaler.n_samples_seen_),
+            'feature_names': [str(name) for name in getattr(scaler, 'feature_names_in_', [])],
+        },
+        'neighbor_method': getattr(neighbor_index, 'resolved_method', None),
+        'arrays': sorted(arrays),
+    }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    current_path = os.path.join(directory, CURRENT_FILE)
+    tmp_path = f"{current_path}.{os.path.basename(version_dir)}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(version_dir))
+    previous_dir = _current_dir(directory)
+    os.replace(tmp_path, current_path)
+
+    # Only the version this save replaced is removed, never one still being written;
+    # mapped files of a removed version stay readable until their maps are closed
+    if previous_dir is not None and previous_dir != version_dir:
+        shutil.rmtree(previous_dir, ignore_errors=True)
+
+
+def _current_dir(directory: str) -> Optional[str]:
+    """Version directory named by CURRENT, or None"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as f:
+            return os.path.join(directory, f.read().strip())
+    except OSError:
+        return None
+
+
+def load_artifact(directory: str, version: str, params: Dict, mmap: bool = True) -> Optional[Dict]:
+    """Load the artifact for a catalog version, or None if it is missing or stale
+
+    Dense arrays are memory-mapped, and the sparse TF-IDF matrix is assembled
+    directly over its mapped components, so loading copies almost nothing.
+    """
+    version_dir = _current_dir(directory)
+    if version_dir is None:
+        return None
+    try:
+        with open(os.path.join(version_dir, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != version or meta.get('params') != params:
+            return None
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(_array_path(version_dir, name), mmap_mode=mode) for name in meta['arrays']}
+    except OSError:
+        # Replaced by a concurrent save between reading CURRENT and the files
+        return None
+
+    # Compact engines fit float32 TF-IDF; new songs must transform to the same dtype
+    vectorizer = TfidfVectorizer(stop_words='english', max_features=params.get('max_features'),
+                                 dtype=np.dtype(meta.get('tfidf_dtype', 'float64')))
+    vectorizer.vocabulary_ = meta['vocabulary']
+    vectorizer.idf_ = np.asarray(arrays['idf'])
+
+    scaler = StandardScaler()
+    scaler.mean_ = np.asarray(meta['scaler']['mean'])
+    scaler.scale_ = np.asarray(meta['scaler']['scale'])
+    scaler.var_ = np.asarray(meta['scaler']['var'])
+    scaler.n_samples_seen_ = meta['scaler']['n_samples_seen']
+    scaler.n_features_in_ = len(scaler.mean_)
+    if meta['scaler']['feature_names']:
+        scaler.feature_names_in_ = np.asarray(meta['scaler']['feature_names'], dtype=object)
+
+    tfidf_matrix = sparse.csr_matrix(
+        (arrays['tfidf_data'], arrays['tfidf_indices'], arrays['tfidf_indptr']),
+        shape=tuple(meta['tfidf_shape']), copy=False)
+
+    return {
+        'song_ids': arrays['song_ids'],
+        'vectorizer': vectorizer,
+        'scaler': scaler,
+        'tfidf_matrix': tfidf_matrix,
+        'feature_matrix': arrays['features'],
+        'neighbor_indices': arrays.get('neighbor_indices'),
+        'neighbor_scores': arrays.get('neighbor_scores'),
+        'neighbor_audio': arrays.get('neighbor_audio'),
+        'neighbor_method': meta.get('neighbor_method'),
+    }
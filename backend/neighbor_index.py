@@ -0,0 +1,411 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from typing import Dict, List, Optional, Sequence, Tuple
+from backend.shared_arrays import SharedArrays, attach, attach_csr
+
+# Weights used to blend text and audio cosine similarity
+TEXT_WEIGHT = 0.3
+AUDIO_WEIGHT = 0.7
+
+# Catalog size above which the 'auto' method switches to LSH buckets
+AUTO_EXACT_LIMIT = 50000
+
+# Narrowest column tile a memory budget may force before rows are cut instead
+MIN_COLUMN_TILE = 1024
+
+# Per-process tile matrices mapped by the pool initializer
+_tile_vectors = None
+
+
+def _unit_rows(text: sparse.csr_matrix) -> bool:
+    """Whether every non-empty row already has unit L2 norm (e.g. TF-IDF output)"""
+    norms = np.sqrt(np.asarray(text.multiply(text).sum(axis=1)).ravel())
+    return bool(np.allclose(norms[norms > 0], 1.0, atol=1e-4))
+
+
+def prepare_vectors(tfidf_matrix, feature_matrix, audio: np.ndarray = None) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """L2-normalize text and audio rows so dot products are cosine similarities
+
+    float32 inputs (compact engines) stay float32; anything else becomes float64.
+    Text rows that are already unit length and already normalized audio are
+    used as they are, so memory-mapped inputs are not copied into RAM.
+    """
+    text = tfidf_matrix if sparse.isspmatrix_csr(tfidf_matrix) else sparse.csr_matrix(tfidf_matrix)
+    if not _unit_rows(text):
+        text = normalize(text, norm='l2', copy=True)
+    if audio is None:
+        audio = np.asarray(feature_matrix)
+        if audio.dtype != np.float32:
+            audio = audio.astype(np.float64)
+        audio = normalize(audio, norm='l2', copy=True)
+    return text, audio
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return per-row indices and scores of the k largest entries, best first"""
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int32), empty.astype(np.float32)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    indices = np.take_along_axis(part, order, axis=1)
+    return indices.astype(np.int32), np.take_along_axis(part_scores, order, axis=1).astype(np.float32)
+
+
+def tile_sizes(n_items: int, k: int, memory_budget: Optional[int] = None, workers: int = 1,
+               max_rows: int = 1024, itemsize: int = 8) -> Tuple[int, int]:
+    """(rows, columns) of a similarity tile whose scratch fits the memory budget
+
+    The budget (bytes) is shared by the workers. A tile costs about three score
+    matrices plus the argpartition indices per cell; without a budget a tile
+    spans every column.
+    """
+    rows = max(1, min(max_rows, n_items))
+    if memory_budget is None:
+        return rows, max(n_items, 1)
+    cells = max(memory_budget // max(workers, 1) // (3 * itemsize + 8), 1)
+    columns = min(n_items, max(cells // rows, MIN_COLUMN_TILE, k + 1))
+    return max(1, min(rows, cells // columns)), max(columns, 1)
+
+
+def tile_top_k(text, audio, rows: np.ndarray, k: int, column_tile: int, exclude_self: bool = True,
+               allowed: np.ndarray = None, first_column: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k neighbors of the given rows, scoring the catalog one column tile at a time
+
+    Only a running top-k per row survives each tile, so memory is bounded by
+    the tile rather than the catalog. Columns before first_column or outside
+    the allowed mask never enter the top-k. Rows with fewer than k candidates
+    are padded with index -1 and score -inf.
+    """
+    rows = np.asarray(rows)
+    if k <= 0:
+        return np.empty((len(rows), 0), dtype=np.int32), np.empty((len(rows), 0), dtype=np.float32)
+    n_items = text.shape[0]
+    best_idx = np.empty((len(rows), 0), dtype=np.int64)
+    best_scores = np.empty((len(rows), 0))
+    text_rows, audio_rows = text[rows], audio[rows]
+    for start in range(first_column, n_items, column_tile):
+        stop = min(start + column_tile, n_items)
+        sims = TEXT_WEIGHT * (text_rows @ text[start:stop].T).toarray()
+        sims += AUDIO_WEIGHT * (audio_rows @ audio[start:stop].T)
+        if allowed is not None:
+            sims[:, ~allowed[start:stop]] = -np.inf
+        if exclude_self:
+            inside = (rows >= start) & (rows < stop)
+            sims[np.flatnonzero(inside), rows[inside] - start] = -np.inf
+        cand_idx = np.concatenate([best_idx, np.broadcast_to(np.arange(start, stop), sims.shape)], axis=1)
+        cand_scores = np.concatenate([best_scores, sims], axis=1)
+        if cand_scores.shape[1] > k:
+            part = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            cand_idx = np.take_along_axis(cand_idx, part, axis=1)
+            cand_scores = np.take_along_axis(cand_scores, part, axis=1)
+        best_idx, best_scores = cand_idx, cand_scores
+
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    indices = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    width = best_idx.shape[1]
+    indices[:, :width] = np.take_along_axis(best_idx, order, axis=1)
+    scores[:, :width] = np.take_along_axis(best_scores, order, axis=1)
+    indices[~np.isfinite(scores)] = -1
+    return indices, scores
+
+
+def _init_tile_worker(directory: str):
+    global _tile_vectors
+    _tile_vectors = (attach_csr(directory, 'text'), attach(directory, 'audio'))
+
+
+def _tile_worker(start: int, stop: int, k: int, column_tile: int) -> Tuple[np.ndarray, np.ndarray]:
+    text, audio = _tile_vectors
+    return tile_top_k(text, audio, np.arange(start, stop), k, column_tile)
+
+
+def exact_neighbors(text, audio, k: int, memory_budget: Optional[int] = None, workers: int = 1,
+                    max_rows: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """All-pairs top-k over normalized vectors, in tiles bounded by a memory budget
+
+    With several workers, row tiles are spread across a process pool that maps
+    the vectors from shared memory instead of receiving copies.
+    """
+    n_items = text.shape[0]
+    rows, columns = tile_sizes(n_items, k, memory_budget, workers, max_rows, audio.dtype.itemsize)
+    indices = np.empty((n_items, k), dtype=np.int32)
+    scores = np.empty((n_items, k), dtype=np.float32)
+    starts = range(0, n_items, rows)
+    if workers <= 1 or len(starts) < 2:
+        for start in starts:
+            stop = min(start + rows, n_items)
+            indices[start:stop], scores[start:stop] = tile_top_k(text, audio, np.arange(start, stop), k, columns)
+        return indices, scores
+
+    with SharedArrays() as shared:
+        shared.put_csr('text', text)
+        shared.put('audio', audio)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_tile_worker,
+                                 initargs=(shared.directory,)) as pool:
+            stops = [min(start + rows, n_items) for start in starts]
+            tiles = pool.map(_tile_worker, starts, stops, [k] * len(stops), [columns] * len(stops))
+            for start, stop, (tile_idx, tile_scores) in zip(starts, stops, tiles):
+                indices[start:stop], scores[start:stop] = tile_idx, tile_scores
+    return indices, scores
+
+
+class NeighborIndex:
+    """Precomputed top-K neighbors for every song under the weighted similarity"""
+
+    def __init__(self, k: int = 20, method: str = 'auto', block_size: int = 1024,
+                 n_planes: int = 12, n_tables: int = 4, seed: int = 0,
+                 memory_budget: Optional[int] = None, workers: int = 1):
+        if method not in ('auto', 'exact', 'lsh'):
+            raise ValueError(f"Unknown neighbor index method: {method}")
+        self.k = k
+        self.method = method
+        self.resolved_method = method
+        self.block_size = block_size
+        self.n_planes = n_planes
+        self.n_tables = n_tables
+        self.seed = seed
+        # Scratch bytes allowed for exact similarity tiles (None: whole rows) and build processes
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self.indices = None
+        self.scores = None
+        self.build_seconds = 0.0
+        self.recall = None
+        self._text = None
+        self._audio = None
+
+    def __len__(self):
+        return 0 if self.indices is None else self.indices.shape[0]
+
+    def build(self, tfidf_matrix, feature_matrix) -> 'NeighborIndex':
+        """Build the neighbor lists for every row of the given matrices"""
+        start = time.perf_counter()
+        self._text, self._audio = prepare_vectors(tfidf_matrix, feature_matrix)
+        n_items = self._text.shape[0]
+        k = min(self.k, max(n_items - 1, 0))
+
+        method = self.method
+        if method == 'auto':
+            method = 'exact' if n_items <= AUTO_EXACT_LIMIT else 'lsh'
+        self.resolved_method = method
+
+        if method == 'exact':
+            self.indices, self.scores = self._build_exact(k)
+        else:
+            self.indices, self.scores = self._build_lsh(k)
+
+        self.build_seconds = time.perf_counter() - start
+        self.recall = None
+        return self
+
+    def restore(self, tfidf_matrix, feature_matrix, indices, scores, method: str = None,
+                audio: np.ndarray = None) -> 'NeighborIndex':
+        """Adopt neighbor lists (and normalized audio vectors) built earlier for the same matrices"""
+        self._text, self._audio = prepare_vectors(tfidf_matrix, feature_matrix, audio)
+        self.indices = indices
+        self.scores = scores
+        self.k = max(self.k, indices.shape[1])
+        self.resolved_method = method or self.method
+        self.build_seconds = 0.0
+        self.recall = None
+        return self
+
+    def _build_exact(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Tiled matmul over the whole catalog, keeping the top-K per row"""
+        return exact_neighbors(self._text, self._audio, k, self.memory_budget, self.workers, self.block_size)
+
+    def _exact_rows(self, rows: Sequence[int], k: int,
+                    allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k of a few rows within the memory budget (in this process)"""
+        block, columns = tile_sizes(self._text.shape[0], k, self.memory_budget, 1, self.block_size,
+                                    self._audio.dtype.itemsize)
+        rows = np.asarray(rows)
+        indices = np.empty((len(rows), k), dtype=np.int32)
+        scores = np.empty((len(rows), k), dtype=np.float32)
+        for start in range(0, len(rows), block):
+            indices[start:start + block], scores[start:start + block] = tile_top_k(
+                self._text, self._audio, rows[start:start + block], k, columns, allowed=allowed)
+        return indices, scores
+
+    def search(self, row: int, n: int, allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-n neighbors of a row among the allowed rows, best first
+
+        For requests beyond the stored K or restricted by a filter; fewer than
+        n come back only when fewer rows qualify.
+        """
+        indices, scores = self._exact_rows([row], min(n, max(self._text.shape[0] - 1, 0)), allowed)
+        valid = np.isfinite(scores[0])
+        return indices[0][valid], scores[0][valid]
+
+    def _build_lsh(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Random-hyperplane buckets; exact scoring only within shared buckets"""
+        n_items = self._text.shape[0]
+        rng = np.random.default_rng(self.seed)
+        indices = np.full((n_items, k), -1, dtype=np.int32)
+        scores = np.full((n_items, k), -np.inf, dtype=np.float32)
+        powers = 1 << np.arange(self.n_planes, dtype=np.int64)
+
+        for _ in range(self.n_tables):
+            # Project the weighted concatenation [sqrt(wt)*text, sqrt(wa)*audio]
+            text_planes = rng.standard_normal((self._text.shape[1], self.n_planes))
+            audio_planes = rng.standard_normal((self._audio.shape[1], self.n_planes))
+            projection = (np.sqrt(TEXT_WEIGHT) * (self._text @ text_planes) +
+                          np.sqrt(AUDIO_WEIGHT) * (self._audio @ audio_planes))
+            signatures = (projection > 0).astype(np.int64) @ powers
+
+            order = np.argsort(signatures, kind='stable')
+            boundaries = np.flatnonzero(np.diff(signatures[order])) + 1
+            for members in np.split(order, boundaries):
+                if len(members) < 2:
+                    continue
+                for start in range(0, len(members), self.block_size):
+                    rows = members[start:start + self.block_size]
+                    sims = TEXT_WEIGHT * (self._text[rows] @ self._text[members].T).toarray()
+                    sims += AUDIO_WEIGHT * (self._audio[rows] @ self._audio[members].T)
+                    sims[rows[:, None] == members[None, :]] = -np.inf
+                    local_idx, local_scores = top_k_rows(sims, min(k, len(members)))
+                    self._merge(indices, scores, rows, members[local_idx], local_scores, k)
+        return indices, scores
+
+    @staticmethod
+    def _merge(indices, scores, rows, new_idx, new_scores, k):
+        """Merge candidate neighbors into the running top-K, dropping duplicates"""
+        cand_idx = np.concatenate([indices[rows], new_idx], axis=1)
+        cand_scores = np.concatenate([scores[rows], new_scores], axis=1)
+        order = np.lexsort((cand_idx, -cand_scores), axis=1)
+        cand_idx = np.take_along_axis(cand_idx, order, axis=1)
+        cand_scores = np.take_along_axis(cand_scores, order, axis=1)
+        duplicate = np.zeros_like(cand_idx, dtype=bool)
+        duplicate[:, 1:] = cand_idx[:, 1:] == cand_idx[:, :-1]
+        cand_scores[duplicate] = -np.inf
+        top_idx, top_scores = top_k_rows(cand_scores, k)
+        indices[rows] = np.take_along_axis(cand_idx, top_idx, axis=1)
+        scores[rows] = top_scores
+
+    def add_rows(self, tfidf_rows, feature_rows) -> np.ndarray:
+        """Append items, touching only the neighbor lists the new items enter
+
+        Returns the existing rows whose lists changed.
+        """
+        new_text, new_audio = prepare_vectors(tfidf_rows, feature_rows)
+        n_old = self._text.shape[0]
+        self._text = sparse.vstack([self._text, new_text]).tocsr()
+        self._audio = np.vstack([self._audio, new_audio])
+        n_items = self._text.shape[0]
+        k = self.indices.shape[1]
+        if k < min(self.k, n_items - 1):
+            # Lists were truncated by a tiny catalog; they can all grow now
+            self.indices, self.scores = self._build_exact(min(self.k, n_items - 1))
+            return np.arange(n_old)
+
+        self.indices = np.vstack([self.indices, np.empty((n_items - n_old, k), dtype=np.int32)])
+        self.scores = np.vstack([self.scores, np.empty((n_items - n_old, k), dtype=np.float32)])
+        new_rows = np.arange(n_old, n_items)
+        self.indices[new_rows], self.scores[new_rows] = self._exact_rows(new_rows, k)
+
+        # Existing rows whose K-th neighbor is beaten by one of the new items,
+        # scored against the new columns only, in tiles within the memory budget
+        affected = np.zeros(n_old, dtype=bool)
+        block, columns = tile_sizes(n_items - n_old, k, self.memory_budget, 1, self.block_size,
+                                    self._audio.dtype.itemsize)
+        for start in range(0, n_old if k else 0, block):
+            rows = np.arange(start, min(start + block, n_old))
+            new_idx, new_scores = tile_top_k(self._text, self._audio, rows, k, columns,
+                                             exclude_self=False, first_column=n_old)
+            changed = rows[new_scores[:, 0] > self.scores[rows, -1]]
+            if len(changed) == 0:
+                continue
+            cand_idx = np.concatenate([self.indices[changed], new_idx[changed - start]], axis=1)
+            cand_scores = np.concatenate([self.scores[changed], new_scores[changed - start]], axis=1)
+            top_idx, self.scores[changed] = top_k_rows(cand_scores, k)
+            self.indices[changed] = np.take_along_axis(cand_idx, top_idx, axis=1)
+            affected[changed] = True
+        self.recall = None
+        return np.flatnonzero(affected)
+
+    def remove_rows(self, rows) -> np.ndarray:
+        """Drop items, recomputing only the lists that referenced them
+
+        Returns the (renumbered) rows whose lists were recomputed.
+        """
+        n_old = self._text.shape[0]
+        keep = np.ones(n_old, dtype=bool)
+        keep[rows] = False
+        remap = np.full(n_old + 1, -1, dtype=np.int32)
+        remap[:n_old][keep] = np.arange(keep.sum(), dtype=np.int32)
+
+        self._text = self._text[keep]
+        self._audio = self._audio[keep]
+        n_items = self._text.shape[0]
+        k = min(self.k, max(n_items - 1, 0))
+        # -1 entries (empty LSH slots) map through the extra trailing slot
+        indices = remap[self.indices[keep]]
+        scores = np.array(self.scores[keep])
+        if k < indices.shape[1]:
+            self.indices, self.scores = self._build_exact(k)
+            return np.arange(n_items)
+
+        affected = np.flatnonzero(((indices < 0) & np.isfinite(scores)).any(axis=1))
+        if len(affected):
+            indices[affected], scores[affected] = self._exact_rows(affected, k)
+        self.indices, self.scores = indices, scores
+        self.recall = None
+        return affected
+
+    def neighbors(self, row: int, n: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the stored neighbors of a row, best first (O(K))"""
+        n = self.indices.shape[1] if n is None else n
+        idx = self.indices[row, :n]
+        scores = self.scores[row, :n]
+        valid = np.isfinite(scores)
+        return idx[valid], scores[valid]
+
+    def measure_recall(self, sample_size: int = 200) -> float:
+        """Fraction of brute-force top-K neighbors that the index recovers"""
+        n_items, k = self.indices.shape
+        if n_items == 0 or k == 0:
+            self.recall = 1.0
+            return self.recall
+        rng = np.random.default_rng(self.seed)
+        sample = rng.choice(n_items, size=min(sample_size, n_items), replace=False)
+        hits = 0
+        exact_idx, _ = self._exact_rows(sample, k)
+        for row, exact in zip(sample, exact_idx):
+            hits += len(np.intersect1d(exact, self.indices[row]))
+        self.recall = hits / float(len(sample) * k)
+        return self.recall
+
+    @property
+    def audio_vectors(self) -> np.ndarray:
+        """L2-normalized audio rows the index scores with, one per catalog row"""
+        return self._audio
+
+    def arrays(self) -> List[np.ndarray]:
+        """Arrays held by the index: the neighbor lists and the normalized vectors"""
+        arrays = [array for array in (self.indices, self.scores, self._audio) if array is not None]
+        if self._text is not None:
+            arrays += [self._text.data, self._text.indices, self._text.indptr]
+        return arrays
+
+    def nbytes(self) -> int:
+        """Bytes held by the neighbor lists and the normalized vectors"""
+        return sum(array.nbytes for array in self.arrays())
+
+    def stats(self) -> Dict:
+        """Summary of the index for logging and tuning"""
+        return {
+            'method': self.resolved_method,
+            'k': 0 if self.indices is None else int(self.indices.shape[1]),
+            'n_items': len(self),
+            'build_seconds': self.build_seconds,
+            'recall': self.recall,
+        }
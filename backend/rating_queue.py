@@ -0,0 +1,149 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, List, Tuple
+
+
+def _resolve(future: Future, error: Exception = None):
+    """Complete a future unless its submitter already cancelled it"""
+    try:
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+class RatingWriteQueue:
+    """Write-behind queue that group-commits ratings from one writer thread
+
+    submit() returns at once with a future that completes when the rating is
+    committed. The writer commits a batch when max_batch ratings are waiting
+    or the oldest has waited max_delay seconds, so a burst of ratings costs one
+    transaction (one fsync) per batch instead of one per rating.
+
+    Readers call wait_for_user() to see their own queued ratings; that commits
+    the waiting batch early instead of sleeping out the delay. close() (also
+    run at interpreter exit) commits everything still queued.
+    """
+
+    def __init__(self, db, max_batch: int = 500, max_delay: float = 0.05):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.written = 0
+        self._buffer: List[Tuple[str, int, int, Future]] = []
+        self._pending_users = Counter()
+        self._waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='rating-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id: str, song_id: int, rating: int) -> Future:
+        """Queue a rating; the future resolves once it is committed"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The rating queue is closed")
+            self._buffer.append((user_id, song_id, rating, future))
+            self._pending_users[user_id] += 1
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch:
+                self._cond.notify_all()
+        return future
+
+    def pending(self) -> int:
+        """Ratings queued or being written"""
+        with self._cond:
+            return sum(self._pending_users.values())
+
+    def wait_for_user(self, user_id: str, timeout: float = None) -> bool:
+        """Block until the user's queued ratings are committed (read-your-writes)"""
+        if threading.current_thread() is self._thread:
+            # Listeners running inside the batch transaction already see it
+            return True
+        return self._wait(lambda: not self._pending_users[user_id], timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every queued rating is committed"""
+        return self._wait(lambda: not self._pending_users, timeout)
+
+    def _wait(self, done, timeout: float = None) -> bool:
+        with self._cond:
+            if done():
+                return True
+            self._waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(done, timeout)
+            finally:
+                self._waiters -= 1
+
+    def close(self):
+        """Commit the remaining ratings and stop the writer"""
+        atexit.unregister(self.close)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _next_batch(self) -> List[Tuple[str, int, int, Future]]:
+        """Wait for a full batch, the delay, a waiting reader or close; [] once closed and drained"""
+        with self._cond:
+            while not self._buffer and not self._closed:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_delay
+            while (len(self._buffer) < self.max_batch and not self._waiters and not self._closed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._write(batch)
+            with self._cond:
+                for user_id, _, _, _ in batch:
+                    self._pending_users[user_id] -= 1
+                    if not self._pending_users[user_id]:
+                        del self._pending_users[user_id]
+                self.batches += 1
+                self.written += len(batch)
+                self._cond.notify_all()
+
+    def _write(self, batch: List[Tuple[str, int, int, Future]]):
+        """Commit a batch in one transaction, or rating by rating if it fails"""
+        try:
+            self.db.add_ratings([(user_id, song_id, rating) for user_id, song_id, rating, _ in batch])
+        except Exception:
+            # Isolate the bad ratings so the rest of the batch still commits
+            for user_id, song_id, rating, future in batch:
+                try:
+                    self.db.add_ratings([(user_id, song_id, rating)])
+                except Exception as error:
+                    _resolve(future, error)
+                else:
+                    _resolve(future)
+            return
+        for _, _, _, future in batch:
+            _resolve(future)
+
+    def stats(self) -> Dict:
+        """Counters for tuning the batch size and delay"""
+        with self._cond:
+            return {
+                'pending': sum(self._pending_users.values()),
+                'batches': self.batches,
+                'written': self.written,
+                'mean_batch': self.written / self.batches if self.batches else 0.0,
+            }
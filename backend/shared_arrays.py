@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy import sparse
+
+# tmpfs keeps the files in RAM; the page cache shares them between processes
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class SharedArrays:
+    """Publish numpy arrays as memory-mapped files that worker processes attach to
+
+    Workers receive only the directory path; every process maps the same pages,
+    so the matrices are never pickled or copied per task.
+    """
+
+    def __init__(self, prefix: str = 'simisong-'):
+        self.directory = tempfile.mkdtemp(prefix=prefix, dir=SHARED_DIR)
+
+    def put(self, name: str, array: np.ndarray):
+        """Write an array so it can be mapped by name"""
+        np.save(os.path.join(self.directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+    def put_csr(self, name: str, matrix):
+        """Write a CSR matrix as its three component arrays"""
+        matrix = sparse.csr_matrix(matrix)
+        self.put(f"{name}_data", matrix.data)
+        self.put(f"{name}_indices", matrix.indices)
+        self.put(f"{name}_indptr", matrix.indptr)
+        self.put(f"{name}_shape", np.array(matrix.shape, dtype=np.int64))
+
+    def close(self):
+        """Remove the published arrays"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(directory: str, name: str) -> np.ndarray:
+    """Map a published array read-only"""
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+
+def attach_csr(directory: str, name: str) -> sparse.csr_matrix:
+    """Map a published CSR matrix without copying its components"""
+    shape = tuple(int(x) for x in attach(directory, f"{name}_shape"))
+    return sparse.csr_matrix((attach(directory, f"{name}_data"),
+                              attach(directory, f"{name}_indices"),
+                              attach(directory, f"{name}_indptr")), shape=shape, copy=False)
+
@@ -0,0 +1,129 @@
+import numpy as np
+from scipy import sparse
+from typing import Callable, Dict, Optional
+from backend.collaborative import blend_scores
+from backend.neighbor_index import TEXT_WEIGHT, AUDIO_WEIGHT
+
+
+def rating_weight(rating) -> float:
+    """Contribution of a rating to the taste vector; only favorites (4-5 stars) count"""
+    if rating is None:
+        return 0.0
+    return float(max(int(rating) - 3, 0))
+
+
+def normalized_audio(feature_rows) -> np.ndarray:
+    """L2-normalize audio feature rows (zero rows stay zero)"""
+    feature_rows = np.asarray(feature_rows, dtype=np.float64)
+    norms = np.linalg.norm(feature_rows, axis=-1, keepdims=True)
+    return np.divide(feature_rows, norms, out=np.zeros_like(feature_rows), where=norms > 0)
+
+
+def score_profile(text_vector: np.ndarray, audio_vector: np.ndarray,
+                  tfidf_matrix, feature_matrix, audio_is_normalized: bool = False) -> np.ndarray:
+    """Weighted cosine similarity of a taste vector to every song in one pass"""
+    text_norm = np.linalg.norm(text_vector)
+    audio_norm = np.linalg.norm(audio_vector)
+    scores = np.zeros(tfidf_matrix.shape[0])
+    if text_norm > 0:
+        # TF-IDF rows are already L2-normalized
+        scores += TEXT_WEIGHT * (tfidf_matrix @ (text_vector / text_norm))
+    if audio_norm > 0:
+        audio = feature_matrix if audio_is_normalized else normalized_audio(feature_matrix)
+        scores += AUDIO_WEIGHT * (audio @ (audio_vector / audio_norm))
+    return scores
+
+
+class UserProfileStore:
+    """Rating-weighted taste vectors per user, persisted in the user_taste table"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.db = engine.db
+
+    def _item_vectors(self, state, rows):
+        """Text and normalized audio vectors of catalog rows"""
+        text = sparse.csr_matrix(state.tfidf_matrix[rows])
+        audio = normalized_audio(state.feature_matrix[rows])
+        return text, audio
+
+    def get(self, user_id: str, state=None) -> Optional[Dict]:
+        """Return the user's taste vector, rebuilding it if the models changed
+
+        state is the engine's model state to use (its current one by default).
+        """
+        state = state or self.engine.state
+        if state.tfidf_matrix is None:
+            return None
+        profile = self.db.get_user_taste(user_id)
+        if profile is None or profile['model_version'] != state.model_version:
+            profile = self.rebuild(user_id, state)
+        return profile
+
+    def rebuild(self, user_id: str, state=None) -> Dict:
+        """Recompute a taste vector from the user's ratings in one sparse product"""
+        state = state or self.engine.state
+        song_ids, ratings = self.db.get_latest_user_ratings(user_id)
+        rows = state.rows_for_ids(song_ids)
+        weights = np.array([rating_weight(r) for r in ratings], dtype=np.float64)[rows >= 0]
+        rows = rows[rows >= 0]
+
+        text_dim = state.tfidf_matrix.shape[1]
+        audio_dim = state.feature_matrix.shape[1]
+        if len(rows):
+            text, audio = self._item_vectors(state, rows)
+            text_vector = np.asarray(text.T @ weights).ravel()
+            audio_vector = audio.T @ weights
+        else:
+            text_vector, audio_vector = np.zeros(text_dim), np.zeros(audio_dim)
+
+        profile = {
+            'model_version': state.model_version,
+            'text_vector': text_vector,
+            'audio_vector': audio_vector,
+            'weight': float(weights.sum()),
+        }
+        self.db.save_user_taste(user_id, profile)
+        return profile
+
+    def scores(self, user_id: str, state=None, collaborative: Callable[[], Optional[np.ndarray]] = None,
+               cf_weight: float = 0.0) -> Optional[np.ndarray]:
+        """Personal score of every song for a user, or None without favorites
+
+        The taste similarity against state.audio_vectors (L2-normalized audio
+        rows) plus cf_weight times the collaborative scores, which are only
+        computed for users with favorites. Songs the user rated score -inf.
+        """
+        state = state or self.engine.state
+        profile = self.get(user_id, state)
+        if profile is None or profile['weight'] <= 0:
+            return None
+
+        scores = score_profile(profile['text_vector'], profile['audio_vector'], state.tfidf_matrix,
+                               state.audio_vectors, audio_is_normalized=True)
+        # Blend in collaborative evidence where other users' ratings support it
+        if collaborative is not None and cf_weight > 0:
+            blend_scores(scores, collaborative(), cf_weight)
+        rated_rows = state.rows_for_ids(self.db.get_rated_song_ids(user_id))
+        scores[rated_rows[rated_rows >= 0]] = -np.inf
+        return scores
+
+    def on_rating(self, user_id: str, song_id: int, rating: int, previous_rating: Optional[int]):
+        """Fold one new or changed rating into the stored taste vector"""
+        state = self.engine.state
+        if state.tfidf_matrix is None:
+            return
+        delta = rating_weight(rating) - rating_weight(previous_rating)
+        profile = self.db.get_user_taste(user_id)
+        row = state.rows_for_ids([song_id])[0]
+        if profile is None or profile['model_version'] != state.model_version or row < 0:
+            self.rebuild(user_id, state)
+            return
+        if delta == 0:
+            return
+
+        text, audio = self._item_vectors(state, [row])
+        profile['text_vector'] = profile['text_vector'] + delta * text.toarray().ravel()
+        profile['audio_vector'] = profile['audio_vector'] + delta * audio.ravel()
+        profile['weight'] += delta
+        self.db.save_user_taste(user_id, profile)
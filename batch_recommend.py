@@ -0,0 +1,170 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+from backend.catalog import search_sorted
+from backend.collaborative import ItemItemCF, ImplicitALS, item_user_scores, als_user_scores
+from backend.neighbor_index import top_k_rows
+from backend.shared_arrays import SharedArrays, attach, attach_csr
+from backend.user_profiles import UserProfileStore
+
+# Per-process state set up once by the pool initializer
+_worker = None
+
+
+class _WorkerCatalog:
+    """Read-only view of the engine's matrices mapped from shared memory"""
+
+    def __init__(self, db_path: str, shared_dir: str, model_version: str, cf_method: str, cf_weight: float):
+        self.db = MusicDatabase(db_path)
+        self.tfidf_matrix = attach_csr(shared_dir, 'tfidf')
+        self.feature_matrix = attach(shared_dir, 'features')
+        self.audio_vectors = attach(shared_dir, 'audio')
+        self.song_ids = attach(shared_dir, 'song_ids')
+        self.model_version = model_version
+        self._rows = pd.Index(self.song_ids)
+        self.profiles = UserProfileStore(self)
+
+        self.cf_method = cf_method
+        self.cf_weight = cf_weight
+        self.cf_model = None
+        if cf_method == 'item':
+            self.cf_model = ItemItemCF()
+            self.cf_model.similarity = attach_csr(shared_dir, 'cf_similarity')
+        elif cf_method == 'als':
+            self.cf_model = ImplicitALS()
+            self.cf_model.user_factors = attach(shared_dir, 'cf_user_factors')
+            self.cf_model.item_factors = attach(shared_dir, 'cf_item_factors')
+
+    def collaborative_scores(self, user_id: str, als_row: int):
+        """Same collaborative scores the engine blends into personal recommendations"""
+        if self.cf_method == 'als':
+            return None if als_row < 0 else als_user_scores(self.cf_model, als_row)
+        if self.cf_method == 'item':
+            song_ids, ratings = self.db.get_latest_user_ratings(user_id)
+            rows = self.rows_for_ids(song_ids)
+            known = rows >= 0
+            if known.any():
+                return item_user_scores(self.cf_model, rows[known], np.asarray(ratings)[known],
+                                        len(self.song_ids))
+        return None
+
+    def rows_for_ids(self, song_ids) -> np.ndarray:
+        """Catalog row of each song id (-1 for unknown ids)"""
+        return self._rows.get_indexer(np.asarray(song_ids, dtype=np.int64))
+
+    @property
+    def state(self):
+        """The shared matrices never change, so the view is its own model state"""
+        return self
+
+
+def _init_worker(*args):
+    global _worker
+    _worker = _WorkerCatalog(*args)
+
+
+def _recommend_users(users: List[Tuple[str, int]], n_recommendations: int):
+    """Score a partition of (user_id, ALS row) pairs against the shared catalog"""
+    start = time.perf_counter()
+    results = {}
+    for user_id, als_row in users:
+        # The engine's own scoring, over the shared matrices
+        scores = _worker.profiles.scores(user_id, _worker.state,
+                                         lambda: _worker.collaborative_scores(user_id, als_row), _worker.cf_weight)
+        if scores is None:
+            # Users without favorites get the popular list on demand
+            results[user_id] = []
+            continue
+        n_valid = int(np.isfinite(scores).sum())
+        top_idx, top_scores = top_k_rows(scores[None, :], min(n_recommendations, n_valid))
+        results[user_id] = list(zip(_worker.song_ids[top_idx[0]].tolist(), top_scores[0].tolist()))
+    return os.getpid(), len(users), time.perf_counter() - start, results
+
+
+def run_batch(db_path: str, n_recommendations: int = 10, workers: int = None, chunk_size: int = 256,
+              run_id: str = None, artifact_dir: str = None) -> Dict:
+    """Precompute personal recommendations for every user with ratings
+
+    Users are partitioned across a process pool. Workers map the engine's
+    matrices from shared memory, and the parent writes each finished partition
+    to the recommendations table together with a checkpoint, so rerunning the
+    same run_id skips users that are already done.
+    """
+    if db_path == ":memory:":
+        raise ValueError("The batch job needs a file database that worker processes can open")
+
+    db = MusicDatabase(db_path)
+    engine = AIRecommendationEngine(db, artifact_dir=artifact_dir)
+    run_id = run_id or f"{date.today().isoformat()}-{engine.catalog_version}"
+
+    done = db.get_completed_batch_users(run_id)
+    pending = [user_id for user_id in db.get_rating_user_ids() if user_id not in done]
+    report = {'run_id': run_id, 'users_skipped': len(done), 'users_processed': 0, 'workers': {}}
+    if not pending or engine.tfidf_matrix is None:
+        return report
+
+    start = time.perf_counter()
+    with SharedArrays() as shared:
+        shared.put_csr('tfidf', engine.tfidf_matrix)
+        shared.put('features', engine.feature_matrix)
+        shared.put('audio', engine.state.audio_vectors)
+        shared.put('song_ids', engine.catalog.ids)
+
+        # Fit the collaborative model once and share it the same way
+        cf_method = engine.cf_method if engine.cf_weight > 0 else None
+        cf_model, cf_users = engine.get_collaborative_model(wait=True) if cf_method else (None, None)
+        if cf_model is None:
+            cf_method = None
+        elif cf_method == 'als':
+            shared.put('cf_user_factors', cf_model.user_factors)
+            shared.put('cf_item_factors', cf_model.item_factors)
+        else:
+            shared.put_csr('cf_similarity', cf_model.similarity)
+
+        als_rows = search_sorted(cf_users, np.asarray(pending, dtype=object)) if cf_method == 'als' else None
+        users = [(user_id, -1 if als_rows is None else int(als_rows[i])) for i, user_id in enumerate(pending)]
+        initargs = (db_path, shared.directory, engine.model_version, cf_method, engine.cf_weight)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_recommend_users, users[i:i + chunk_size], n_recommendations)
+                       for i in range(0, len(users), chunk_size)]
+            for future in as_completed(futures):
+                pid, n_users, seconds, results = future.result()
+                db.save_recommendations(run_id, engine.catalog_version, results)
+                stats = report['workers'].setdefault(pid, {'users': 0, 'seconds': 0.0})
+                stats['users'] += n_users
+                stats['seconds'] += seconds
+                report['users_processed'] += n_users
+
+    for stats in report['workers'].values():
+        stats['users_per_sec'] = stats['users'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def main(argv=None):
+    """Batch recommendation entry point"""
+    parser = argparse.ArgumentParser(description="Precompute personal recommendations for all users")
+    parser.add_argument('--db', default="music_recommendations.db")
+    parser.add_argument('--artifacts', default="model_artifacts")
+    parser.add_argument('-n', '--recommendations', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--run-id', default=None)
+    args = parser.parse_args(argv)
+
+    report = run_batch(args.db, args.recommendations, args.workers, args.chunk_size,
+                       args.run_id, args.artifacts)
+    print(f"Run {report['run_id']}: {report['users_processed']} users processed, "
+          f"{report['users_skipped']} already done")
+    for pid, stats in sorted(report['workers'].items()):
+        print(f"  worker {pid}: {stats['users']} users, {stats['users_per_sec']:.1f} users/sec")
+
+if __name__ == "__main__":
+    main()
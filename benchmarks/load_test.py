@@ -0,0 +1,126 @@
+"""Drive a running recommendation server with concurrent keep-alive clients
+
+    python server.py --port 8080 &
+    python -m benchmarks.load_test --port 8080 --concurrency 64 --requests 5000
+
+Reports requests/sec and latency percentiles over a mix of similar, genre,
+personal and popular requests, plus a share of ratings (--write-ratio).
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+
+GENRES = ['Rock', 'Pop', 'Electronic', 'Alternative', 'Soul', 'Funk']
+
+
+def request_mix(n_requests: int, n_songs: int = 20, n_users: int = 100, write_ratio: float = 0.05,
+                seed: int = 0) -> List[Tuple[str, str, Dict]]:
+    """Deterministic list of (method, path, body) requests"""
+    rng = np.random.default_rng(seed)
+    requests = []
+    for _ in range(n_requests):
+        song_id = int(rng.integers(1, n_songs + 1))
+        user_id = f"load_user_{int(rng.integers(n_users))}"
+        if rng.random() < write_ratio:
+            requests.append(('POST', '/rate', {'user_id': user_id, 'song_id': song_id,
+                                               'rating': int(rng.integers(1, 6))}))
+            continue
+        kind = rng.choice(['similar', 'genre', 'personal', 'popular'], p=[0.4, 0.2, 0.3, 0.1])
+        if kind == 'similar':
+            path = f"/similar?song_id={song_id}&n=10"
+        elif kind == 'genre':
+            path = f"/genre?genres={','.join(rng.choice(GENRES, 2, replace=False))}&n=10"
+        elif kind == 'personal':
+            path = f"/personal?user_id={user_id}&n=10"
+        else:
+            path = "/popular?n=10"
+        requests.append(('GET', path, None))
+    return requests
+
+
+async def _send(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str,
+                method: str, path: str, body: Dict = None) -> Tuple[int, bytes]:
+    """One request on an open keep-alive connection"""
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n").encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def run_load(host: str, port: int, requests: List[Tuple[str, str, Dict]], concurrency: int = 32) -> Dict:
+    """Send the requests over concurrency connections and summarize throughput and latency"""
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies, statuses = [], {}
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while not queue.empty():
+                method, path, body = queue.get_nowait()
+                start = time.perf_counter()
+                status, _ = await _send(reader, writer, host, method, path, body)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, len(requests)))))
+    seconds = time.perf_counter() - start
+    latencies = np.asarray(latencies)
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'seconds': seconds,
+        'requests_per_sec': len(latencies) / seconds if seconds > 0 else 0.0,
+        'p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+        'p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        'max': float(latencies.max()) if len(latencies) else 0.0,
+        'statuses': statuses,
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a running recommendation server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--songs', type=int, default=20, help="song ids to draw from (1..songs)")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--write-ratio', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    requests = request_mix(args.requests, args.songs, args.users, args.write_ratio, args.seed)
+    report = asyncio.run(run_load(args.host, args.port, requests, args.concurrency))
+    print(f"{report['requests']} requests in {report['seconds']:.2f}s: "
+          f"{report['requests_per_sec']:.1f} req/s, p50 {report['p50'] * 1000:.2f} ms, "
+          f"p95 {report['p95'] * 1000:.2f} ms, p99 {report['p99'] * 1000:.2f} ms, {report['errors']} errors")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
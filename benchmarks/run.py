@@ -0,0 +1,228 @@
+"""Benchmark the database and the recommendation engine on synthetic catalogs
+
+    python -m benchmarks.run --sizes 1000 10000 --output results.json
+    python -m benchmarks.run --sizes 1000 10000 --baseline results.json --threshold 0.2
+    python -m benchmarks.run --output benchmarks/baseline.json   # refresh the committed baseline
+
+Every benchmark reports p50/p95 latency over repeated calls and the peak
+Python allocation of one extra traced call. Results are compared against the
+committed benchmarks/baseline.json (or --baseline, or none with
+--no-baseline): benchmarks whose p50 or peak memory grew beyond the
+thresholds are listed and the exit status is 1. Latencies only compare
+across runs on similar machines.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+import numpy as np
+from backend.ai_engine import AIRecommendationEngine
+from benchmarks.synthetic import build_database
+
+# Results of the current code on a reference machine, committed with the repo
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Benchmarks that scan the whole catalog or rating table get fewer repetitions
+HEAVY = ('db.get_all_songs', 'db.get_rating_triples', 'engine.load_data')
+
+
+def measure(fn: Callable, inputs: Sequence[tuple], repeat: int, warmup: bool = True) -> Dict:
+    """Latency percentiles of fn over repeat calls (cycling through inputs) and its peak memory"""
+    if warmup:
+        fn(*inputs[0])
+    durations = []
+    for i in range(repeat):
+        args = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - start)
+
+    # Tracing slows calls down, so memory is measured on a separate call
+    tracemalloc.start()
+    try:
+        fn(*inputs[0])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    durations = np.asarray(durations)
+    return {
+        'runs': repeat,
+        'p50': float(np.percentile(durations, 50)),
+        'p95': float(np.percentile(durations, 95)),
+        'mean': float(durations.mean()),
+        'peak_mb': peak / 2 ** 20,
+    }
+
+
+def run_size(workdir: str, n_songs: int, n_users: int, ratings_per_user: int = 20, seed: int = 0,
+             repeat: int = 20, heavy_repeat: int = 3) -> Dict:
+    """Build a synthetic database of n_songs and benchmark it"""
+    path = os.path.join(workdir, f"bench_{n_songs}.db")
+    start = time.perf_counter()
+    db, import_report = build_database(path, n_songs, n_users, ratings_per_user, seed)
+    results = {
+        'db.import_songs': {'runs': 1, 'p50': import_report['seconds'], 'p95': import_report['seconds'],
+                            'mean': import_report['seconds'], 'rows_per_sec': import_report['rows_per_sec']},
+    }
+    setup_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed + 2)
+    users = [(user_id,) for user_id in rng.choice(db.get_rating_user_ids() or ['nobody'], 16).tolist()]
+    song_ids = db.get_all_songs()['id'].values
+    songs = [(int(song_id),) for song_id in rng.choice(song_ids, 16)]
+    new_ratings = [(f"bench_{i}", int(song_id), int(rating)) for i, (song_id, rating) in
+                   enumerate(zip(rng.choice(song_ids, 64), rng.integers(1, 6, 64)))]
+
+    def bench(name: str, fn: Callable, inputs: Sequence[tuple], **kwargs):
+        runs = heavy_repeat if name in HEAVY else repeat
+        results[name] = measure(fn, inputs, runs, **kwargs)
+
+    bench('db.get_catalog_version', db.get_catalog_version, [()])
+    bench('db.get_all_songs', db.get_all_songs, [()])
+    bench('db.get_user_ratings', db.get_user_ratings, users)
+    bench('db.get_latest_user_ratings', db.get_latest_user_ratings, users)
+    bench('db.get_rating_triples', db.get_rating_triples, [()])
+    bench('db.add_rating', db.add_rating, new_ratings, warmup=False)
+
+    start = time.perf_counter()
+    # The result cache is disabled so every call does the full work
+    engine = AIRecommendationEngine(db, cache_size=0)
+    results['engine.init'] = {'runs': 1, 'p50': time.perf_counter() - start}
+    bench('engine.load_data', lambda: engine.load_data(force_refit=True), [()])
+
+    genres = [(['Rock'],), (['Pop', 'Jazz'],), (['Alternative', 'Soul', 'Funk'],)]
+    bench('engine.get_content_based_recommendations',
+          lambda song_id: engine.get_content_based_recommendations(song_id, 10), songs)
+    bench('engine.get_genre_based_recommendations',
+          lambda genre: engine.get_genre_based_recommendations(genre, 10), genres)
+    bench('engine.get_popular_recommendations', lambda: engine.get_popular_recommendations(10), [()])
+    # Fit the collaborative model up front: requests only read it, refits run in the background
+    engine.get_collaborative_model(wait=True)
+    bench('engine.get_hybrid_recommendations',
+          lambda user_id: engine.get_hybrid_recommendations(user_id, 10), users)
+    bench('engine.get_collaborative_recommendations',
+          lambda user_id: engine.get_collaborative_recommendations(user_id, 10), users)
+    db.close()
+    return {'n_songs': n_songs, 'n_users': n_users, 'setup_seconds': setup_seconds, 'benchmarks': results}
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.25, memory_threshold: float = 0.25,
+                    min_seconds: float = 0.001, min_mb: float = 1.0,
+                    overrides: Dict[str, float] = None) -> List[Dict]:
+    """Benchmarks whose p50 or peak memory regressed beyond the thresholds
+
+    Thresholds are relative (0.25 = 25% slower). Timings under min_seconds and
+    peaks under min_mb in both runs are ignored as noise. overrides maps
+    benchmark names to their own latency threshold.
+    """
+    overrides = overrides or {}
+    regressions = []
+    for size, run in current['results'].items():
+        base_run = baseline.get('results', {}).get(size)
+        if base_run is None:
+            continue
+        for name, stats in run['benchmarks'].items():
+            base = base_run['benchmarks'].get(name)
+            if base is None:
+                continue
+            limit = overrides.get(name, threshold)
+            if max(stats['p50'], base['p50']) >= min_seconds and stats['p50'] > base['p50'] * (1 + limit):
+                regressions.append({'size': size, 'benchmark': name, 'metric': 'p50',
+                                    'baseline': base['p50'], 'current': stats['p50']})
+            if 'peak_mb' not in stats or 'peak_mb' not in base:
+                continue
+            if (max(stats['peak_mb'], base['peak_mb']) >= min_mb
+                    and stats['peak_mb'] > base['peak_mb'] * (1 + memory_threshold)):
+                regressions.append({'size': size, 'benchmark': name, 'metric': 'peak_mb',
+                                    'baseline': base['peak_mb'], 'current': stats['peak_mb']})
+    return regressions
+
+
+def _parse_overrides(values: List[str]) -> Dict[str, float]:
+    overrides = {}
+    for value in values:
+        name, _, limit = value.partition('=')
+        overrides[name] = float(limit)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the database and recommendation engine")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help="catalog sizes to benchmark (1000 to 1000000)")
+    parser.add_argument('--users', type=int, default=None, help="users with ratings (default: songs / 10)")
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--heavy-repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=None, help="directory for the generated databases")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=BASELINE, help="results JSON to compare against")
+    parser.add_argument('--no-baseline', action='store_true', help="skip the comparison")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative p50 slowdown")
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help="allowed relative peak memory growth")
+    parser.add_argument('--min-seconds', type=float, default=0.001)
+    parser.add_argument('--min-mb', type=float, default=1.0)
+    parser.add_argument('--threshold-for', action='append', default=[], metavar='NAME=LIMIT',
+                        help="latency threshold for one benchmark, e.g. engine.load_data=0.5")
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'ratings_per_user': args.ratings_per_user,
+        },
+        'results': {},
+    }
+    # Read the baseline first: --output may be refreshing it
+    baseline = None
+    if not args.no_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        else:
+            print(f"No baseline at {args.baseline}; skipping the comparison")
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for n_songs in args.sizes:
+            n_users = args.users if args.users is not None else max(10, n_songs // 10)
+            run = run_size(workdir, n_songs, n_users, args.ratings_per_user, args.seed,
+                           args.repeat, args.heavy_repeat)
+            results['results'][str(n_songs)] = run
+            for name, stats in run['benchmarks'].items():
+                line = f"{n_songs:>8} {name:<45} p50 {stats['p50'] * 1000:10.3f} ms"
+                if 'peak_mb' in stats:
+                    line += f"  p95 {stats['p95'] * 1000:10.3f} ms  peak {stats['peak_mb']:8.2f} MB"
+                print(line)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        if baseline.get('meta', {}).get('platform') != results['meta']['platform']:
+            print(f"Baseline from another platform ({baseline.get('meta', {}).get('platform')}); "
+                  f"latencies may not be comparable")
+        regressions = compare_results(results, baseline, args.threshold, args.memory_threshold,
+                                      args.min_seconds, args.min_mb, _parse_overrides(args.threshold_for))
+        for r in regressions:
+            print(f"REGRESSION {r['size']} {r['benchmark']} {r['metric']}: "
+                  f"{r['baseline']:.6g} -> {r['current']:.6g}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import csv
+import numpy as np
+from typing import Tuple
+from backend.bulk_import import SONG_COLUMNS
+from backend.database import MusicDatabase, INSERT_RATING
+
+GENRES = ['Rock', 'Pop', 'Electronic', 'Alternative', 'Alternative Rock', 'Grunge', 'Britpop',
+          'Synthpop', 'Funk', 'Soul', 'Indie Pop', 'Hip Hop', 'Jazz', 'Classical', 'Metal', 'Country']
+
+
+def generate_songs(n_songs: int, seed: int = 0) -> Tuple[np.ndarray, ...]:
+    """Columns of a synthetic catalog, in SONG_COLUMNS order
+
+    Genres and artists follow a Zipf-like skew so a few dominate, as in real
+    catalogs; every column is derived from the seed alone.
+    """
+    rng = np.random.default_rng(seed)
+    n_artists = max(1, n_songs // 10)
+    genre_weights = 1.0 / np.arange(1, len(GENRES) + 1)
+    genres = rng.choice(len(GENRES), n_songs, p=genre_weights / genre_weights.sum())
+    artists = np.minimum(rng.zipf(1.3, n_songs) - 1, n_artists - 1)
+    return (
+        np.array([f"Song {i}" for i in range(n_songs)], dtype=object),
+        np.array([f"Artist {a}" for a in artists], dtype=object),
+        np.array(GENRES, dtype=object)[genres],
+        rng.integers(1950, 2025, n_songs),
+        rng.integers(90, 600, n_songs),
+        rng.beta(2, 2, n_songs).round(3),
+        rng.beta(2, 2, n_songs).round(3),
+        rng.beta(2, 2, n_songs).round(3),
+        rng.beta(1, 3, n_songs).round(3),
+        np.clip(rng.normal(50, 20, n_songs), 0, 100).astype(np.int64),
+    )
+
+
+def write_catalog_csv(path: str, n_songs: int, seed: int = 0):
+    """Write a synthetic catalog in the import_songs CSV format"""
+    columns = generate_songs(n_songs, seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(SONG_COLUMNS)
+        writer.writerows(zip(*(column.tolist() for column in columns)))
+
+
+def generate_ratings(song_ids: np.ndarray, n_users: int, ratings_per_user: int,
+                     seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """User ids, song ids and 1-5 ratings with at most one rating per (user, song)
+
+    Songs are drawn with a popularity skew; each user leans towards a random
+    rating level so that collaborative filtering has signal to find.
+    """
+    rng = np.random.default_rng(seed + 1)
+    song_ids = np.asarray(song_ids, dtype=np.int64)
+    n_draws = n_users * ratings_per_user
+    users = np.repeat(np.arange(n_users), ratings_per_user)
+    items = np.minimum(rng.zipf(1.2, n_draws) - 1, len(song_ids) - 1)
+    items = (items + rng.integers(0, len(song_ids), n_users)[users]) % len(song_ids)
+    _, first = np.unique(users * len(song_ids) + items, return_index=True)
+    users, items = users[first], items[first]
+    bias = rng.normal(0, 1, n_users)[users]
+    ratings = np.clip(np.rint(3.5 + bias + rng.normal(0, 0.8, len(users))), 1, 5).astype(np.int64)
+    user_ids = np.array([f"user_{u}" for u in users], dtype=object)
+    return user_ids, song_ids[items], ratings
+
+
+def build_database(path: str, n_songs: int, n_users: int = 0, ratings_per_user: int = 20,
+                   seed: int = 0, chunk_size: int = 50000) -> Tuple[MusicDatabase, dict]:
+    """Create a database holding only the synthetic catalog and ratings
+
+    Returns the database and the import report of the songs load.
+    """
+    db = MusicDatabase(path)
+    with db.transaction() as conn:
+        # Replace the 20 sample songs so the catalog has exactly n_songs rows
+        conn.execute("DELETE FROM songs")
+    csv_path = f"{path}.songs.csv"
+    write_catalog_csv(csv_path, n_songs, seed)
+    report = db.import_songs(csv_path, chunk_size=chunk_size)
+
+    if n_users > 0:
+        with db.reading() as conn:
+            song_ids = np.array([row[0] for row in conn.execute("SELECT id FROM songs ORDER BY id")],
+                                dtype=np.int64)
+        user_ids, rated_ids, ratings = generate_ratings(song_ids, n_users, ratings_per_user, seed)
+        rows = zip(user_ids.tolist(), rated_ids.tolist(), ratings.tolist())
+        with db.transaction() as conn:
+            conn.executemany(INSERT_RATING, rows)
+    return db, report
@@ -0,0 +1,70 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class BackgroundDispatcher:
+    """Runs work off the Tk main thread and hands results back via root.after
+
+    Worker threads never touch Tk: finished futures are queued and a
+    root.after poll on the main thread delivers them. Each submission belongs
+    to a channel; a newer submission on the same channel makes older pending
+    results stale, and stale results are dropped instead of displayed.
+    """
+
+    def __init__(self, root, max_workers: int = 2, poll_ms: int = 50,
+                 on_busy_change: Callable[[bool], None] = None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_busy_change = on_busy_change
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gui-worker')
+        self._done = queue.Queue()
+        self._latest: Dict[str, int] = {}
+        self._pending = 0
+        self._closed = False
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, channel: str, work: Callable, on_success: Callable, on_error: Callable = None) -> int:
+        """Run work() in the background and call on_success(result) on the main thread"""
+        token = self._latest.get(channel, 0) + 1
+        self._latest[channel] = token
+        self._set_pending(self._pending + 1)
+        future = self._executor.submit(work)
+        future.add_done_callback(lambda f: self._done.put((channel, token, f, on_success, on_error)))
+        return token
+
+    def is_current(self, channel: str, token: int) -> bool:
+        """Whether token is the newest submission on its channel"""
+        return self._latest.get(channel) == token
+
+    def _poll(self):
+        """Deliver finished work on the main thread"""
+        if self._closed:
+            return
+        while not self._closed:
+            try:
+                channel, token, future, on_success, on_error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._set_pending(self._pending - 1)
+            if not self.is_current(channel, token):
+                continue
+            error = future.exception()
+            if error is None:
+                on_success(future.result())
+            elif on_error is not None:
+                on_error(error)
+        # A delivered callback may have shut down (and destroyed) the window
+        if not self._closed:
+            self.root.after(self.poll_ms, self._poll)
+
+    def _set_pending(self, pending: int):
+        was_busy = self._pending > 0
+        self._pending = pending
+        if self.on_busy_change is not None and was_busy != (pending > 0):
+            self.on_busy_change(pending > 0)
+
+    def shutdown(self):
+        """Stop polling and let running work finish in the background"""
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,15 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-from backend.database import MusicDatabase
-from backend.ai_engine import AIRecommendationEngine
+from typing import TYPE_CHECKING, Callable, List, Dict
+from backend.metrics import phase
+from frontend.dispatcher import BackgroundDispatcher
+
+# The data and model modules pull in pandas and scikit-learn; they are imported
+# on the worker thread that first needs them, after the window is up
+if TYPE_CHECKING:
+    from backend.catalog import Catalog
 
 class MusicRecommendationGUI:
     """GUI interface for the music recommendation system"""
     
-    def __init__(self):
-        self.db = MusicDatabase()
-        self.ai_engine = AIRecommendationEngine(self.db)
+    def __init__(self, on_ready: Callable[[], None] = None):
+        self.db = None
+        self.catalog = None
+        self.ai_engine = None
         self.current_user = "default_user"
+        self.on_ready = on_ready
         
         self.root = tk.Tk()
         self.root.title("AI Music Recommendation System")
@@ -17,7 +25,83 @@ class MusicRecommendationGUI:
         self.root.configure(bg='#2C3E50')
         
         self.setup_gui()
-        self.load_songs()
+        self.dispatcher = BackgroundDispatcher(self.root, on_busy_change=self.set_busy)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
+        # The window opens right away; the database and models load in the background
+        self.set_status("Loading music library...")
+        self.dispatcher.submit('startup', self._open_database, self._on_database_ready, self.show_error)
+    
+    def _open_database(self):
+        """Open the database and load the song catalog (worker thread)"""
+        with phase('startup.import_data'):
+            from backend.database import MusicDatabase
+            from backend.catalog import Catalog
+        with phase('startup.database'):
+            db = MusicDatabase()
+        with phase('startup.catalog'):
+            catalog = Catalog.load(db)
+        return db, catalog
+    
+    def _load_engine(self, catalog: 'Catalog'):
+        """Import and build the recommendation engine (worker thread)"""
+        with phase('startup.import_engine'):
+            from backend.ai_engine import AIRecommendationEngine
+        with phase('startup.engine'):
+            # The engine reuses the catalog the GUI already loaded
+            return AIRecommendationEngine(self.db, artifact_dir="model_artifacts", catalog=catalog)
+    
+    def _on_database_ready(self, result):
+        """Show the song list, then start loading the AI models"""
+        self.db, catalog = result
+        with phase('startup.song_list'):
+            self.load_songs(catalog)
+        self.set_status("Loading AI models...")
+        self.dispatcher.submit('startup', lambda: self._load_engine(catalog),
+                               self._on_engine_ready, self.show_error)
+    
+    def _on_engine_ready(self, engine):
+        """Enable recommendations once the models are loaded"""
+        self.ai_engine = engine
+        if engine.catalog is not self.catalog:
+            # The catalog changed while the models loaded
+            self.load_songs(engine.catalog)
+        self.set_status("Ready")
+        if self.on_ready is not None:
+            self.on_ready()
+    
+    def set_busy(self, busy: bool):
+        """Show or hide the busy indicator"""
+        if busy:
+            self.progress.start(10)
+        else:
+            self.progress.stop()
+    
+    def set_status(self, text: str):
+        """Update the status bar text"""
+        self.status_var.set(text)
+    
+    def show_error(self, error: Exception):
+        """Report a failed background task"""
+        self.set_status("Error")
+        messagebox.showerror("Error", str(error))
+    
+    def _engine_ready(self) -> bool:
+        """Warn and return False while the models are still loading"""
+        if self.ai_engine is None:
+            messagebox.showinfo("Please Wait", "The AI models are still loading.")
+            return False
+        return True
+    
+    def run_in_background(self, work, title: str):
+        """Compute recommendations off the main thread; newer requests replace older ones"""
+        self.set_status(f"Loading {title}...")
+        
+        def show(recommendations):
+            self.display_recommendations(recommendations, title)
+            self.set_status("Ready")
+        
+        self.dispatcher.submit('recommendations', work, show, self.show_error)
     
     def setup_gui(self):
         """Setup the GUI components"""
@@ -115,15 +199,21 @@ class MusicRecommendationGUI:
         control_frame.columnconfigure(0, weight=1)
         rec_frame.columnconfigure(0, weight=1)
         rec_frame.rowconfigure(0, weight=1)
+        
+        # Status bar with busy indicator
+        status_frame = ttk.Frame(main_frame)
+        status_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.E, tk.W), pady=(10, 0))
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(status_frame, textvariable=self.status_var).grid(row=0, column=0, sticky=tk.W)
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=150)
+        self.progress.grid(row=0, column=1, sticky=tk.E)
+        status_frame.columnconfigure(0, weight=1)
     
-    def load_songs(self):
+    def load_songs(self, catalog: 'Catalog'):
         """Load songs into the listbox"""
-        songs_df = self.db.get_all_songs()
+        self.catalog = catalog
         self.song_listbox.delete(0, tk.END)
-        
-        for _, song in songs_df.iterrows():
-            display_text = f"{song['title']} - {song['artist']} ({song['genre']}, {song['year']})"
-            self.song_listbox.insert(tk.END, display_text)
+        self.song_listbox.insert(tk.END, *catalog.display_labels())
     
     def get_selected_song_id(self):
         """Get the ID of the currently selected song"""
@@ -131,8 +221,8 @@ class MusicRecommendationGUI:
         if not selection:
             return None
         
-        songs_df = self.db.get_all_songs()
-        return songs_df.iloc[selection[0]]['id']
+        # Listbox positions are catalog rows
+        return int(self.catalog.ids[selection[0]])
     
     def rate_song(self):
         """Rate the selected song"""
@@ -140,10 +230,19 @@ class MusicRecommendationGUI:
         if song_id is None:
             messagebox.showwarning("No Selection", "Please select a song to rate.")
             return
+        if not self._engine_ready():
+            return
         
         rating = int(self.rating_var.get())
-        self.db.add_rating(self.current_user, song_id, rating)
-        messagebox.showinfo("Success", f"Song rated {rating} stars!")
+        
+        def rate():
+            # Committed with other queued ratings when write-behind runs
+            self.db.queue_rating(self.current_user, song_id, rating).result()
+            return rating
+        
+        self.dispatcher.submit('rating', rate,
+                               lambda stars: messagebox.showinfo("Success", f"Song rated {stars} stars!"),
+                               self.show_error)
     
     def display_recommendations(self, recommendations: List[Dict], title: str):
         """Display recommendations in the text area"""
@@ -172,9 +271,12 @@ class MusicRecommendationGUI:
         if song_id is None:
             messagebox.showwarning("No Selection", "Please select a song first.")
             return
+        if not self._engine_ready():
+            return
         
-        recommendations = self.ai_engine.get_content_based_recommendations(song_id, 8)
-        self.display_recommendations(recommendations, "Similar Songs")
+        self.run_in_background(
+            lambda: self.ai_engine.get_content_based_recommendations(song_id, 8),
+            "Similar Songs")
     
     def get_genre_recommendations(self):
         """Get recommendations based on selected genre"""
@@ -183,18 +285,32 @@ class MusicRecommendationGUI:
             messagebox.showwarning("No Genre", "Please select a genre.")
             return
         
-        recommendations = self.ai_engine.get_genre_based_recommendations([genre], 8)
-        self.display_recommendations(recommendations, f"{genre} Recommendations")
+        if not self._engine_ready():
+            return
+        
+        self.run_in_background(lambda: self.ai_engine.get_genre_based_recommendations([genre], 8),
+                               f"{genre} Recommendations")
     
     def get_personal_recommendations(self):
         """Get personalized recommendations"""
-        recommendations = self.ai_engine.get_hybrid_recommendations(self.current_user, 8)
-        self.display_recommendations(recommendations, "Personal Recommendations")
+        if not self._engine_ready():
+            return
+        user_id = self.current_user
+        
+        self.run_in_background(lambda: self.ai_engine.get_personal_recommendations(user_id, 8),
+                               "Personal Recommendations")
     
     def get_popular_recommendations(self):
         """Get popular song recommendations"""
-        recommendations = self.ai_engine.get_popular_recommendations(8)
-        self.display_recommendations(recommendations, "Popular Songs")
+        if not self._engine_ready():
+            return
+        
+        self.run_in_background(lambda: self.ai_engine.get_popular_recommendations(8), "Popular Songs")
+    
+    def close(self):
+        """Stop background work and close the window"""
+        self.dispatcher.shutdown()
+        self.root.destroy()
     
     def run(self):
         """Start the GUI application"""
@@ -1,12 +1,54 @@
-from frontend.gui import MusicRecommendationGUI
+import argparse
+import os
+import time
+from backend import metrics
 
-def main():
+# Startup stages in the order they run; load_data phases happen inside startup.engine
+STARTUP_STAGES = ['startup.import_gui', 'startup.window', 'startup.import_data', 'startup.database',
+                  'startup.catalog', 'startup.song_list', 'startup.import_engine', 'startup.engine']
+
+def startup_report(total_seconds: float) -> str:
+    """Per-stage startup times recorded on the metrics registry"""
+    phases = metrics.registry.to_dict()['histograms'].get('phase', {})
+    lines = ["Startup profile:"]
+    for stage in STARTUP_STAGES + sorted(name for name in phases if name.startswith('load_data.')):
+        if stage in phases:
+            indent = "    " if stage.startswith('load_data.') else "  "
+            lines.append(f"{indent}{stage:<28} {phases[stage]['sum'] * 1000:9.1f} ms")
+    lines.append(f"  {'ready':<28} {total_seconds * 1000:9.1f} ms")
+    return '\n'.join(lines)
+
+def main(argv=None):
     """Main application entry point"""
+    start = time.perf_counter()
+    parser = argparse.ArgumentParser(description="AI Music Recommendation System")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print the time of each startup stage and exit once the models are ready")
+    args = parser.parse_args(argv)
+    
     print("🎵 Starting AI Music Recommendation System...")
     print("Loading database and AI models...")
     
-    app = MusicRecommendationGUI()
-    app.run()
+    # SIMISONG_METRICS=<path> records metrics and writes them there on exit (.prom for Prometheus text)
+    metrics_path = os.environ.get("SIMISONG_METRICS")
+    if metrics_path or args.profile_startup:
+        metrics.enable()
+    
+    # The window opens before pandas and scikit-learn are imported
+    with metrics.phase('startup.import_gui'):
+        from frontend.gui import MusicRecommendationGUI
+    
+    def profiled_ready():
+        print(startup_report(time.perf_counter() - start))
+        app.close()
+    
+    with metrics.phase('startup.window'):
+        app = MusicRecommendationGUI(on_ready=profiled_ready if args.profile_startup else None)
+    try:
+        app.run()
+    finally:
+        if metrics_path:
+            metrics.registry.dump(metrics_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+from backend import metrics
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 100
+MAX_BODY_BYTES = 65536
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    """Error answered with the given status and a JSON message"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(query: Dict, name: str, default: int = None, minimum: int = None, maximum: int = None) -> int:
+    """Integer query/body parameter, raising HTTPError(400) when missing or invalid"""
+    value = query.get(name, default)
+    if value is None:
+        raise HTTPError(400, f"Missing parameter: {name}")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"Parameter {name} must be an integer")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise HTTPError(400, f"Parameter {name} must be between {minimum} and {maximum}")
+    return value
+
+
+class RecommendationServer:
+    """HTTP/JSON front end serving many clients from one loaded engine
+
+    Scoring runs on a thread pool so the event loop keeps accepting requests,
+    ratings go through the database's write-behind queue, which group-commits
+    them from a single writer, and at most max_concurrency requests are
+    processed at once (the rest wait).
+    """
+
+    def __init__(self, engine: AIRecommendationEngine, workers: int = 4, max_concurrency: int = 64):
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scoring')
+        self._writes = engine.db.start_write_behind()
+        self._slots = None
+        self._server = None
+        self.port = None
+        self.routes = {
+            ('GET', '/similar'): self._similar,
+            ('GET', '/genre'): self._genre,
+            ('GET', '/personal'): self._personal,
+            ('GET', '/popular'): self._popular,
+            ('POST', '/rate'): self._rate,
+            ('GET', '/health'): self._health,
+            ('GET', '/metrics'): self._metrics,
+        }
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        """Start listening (port 0 picks a free port, stored in self.port)"""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def close(self):
+        """Stop accepting connections and finish queued writes"""
+        self._server.close()
+        await self._server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(None, self._writes.flush)
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, fn, *args):
+        """Run blocking engine work on the scoring pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as error:
+                    await self._respond(writer, error.status, {'error': str(error)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                async with self._slots:
+                    status, payload = await self.dispatch(method, target, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        data = json.dumps(payload).encode()
+        writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                      f"Content-Type: application/json\r\n"
+                      f"Content-Length: {len(data)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> bytes:
+        """One request or header line, raising HTTPError(400) when it exceeds the stream limit"""
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise HTTPError(400, "Request line or header too long")
+
+    @classmethod
+    async def _read_request(cls, reader: asyncio.StreamReader):
+        """(method, target, body, keep_alive) of the next request, or None at end of stream"""
+        request_line = await cls._readline(reader)
+        if not request_line.strip():
+            return None
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise HTTPError(400, "Malformed request line")
+        method, target, version = parts
+        headers = {}
+        while True:
+            line = await cls._readline(reader)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        return method, target, body, keep_alive
+
+    async def dispatch(self, method: str, target: str, body: bytes = b'') -> Tuple[int, object]:
+        """Route one request and return (status, JSON payload)"""
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            known_path = any(path == url.path for _, path in self.routes)
+            return (405, {'error': 'Method not allowed'}) if known_path else (404, {'error': 'Not found'})
+        try:
+            if method == 'POST':
+                try:
+                    fields = json.loads(body or b'{}')
+                except ValueError:
+                    fields = None
+                if not isinstance(fields, dict):
+                    raise HTTPError(400, "Body must be a JSON object")
+                query.update(fields)
+            return 200, await handler(query)
+        except HTTPError as error:
+            return error.status, {'error': str(error)}
+        except Exception:
+            # Details stay in the server log; clients get a generic message
+            logger.exception("Error handling %s %s", method, target)
+            return 500, {'error': 'Internal server error'}
+
+    async def _similar(self, query: Dict):
+        song_id = _int_param(query, 'song_id')
+        if self.engine.catalog is None or self.engine.catalog.row_of(song_id) is None:
+            raise HTTPError(404, f"Unknown song: {song_id}")
+        n = _int_param(query, 'n', 10, 1, MAX_RESULTS)
+        return await self._run(self.engine.get_content_based_recommendations, song_id, n)
+
+    async def _genre(self, query: Dict):
+        genres = [genre.strip() for genre in query.get('genres', '').split(',') if genre.strip()]
+        if not genres:
+            raise HTTPError(400, "Missing parameter: genres")
+        n = _int_param(query, 'n', 10, 1, MAX_RESULTS)
+        return await self._run(self.engine.get_genre_based_recommendations, genres, n)
+
+    async def _personal(self, query: Dict):
+        user_id = query.get('user_id')
+        if not user_id:
+            raise HTTPError(400, "Missing parameter: user_id")
+        n = _int_param(query, 'n', 10, 1, MAX_RESULTS)
+        return await self._run(self.engine.get_personal_recommendations, str(user_id), n)
+
+    async def _popular(self, query: Dict):
+        n = _int_param(query, 'n', 10, 1, MAX_RESULTS)
+        return await self._run(self.engine.get_popular_recommendations, n)
+
+    async def _rate(self, query: Dict):
+        user_id = query.get('user_id')
+        if not user_id:
+            raise HTTPError(400, "Missing parameter: user_id")
+        song_id = _int_param(query, 'song_id')
+        rating = _int_param(query, 'rating', None, 1, 5)
+        if self.engine.catalog is None or self.engine.catalog.row_of(song_id) is None:
+            raise HTTPError(404, f"Unknown song: {song_id}")
+        try:
+            # Answered once the rating's batch commits
+            await asyncio.wrap_future(self._writes.submit(str(user_id), song_id, rating))
+        except sqlite3.IntegrityError as error:
+            raise HTTPError(400, str(error))
+        return {'user_id': user_id, 'song_id': song_id, 'rating': rating}
+
+    async def _health(self, query: Dict):
+        return {'status': 'ok', 'catalog_version': self.engine.catalog_version,
+                'pending_writes': self._writes.pending()}
+
+    async def _metrics(self, query: Dict):
+        return metrics.registry.to_dict()
+
+
+async def serve(args):
+    """Load the engine once, then serve until cancelled"""
+    db = MusicDatabase(args.db)
+    engine = await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(AIRecommendationEngine, db, artifact_dir=args.artifacts, compact=args.compact))
+    server = RecommendationServer(engine, args.workers, args.max_concurrency)
+    await server.start(args.host, args.port)
+    print(f"Serving recommendations on http://{args.host}:{server.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        db.close()
+        if args.metrics:
+            metrics.registry.dump(args.metrics)
+
+
+def main(argv=None):
+    """Headless recommendation service entry point"""
+    parser = argparse.ArgumentParser(description="Serve recommendations over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--db', default="music_recommendations.db")
+    parser.add_argument('--artifacts', default="model_artifacts")
+    parser.add_argument('--workers', type=int, default=4, help="threads for scoring requests")
+    parser.add_argument('--max-concurrency', type=int, default=64, help="requests processed at once")
+    parser.add_argument('--compact', action='store_true', help="float32 models and a catalog without the DataFrame")
+    parser.add_argument('--metrics', default=None, help="record metrics and write them here on exit")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        metrics.enable()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
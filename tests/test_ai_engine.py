@@ -0,0 +1,277 @@
+import pytest
+import numpy as np
+from scipy import sparse
+from sklearn.metrics.pairwise import cosine_similarity
+from backend.database import MusicDatabase
+from backend import ai_engine
+from backend.ai_engine import AIRecommendationEngine
+from backend.neighbor_index import (NeighborIndex, TEXT_WEIGHT, AUDIO_WEIGHT, exact_neighbors, prepare_vectors,
+                                    tile_sizes, tile_top_k)
+
+# Fixture to create an engine over a freshly seeded database
+@pytest.fixture
+def engine(tmp_path):
+    db = MusicDatabase(str(tmp_path / "engine.db"))
+    yield AIRecommendationEngine(db)
+
+def _reference_neighbors(engine, song_idx, n):
+    """Top-n neighbors from sklearn's cosine similarity over the whole catalog, independent of the index"""
+    text_sim = cosine_similarity(engine.tfidf_matrix[song_idx:song_idx + 1], engine.tfidf_matrix).ravel()
+    features = np.asarray(engine.feature_matrix)
+    audio_sim = cosine_similarity(features[song_idx:song_idx + 1], features).ravel()
+    scores = TEXT_WEIGHT * text_sim + AUDIO_WEIGHT * audio_sim
+    scores[song_idx] = -np.inf
+    order = np.argsort(-scores, kind='stable')[:n]
+    return order, scores[order]
+
+def test_index_matches_brute_force(engine):
+    """Test that indexed lookups return the brute-force neighbors"""
+    song_idx = 0
+    song_id = int(engine.songs_df.iloc[song_idx]['id'])
+    recs = engine.get_content_based_recommendations(song_id, 5)
+    expected_idx, expected_scores = _reference_neighbors(engine, song_idx, 5)
+
+    assert [r['id'] for r in recs] == [int(engine.songs_df.iloc[i]['id']) for i in expected_idx]
+    assert np.allclose([r['similarity_score'] for r in recs], expected_scores, atol=1e-5)
+    assert song_id not in [r['id'] for r in recs]
+
+def test_large_request_falls_back_to_brute_force(engine):
+    """Test that requests larger than K still return results"""
+    recs = engine.get_content_based_recommendations(1, engine.neighbor_index.k + 5)
+    assert len(recs) == len(engine.songs_df) - 1
+
+def test_short_lsh_lists_fall_back_to_exact(tmp_path):
+    """Test that songs in sparse LSH buckets still get n exact neighbors"""
+    engine = AIRecommendationEngine(MusicDatabase(str(tmp_path / "lsh.db")), neighbor_method='lsh')
+    short = [row for row in range(len(engine.catalog)) if len(engine.neighbor_index.neighbors(row)[0]) < 5]
+    assert short
+    song_id = int(engine.catalog.ids[short[0]])
+    expected_idx, _ = _reference_neighbors(engine, short[0], 5)
+    recs = engine.get_content_based_recommendations(song_id, 5)
+    assert [r['id'] for r in recs] == engine.catalog.ids[expected_idx].tolist()
+
+def test_index_report(engine):
+    """Test build time and recall reporting"""
+    report = engine.get_neighbor_index_report()
+    assert report['method'] == 'exact'
+    assert report['build_seconds'] >= 0
+    assert report['recall'] == pytest.approx(1.0)
+
+def test_lsh_index_recall():
+    """Test the approximate index on a clustered synthetic catalog"""
+    rng = np.random.default_rng(1)
+    centers = rng.standard_normal((20, 5))
+    features = np.repeat(centers, 50, axis=0) + 0.05 * rng.standard_normal((1000, 5))
+    text = np.zeros((1000, 1))
+
+    index = NeighborIndex(k=10, method='lsh', n_planes=6, n_tables=6).build(text, features)
+    assert index.indices.shape == (1000, 10)
+    assert index.measure_recall(100) > 0.8
+
+def test_artifact_skips_refit(tmp_path, monkeypatch):
+    """Test that a saved artifact is reused until the catalog changes"""
+    db = MusicDatabase(str(tmp_path / "artifact.db"))
+    artifact_dir = str(tmp_path / "artifacts")
+    first = AIRecommendationEngine(db, artifact_dir=artifact_dir)
+    expected = first.get_content_based_recommendations(1, 5)
+
+    fits = []
+    original_fit = AIRecommendationEngine._fit_models
+    monkeypatch.setattr(AIRecommendationEngine, '_fit_models',
+                        lambda self: (fits.append(1), original_fit(self)))
+    second = AIRecommendationEngine(db, artifact_dir=artifact_dir)
+    assert fits == []
+    assert isinstance(second.feature_matrix, np.memmap)
+    assert second.get_content_based_recommendations(1, 5) == expected
+
+    path = tmp_path / "more.csv"
+    path.write_text("title,artist,genre,year,popularity\nNew Song,New Artist,Jazz,2020,50\n")
+    db.import_songs(str(path))
+    third = AIRecommendationEngine(db, artifact_dir=artifact_dir)
+    assert fits == [1]
+    assert len(third.songs_df) == 21
+
+def test_new_artifact_leaves_mapped_one_intact(tmp_path):
+    """Test that saving a new artifact does not rewrite files another engine has mapped"""
+    db = MusicDatabase(str(tmp_path / "mapped.db"))
+    artifact_dir = str(tmp_path / "artifacts")
+    AIRecommendationEngine(db, artifact_dir=artifact_dir)
+    mapped = AIRecommendationEngine(db, artifact_dir=artifact_dir, cache_size=0)
+    expected = mapped.get_content_based_recommendations(5, 5)
+
+    path = tmp_path / "more.csv"
+    path.write_text("title,artist,genre,year,popularity\n" +
+                    "".join(f"Song {i},Artist {i},Jazz,2000,{i % 90}\n" for i in range(300)))
+    db.import_songs(str(path))
+    AIRecommendationEngine(db, artifact_dir=artifact_dir)
+    assert mapped.neighbor_index.indices.max() < len(mapped.catalog)
+    assert mapped.get_content_based_recommendations(5, 5) == expected
+
+def test_incremental_add_and_remove(engine, monkeypatch):
+    """Test that added/removed songs update neighbors like a brute-force scan"""
+    monkeypatch.setattr(engine, '_maybe_refit', lambda: None)
+    new_ids = engine.add_songs([
+        {'title': 'Another Rhapsody', 'artist': 'Queen', 'genre': 'Rock', 'year': 1975,
+         'energy': 0.8, 'danceability': 0.3, 'valence': 0.7, 'acousticness': 0.1, 'popularity': 94},
+    ])
+    assert len(engine.songs_df) == 21
+    assert engine.feature_matrix.shape[0] == engine.tfidf_matrix.shape[0] == 21
+    assert new_ids[0] in [r['id'] for r in engine.get_content_based_recommendations(1, 3)]
+
+    for song_idx in range(len(engine.songs_df)):
+        expected_idx, _ = _reference_neighbors(engine, song_idx, 5)
+        assert set(engine.neighbor_index.neighbors(song_idx, 5)[0]) == set(expected_idx)
+
+    engine.remove_songs([1])
+    assert 1 not in engine.songs_df['id'].values
+    for song_idx in range(len(engine.songs_df)):
+        expected_idx, _ = _reference_neighbors(engine, song_idx, 5)
+        assert set(engine.neighbor_index.neighbors(song_idx, 5)[0]) == set(expected_idx)
+
+def test_updates_swap_in_a_new_state(engine, monkeypatch):
+    """Test that add/remove leave the state a reader holds untouched"""
+    monkeypatch.setattr(engine, '_maybe_refit', lambda: None)
+    before = engine.state
+    indices = before.neighbor_index.indices.copy()
+    engine.remove_songs([1, 2])
+    engine.add_songs([{'title': 'Another Rhapsody', 'artist': 'Queen', 'genre': 'Rock', 'year': 1975,
+                       'popularity': 94}])
+
+    assert len(before.catalog) == before.tfidf_matrix.shape[0] == before.feature_matrix.shape[0] == 20
+    assert np.array_equal(before.neighbor_index.indices, indices)
+    after = engine.state
+    assert after is not before
+    assert len(after.catalog) == after.tfidf_matrix.shape[0] == after.neighbor_index.indices.shape[0] == 19
+
+def test_raced_refit_gives_up(engine, monkeypatch):
+    """Test that a refit outpaced by catalog updates stops after MAX_REFIT_ATTEMPTS"""
+    versions = iter(range(1000))
+    monkeypatch.setattr(engine.db, 'get_catalog_version', lambda: f"raced-{next(versions)}")
+    before = engine.state
+    engine._background_refit()
+    assert engine.state is before
+    assert next(versions) == 2 * ai_engine.MAX_REFIT_ATTEMPTS
+
+def test_emptied_catalog_refits_on_add(engine):
+    """Test that songs added after removing every song get freshly fitted models"""
+    engine.remove_songs(engine.catalog.ids.tolist())
+    assert engine.tfidf is None and engine.get_content_based_recommendations(1, 3) == []
+    new_ids = engine.add_songs([{'title': f'Track {i}', 'artist': 'Queen', 'genre': 'Rock', 'year': 1975 + i,
+                                 'energy': 0.1 * i, 'popularity': 50} for i in range(4)])
+    assert engine.feature_matrix.shape[0] == engine.tfidf_matrix.shape[0] == len(engine.catalog) == 4
+    assert len(engine.get_content_based_recommendations(new_ids[0], 3)) == 3
+
+def test_drift_triggers_background_refit(engine):
+    """Test that out-of-vocabulary additions trigger a full refit"""
+    engine.add_songs([{'title': f'Track {i}', 'artist': f'Zyx Qua{i}', 'genre': 'Vaporwave',
+                       'year': 2030, 'popularity': 10} for i in range(5)])
+    assert engine.get_drift()['oov_rate'] > 0.2
+    engine.wait_for_refit(timeout=30)
+    assert 'vaporwave' in engine.tfidf.vocabulary_
+    assert engine.get_drift()['oov_rate'] == 0.0
+    assert len(engine.songs_df) == 25
+
+def test_taste_vector_updates_incrementally(engine):
+    """Test that add_rating keeps the stored taste vector equal to a full rebuild"""
+    engine.db.add_rating("taste_user", 1, 5)
+    engine.db.add_rating("taste_user", 3, 4)
+    engine.db.add_rating("taste_user", 3, 2)
+    engine.db.add_rating("taste_user", 12, 4)
+
+    stored = engine.db.get_user_taste("taste_user")
+    rebuilt = engine.profiles.rebuild("taste_user")
+    assert stored['weight'] == rebuilt['weight'] == 3
+    assert np.allclose(stored['text_vector'], rebuilt['text_vector'], atol=1e-6)
+    assert np.allclose(stored['audio_vector'], rebuilt['audio_vector'], atol=1e-6)
+
+def test_engines_sharing_a_database(engine):
+    """Test that a second engine does not fold ratings in twice and detaches on close"""
+    second = AIRecommendationEngine(engine.db)
+    engine.db.add_rating("shared", 1, 5)
+    engine.db.add_rating("shared", 3, 4)
+    assert engine.db.get_user_taste("shared")['weight'] == engine.profiles.rebuild("shared")['weight'] == 3
+
+    engine.close()
+    engine.db.add_rating("shared", 12, 5)
+    assert engine.db.get_user_taste("shared")['weight'] == second.profiles.rebuild("shared")['weight'] == 5
+    second.close()
+    assert not engine.db._rating_listeners and not engine.db._committed_rating_listeners
+    assert not engine.db._catalog_listeners and not engine.db._import_listeners
+
+def test_hybrid_recommendations_use_taste_vector(engine):
+    """Test personal recommendations exclude rated songs and fall back to popular"""
+    assert engine.get_hybrid_recommendations("nobody", 3) == engine.get_popular_recommendations(3)
+
+    engine.db.add_rating("fan", 1, 5)
+    engine.db.add_rating("fan", 2, 1)
+    recs = engine.get_hybrid_recommendations("fan", 8)
+    assert len(recs) == 8
+    assert not {1, 2} & {r['id'] for r in recs}
+    scores = [r['similarity_score'] for r in recs]
+    assert scores == sorted(scores, reverse=True)
+
+def test_tiled_exact_neighbors_match_full_scoring():
+    """Test that column tiles, row tiles and worker processes give the untiled top-K"""
+    rng = np.random.default_rng(3)
+    text, audio = prepare_vectors(sparse.random(300, 40, density=0.1, random_state=3), rng.standard_normal((300, 5)))
+    full_idx, full_scores = tile_top_k(text, audio, np.arange(300), 10, column_tile=300)
+    tiled_idx, tiled_scores = tile_top_k(text, audio, np.arange(300), 10, column_tile=7)
+    assert np.array_equal(tiled_idx, full_idx)
+    assert np.array_equal(tiled_scores, full_scores)
+    assert not (full_idx == np.arange(300)[:, None]).any()
+
+    rows, columns = tile_sizes(300, 10, memory_budget=100000, workers=2)
+    assert columns == 300 and rows * columns * 32 <= 50000
+    pooled_idx, pooled_scores = exact_neighbors(text, audio, 10, memory_budget=100000, workers=2)
+    assert np.array_equal(pooled_idx, full_idx)
+    assert np.array_equal(pooled_scores, full_scores)
+
+def test_added_rows_are_scored_within_memory_budget():
+    """Test that appending rows under a tiny tile budget matches a full build"""
+    rng = np.random.default_rng(4)
+    text = sparse.random(200, 30, density=0.1, random_state=4, format='csr')
+    audio = rng.standard_normal((200, 5))
+    full = NeighborIndex(k=8, method='exact').build(text, audio)
+    grown = NeighborIndex(k=8, method='exact', memory_budget=1).build(text[:150], audio[:150])
+    grown.add_rows(text[150:], audio[150:])
+    assert np.array_equal(np.sort(grown.indices, axis=1), np.sort(full.indices, axis=1))
+    assert np.allclose(np.sort(grown.scores, axis=1), np.sort(full.scores, axis=1), atol=1e-6)
+
+def test_brute_force_fallback_respects_memory_budget(tmp_path):
+    """Test that requests beyond K are answered exactly under a tiny tile budget"""
+    db = MusicDatabase(str(tmp_path / "budget.db"))
+    engine = AIRecommendationEngine(db, neighbor_k=3, neighbor_memory_budget=1, cache_size=0)
+    unbounded = AIRecommendationEngine(db, cache_size=0)
+    recs = engine.get_content_based_recommendations(1, 8)
+    assert [r['id'] for r in recs] == [r['id'] for r in unbounded.get_content_based_recommendations(1, 8)]
+
+def test_hybrid_fills_request_for_heavy_raters(engine):
+    """Test that rated songs are masked out before top-K, so the list stays full"""
+    for song_id in range(1, 16):
+        engine.db.add_rating("heavy", song_id, 5 if song_id % 2 else 2)
+    recs = engine.get_hybrid_recommendations("heavy", 5)
+    assert sorted(r['id'] for r in recs) == [16, 17, 18, 19, 20]
+    assert len(engine.get_hybrid_recommendations("heavy", 10)) == 5
+
+def test_filtered_recommendations(engine):
+    """Test genre, year, energy and exclusion filters applied during retrieval"""
+    ranked = engine.get_content_based_recommendations(1, 19)
+    expected = [r['id'] for r in ranked if r['genre'] == 'Pop'][:5]
+    recs = engine.get_filtered_recommendations(5, song_id=1, genres=['pop'])
+    assert [r['id'] for r in recs] == expected
+
+    recs = engine.get_filtered_recommendations(5, song_id=1, genres=['Pop'], exclude_ids=expected[:2])
+    assert [r['id'] for r in recs] == [r['id'] for r in ranked if r['genre'] == 'Pop'][2:7]
+
+    recs = engine.get_filtered_recommendations(5, song_id=1, genres=['Pop'], exclude_ids=np.array(expected[:2]))
+    assert [r['id'] for r in recs] == [r['id'] for r in ranked if r['genre'] == 'Pop'][2:7]
+    assert len(engine.get_filtered_recommendations(3, song_id=1, exclude_ids=np.array([2, 3]))) == 3
+
+    recs = engine.get_filtered_recommendations(20, year_range=(2010, None), energy_range=(0.8, 1.0))
+    assert {r['id'] for r in recs} == {11, 12, 14, 15, 17, 18, 20}
+    assert [r['popularity'] for r in recs] == sorted((r['popularity'] for r in recs), reverse=True)
+
+    engine.db.add_rating("fan", 12, 5)
+    recs = engine.get_filtered_recommendations(3, user_id="fan", year_range=(2010, 2019))
+    assert len(recs) == 3
+    assert all(2010 <= r['year'] <= 2019 and r['id'] != 12 for r in recs)
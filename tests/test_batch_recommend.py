@@ -0,0 +1,46 @@
+import pytest
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+from batch_recommend import run_batch
+
+# Fixture to create a file database with a few rating users
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "batch.db")
+    db = MusicDatabase(path)
+    for i, user_id in enumerate(["alice", "bob", "carol"]):
+        db.add_rating(user_id, i + 1, 5)
+        db.add_rating(user_id, i + 5, 4)
+    db.add_rating("dave", 3, 2)
+    db.close()
+    return path
+
+def test_batch_matches_on_demand(db_path):
+    """Test that the batch job stores the same lists the engine computes"""
+    report = run_batch(db_path, n_recommendations=5, workers=2, chunk_size=2)
+    assert report['users_processed'] == 4
+    assert sum(stats['users'] for stats in report['workers'].values()) == 4
+
+    db = MusicDatabase(db_path)
+    engine = AIRecommendationEngine(db)
+    engine.get_collaborative_model(wait=True)
+    for user_id in ["alice", "bob", "carol"]:
+        stored = db.get_stored_recommendations(user_id, engine.catalog_version, 5)
+        expected = engine.get_hybrid_recommendations(user_id, 5)
+        assert [r['id'] for r in stored] == [r['id'] for r in expected]
+        assert [r['similarity_score'] for r in stored] == pytest.approx([r['similarity_score'] for r in expected])
+    assert db.get_stored_recommendations("dave", engine.catalog_version, 5) is None
+
+def test_batch_resumes_and_rating_invalidates(db_path):
+    """Test checkpoint resume and invalidation of a re-rating user"""
+    run_batch(db_path, workers=1, run_id="nightly")
+    report = run_batch(db_path, workers=1, run_id="nightly")
+    assert report['users_processed'] == 0
+    assert report['users_skipped'] == 4
+
+    db = MusicDatabase(db_path)
+    version = db.get_catalog_version()
+    assert db.get_stored_recommendations("alice", version) is not None
+    db.add_rating("alice", 10, 5)
+    assert db.get_stored_recommendations("alice", version) is None
+    assert db.get_stored_recommendations("bob", version) is not None
@@ -0,0 +1,42 @@
+import json
+import numpy as np
+from benchmarks.synthetic import generate_songs, generate_ratings
+from benchmarks.run import BASELINE, main, run_size, compare_results
+
+def test_generators_are_deterministic():
+    """Test that the same seed yields the same catalog and one rating per (user, song)"""
+    first, second = generate_songs(500, seed=3), generate_songs(500, seed=3)
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+    assert len(first[0]) == 500
+    assert first[9].min() >= 0 and first[9].max() <= 100
+
+    users, songs, ratings = generate_ratings(np.arange(1, 501), 50, 20, seed=3)
+    pairs = set(zip(users.tolist(), songs.tolist()))
+    assert len(pairs) == len(users)
+    assert ratings.min() >= 1 and ratings.max() <= 5
+
+def test_run_size_and_compare(tmp_path):
+    """Test a small benchmark run and the regression check against it"""
+    run = run_size(str(tmp_path), 300, 30, ratings_per_user=10, repeat=2, heavy_repeat=1)
+    assert run['benchmarks']['engine.get_hybrid_recommendations']['runs'] == 2
+    assert 'p95' in run['benchmarks']['db.get_all_songs']
+
+    baseline = {'results': {'300': run}}
+    assert compare_results({'results': {'300': run}}, baseline) == []
+    slower = {'results': {'300': {'benchmarks': {
+        name: dict(stats, p50=stats['p50'] * 3 + 0.01) for name, stats in run['benchmarks'].items()}}}}
+    regressed = {r['benchmark'] for r in compare_results(slower, baseline, overrides={'engine.init': 10.0})}
+    assert 'engine.load_data' in regressed
+    assert 'engine.init' not in regressed
+
+def test_committed_baseline_is_the_default(tmp_path, capsys):
+    """Test that the committed baseline covers the default sizes and a missing one is skipped"""
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    assert set(baseline['results']) == {'1000', '10000'}
+    assert 'engine.get_hybrid_recommendations' in baseline['results']['1000']['benchmarks']
+
+    args = ['--sizes', '300', '--users', '30', '--repeat', '1', '--heavy-repeat', '1',
+            '--output', str(tmp_path / "out.json"), '--baseline', str(tmp_path / "missing.json")]
+    assert main(args) == 0
+    assert "skipping the comparison" in capsys.readouterr().out
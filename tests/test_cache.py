@@ -0,0 +1,83 @@
+import pytest
+from backend.cache import ResultCache
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    """Test the size bound, recency order and expiry"""
+    now = [100.0]
+    monkeypatch.setattr('backend.cache.time.monotonic', lambda: now[0])
+    cache = ResultCache(max_entries=2, ttl_seconds=10)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.put('c', 3)
+    assert cache.get('b') == (False, None)
+    now[0] += 11
+    assert cache.get('a') == (False, None)
+
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['expirations'] == 1
+    assert stats['hits'] == 1
+
+def test_stale_put_after_invalidation_is_dropped():
+    """Test that a result computed before an invalidation is not cached"""
+    cache = ResultCache()
+    generation = cache.generation('u1')
+    cache.invalidate_user('u1')
+    cache.put('k', 1, 'u1', generation)
+    assert cache.get('k') == (False, None)
+
+@pytest.fixture
+def engine(tmp_path):
+    return AIRecommendationEngine(MusicDatabase(str(tmp_path / "cache.db")))
+
+def test_engine_results_are_cached(engine):
+    """Test repeated calls hit the cache and return independent copies"""
+    first = engine.get_genre_based_recommendations(['Rock'], 3)
+    first[0]['title'] = 'changed'
+    second = engine.get_genre_based_recommendations(preferred_genres=['Rock'], n_recommendations=3)
+    assert second[0]['title'] != 'changed'
+    assert engine.cache.stats()['hits'] == 1
+
+def test_rating_invalidates_only_that_user(engine):
+    """Test add_rating drops the rating user's entries and keeps everyone else's"""
+    engine.db.add_rating("alice", 1, 5)
+    engine.db.add_rating("bob", 2, 5)
+    alice_before = engine.get_hybrid_recommendations("alice", 5)
+    engine.get_hybrid_recommendations("bob", 5)
+    engine.get_popular_recommendations(5)
+
+    engine.db.add_rating("alice", alice_before[0]['id'], 5)
+    hits = engine.cache.stats()['hits']
+    engine.get_hybrid_recommendations("bob", 5)
+    engine.get_popular_recommendations(5)
+    assert engine.cache.stats()['hits'] == hits + 2
+    alice_after = engine.get_hybrid_recommendations("alice", 5)
+    assert alice_before[0]['id'] not in [r['id'] for r in alice_after]
+
+def test_rating_import_invalidates_imported_users(engine, tmp_path):
+    """Test that a bulk rating import refreshes its users' cached results and counts toward a CF refit"""
+    # A collaborative refit is a new data version for every user; keep it out of the hit counts
+    engine.cf_weight = 0
+    engine.db.add_rating("alice", 1, 5)
+    before = engine.get_hybrid_recommendations("alice", 5)
+    bob = engine.get_hybrid_recommendations("bob", 5)
+    new_ratings = engine._cf_new_ratings
+    path = tmp_path / "ratings.csv"
+    path.write_text(f"user_id,song_id,rating\nalice,{before[0]['id']},5\ncarol,2,4\n")
+    engine.db.import_ratings(str(path))
+
+    assert engine._cf_new_ratings == new_ratings + 2
+    assert before[0]['id'] not in [r['id'] for r in engine.get_hybrid_recommendations("alice", 5)]
+    hits = engine.cache.stats()['hits']
+    assert engine.get_hybrid_recommendations("bob", 5) == bob
+    assert engine.cache.stats()['hits'] == hits + 1
+
+def test_catalog_change_clears_cache(engine):
+    """Test catalog writes invalidate every entry"""
+    engine.get_popular_recommendations(5)
+    engine.add_songs([{'title': 'Chart Topper', 'artist': 'Queen', 'genre': 'Rock', 'year': 2024, 'popularity': 100}])
+    assert engine.cache.stats()['size'] == 0
+    assert engine.get_popular_recommendations(1)[0]['title'] == 'Chart Topper'
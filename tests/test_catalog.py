@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from backend.catalog import Catalog
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+def _frame():
+    return pd.DataFrame({
+        'id': [10, 20, 30],
+        'title': ['A', 'B', 'C'],
+        'artist': ['X', 'Y', 'Z'],
+        'genre': ['Rock', 'Pop', 'Rock'],
+        'year': [1990, None, 2001],
+        'popularity': [50, 70, 60],
+    })
+
+def test_lookup_and_records():
+    """Test id lookups and column-wise result building"""
+    catalog = Catalog(_frame(), 'v1')
+    assert catalog.row_of(20) == 1
+    assert catalog.row_of(99) is None
+    assert catalog.rows_for_ids([30, 99, 10]).tolist() == [2, -1, 0]
+
+    records = catalog.records([2, 1], {'similarity_score': np.array([0.5, 0.25])}, with_popularity=True)
+    assert records == [
+        {'id': 30, 'title': 'C', 'artist': 'Z', 'genre': 'Rock', 'year': 2001, 'popularity': 60,
+         'similarity_score': 0.5},
+        {'id': 20, 'title': 'B', 'artist': 'Y', 'genre': 'Pop', 'year': None, 'popularity': 70,
+         'similarity_score': 0.25},
+    ]
+    assert catalog.display_labels()[1] == "B - Y (Pop, )"
+
+def test_append_and_remove_keep_index_consistent():
+    """Test that derived catalogs index their own rows and leave the original intact"""
+    catalog = Catalog(_frame(), 'v1')
+    extra = pd.DataFrame({'id': [40], 'title': ['D'], 'artist': ['W'], 'genre': ['Jazz'],
+                          'year': [1960], 'popularity': [10]})
+    grown = catalog.appended(Catalog(extra), 'v2')
+    assert grown.row_of(40) == 3
+    assert catalog.row_of(40) is None
+
+    shrunk = grown.without_rows(np.array([True, False, False, False]), 'v3')
+    assert shrunk.row_of(10) is None
+    assert shrunk.row_of(40) == 2
+    assert shrunk.records([2])[0]['title'] == 'D'
+
+def test_engine_reuses_shared_catalog(tmp_path):
+    """Test that the engine adopts a current catalog instead of re-reading the songs"""
+    db = MusicDatabase(str(tmp_path / "catalog.db"))
+    catalog = Catalog.load(db)
+    engine = AIRecommendationEngine(db, catalog=catalog)
+    assert engine.catalog is catalog
+
+    db.add_songs([{'title': 'New', 'artist': 'Someone', 'genre': 'Rock', 'year': 2020,
+                   'energy': 0.5, 'danceability': 0.5, 'valence': 0.5, 'acousticness': 0.5,
+                   'popularity': 50}])
+    stale = AIRecommendationEngine(db, catalog=catalog)
+    assert stale.catalog is not catalog
+    assert len(stale.catalog) == len(catalog) + 1
+
+def test_compact_catalog_matches_full():
+    """Test that a compact catalog builds the same records with narrower columns"""
+    full = Catalog(_frame(), 'v1')
+    compact = Catalog(_frame(), 'v1', compact=True)
+    assert compact.frame is None
+    assert compact.ids.dtype == np.int32 and compact.audio.dtype == np.float32
+    assert compact.records([0, 1, 2], with_popularity=True) == full.records([0, 1, 2], with_popularity=True)
+    assert compact.text_features() == full.text_features() == ['Rock X 1990', 'Pop Y ', 'Rock Z 2001']
+    assert sum(compact.memory_usage().values()) < sum(full.memory_usage().values())
+
+    grown = compact.appended(Catalog(_frame().assign(id=[40, 50, 60]), compact=True), 'v2')
+    assert grown.ids.dtype == np.int32
+    assert grown.records([3])[0] == {'id': 40, 'title': 'A', 'artist': 'X', 'genre': 'Rock', 'year': 1990}
+
+def test_compact_engine_matches_full_engine(tmp_path):
+    """Test that float32 models give the same recommendations in less memory"""
+    db = MusicDatabase(str(tmp_path / "compact.db"))
+    full = AIRecommendationEngine(db, cache_size=0)
+    compact = AIRecommendationEngine(db, cache_size=0, compact=True)
+    assert compact.feature_matrix.dtype == np.float32
+    for song_id in (1, 5, 12):
+        expected = full.get_content_based_recommendations(song_id, 5)
+        assert [r['id'] for r in compact.get_content_based_recommendations(song_id, 5)] == [r['id'] for r in expected]
+    assert compact.get_genre_based_recommendations(['Rock'], 3) == full.get_genre_based_recommendations(['Rock'], 3)
+
+    full_report, compact_report = full.get_memory_report(), compact.get_memory_report()
+    assert compact_report['catalog.frame'] == 0
+    assert compact_report['total'] < full_report['total']
+
+def test_compact_artifact_keeps_float32_after_add(tmp_path):
+    """Test that a compact engine maps its artifact without RAM copies and transforms new songs to float32"""
+    db = MusicDatabase(str(tmp_path / "compact_artifact.db"))
+    artifact_dir = str(tmp_path / "artifacts")
+    AIRecommendationEngine(db, artifact_dir=artifact_dir, compact=True)
+    engine = AIRecommendationEngine(db, artifact_dir=artifact_dir, compact=True)
+    assert isinstance(engine.feature_matrix, np.memmap)
+    assert isinstance(engine.neighbor_index.audio_vectors, np.memmap)
+    report = engine.get_memory_report()
+    assert report['mapped'] == report['tfidf_matrix'] + report['feature_matrix'] + report['neighbor_index']
+    engine.add_songs([{'title': 'New', 'artist': 'Queen', 'genre': 'Rock', 'year': 1980, 'popularity': 70}])
+    assert engine.tfidf_matrix.dtype == engine.feature_matrix.dtype == np.float32
+    assert engine.neighbor_index._text.dtype == engine.neighbor_index._audio.dtype == np.float32
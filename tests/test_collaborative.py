@@ -0,0 +1,98 @@
+import threading
+import time
+import numpy as np
+from scipy import sparse
+from backend.collaborative import ItemItemCF, ImplicitALS, build_rating_matrix
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+def _two_taste_groups(n_users=40):
+    """Users in group A love items 0-4 and dislike 5-9; group B the opposite"""
+    users, items, ratings = [], [], []
+    for user in range(n_users):
+        liked = range(0, 5) if user % 2 == 0 else range(5, 10)
+        for item in range(10):
+            if (user + item) % 3 == 0:
+                continue
+            users.append(user)
+            items.append(item)
+            ratings.append(5 if item in liked else 1)
+    return build_rating_matrix(np.array(users), np.array(items), np.array(ratings), n_users, 10)
+
+def test_item_item_similarity_stays_sparse_and_pruned():
+    """Test top-K pruning and that similar items come from the same taste group"""
+    ratings = _two_taste_groups()
+    model = ItemItemCF(k=3, block_size=4).fit(ratings)
+    assert sparse.issparse(model.similarity)
+    assert np.diff(model.similarity.indptr).max() <= 3
+    assert model.similarity.diagonal().sum() == 0
+    assert set(model.similarity[0].indices) <= set(range(1, 5))
+
+def test_item_item_and_als_scores_follow_the_group():
+    """Test both trainers rank the user's group items above the other group"""
+    ratings = _two_taste_groups()
+    new_user = build_rating_matrix(np.zeros(2, dtype=int), np.array([0, 1]), np.array([5, 5]), 1, 10)
+    scores = ItemItemCF(k=5).fit(ratings).score_user(new_user)
+    assert scores[2:5].min() > scores[5:10].max()
+
+    als = ImplicitALS(factors=4, iterations=5).fit(ratings)
+    scores = als.score_user(0)
+    assert scores[0:5].mean() > scores[5:10].mean()
+
+def test_engine_collaborative_recommendations(tmp_path):
+    """Test the engine method excludes rated songs and only returns supported ones"""
+    db = MusicDatabase(str(tmp_path / "cf.db"))
+    for i in range(6):
+        db.add_rating(f"user{i}", 1, 5)
+        db.add_rating(f"user{i}", 2, 5)
+        db.add_rating(f"user{i}", 3, 1)
+    engine = AIRecommendationEngine(db)
+    db.add_rating("newbie", 1, 5)
+    engine.get_collaborative_model(wait=True)
+
+    recs = engine.get_collaborative_recommendations("newbie", 5)
+    assert [r['id'] for r in recs] == [2]
+    assert engine.get_collaborative_recommendations("stranger", 5) == []
+
+def test_concurrent_requests_share_one_refit(tmp_path, monkeypatch):
+    """Test that threads finding a stale collaborative model start a single background fit"""
+    db = MusicDatabase(str(tmp_path / "cf_lock.db"))
+    for i in range(4):
+        db.add_rating(f"user{i}", i + 1, 5)
+    engine = AIRecommendationEngine(db)
+    fits = []
+    original_fit = ItemItemCF.fit
+    monkeypatch.setattr(ItemItemCF, 'fit', lambda self, matrix: (fits.append(1), time.sleep(0.2),
+                                                                 original_fit(self, matrix))[-1])
+    threads = [threading.Thread(target=engine.get_collaborative_model) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    model, users = engine.get_collaborative_model(wait=True)
+    assert fits == [1]
+    assert model is not None and users.tolist() == ["user0", "user1", "user2", "user3"]
+
+def test_refit_runs_off_the_request_path(tmp_path, monkeypatch):
+    """Test that requests keep the current model during a refit and the cache sees the new one"""
+    db = MusicDatabase(str(tmp_path / "cf_background.db"))
+    for i in range(6):
+        db.add_rating(f"user{i}", 1, 5)
+        db.add_rating(f"user{i}", 2, 5)
+    engine = AIRecommendationEngine(db)
+    first, _ = engine.get_collaborative_model(wait=True)
+    version = engine.data_version
+
+    release = threading.Event()
+    original_fit = ItemItemCF.fit
+    monkeypatch.setattr(ItemItemCF, 'fit', lambda self, matrix: (release.wait(5), original_fit(self, matrix))[-1])
+    for i in range(6):
+        db.add_rating(f"late{i}", 3, 5)
+    start = time.perf_counter()
+    assert engine.get_collaborative_model()[0] is first
+    assert time.perf_counter() - start < 1.0 and engine.data_version == version
+
+    release.set()
+    second, users = engine.get_collaborative_model(wait=True)
+    assert second is not first and "late0" in users.tolist()
+    assert engine.data_version != version
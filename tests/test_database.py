@@ -1,7 +1,7 @@
 import pytest
 import sqlite3
 import os
-from backend.database import MusicDatabase
+from backend.database import MusicDatabase, MIGRATIONS, SELECT_USER_RATINGS, SELECT_PREVIOUS_RATING
 
 # Fixture to create a fresh database for each test
 @pytest.fixture
@@ -13,8 +13,7 @@ def test_db():
 
 def test_database_initialization(test_db):
     """Test if tables are created properly"""
-    conn = sqlite3.connect(":memory:")
-    cursor = conn.cursor()
+    cursor = test_db.connection.cursor()
     
     # Check if tables exist
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
@@ -23,7 +22,6 @@ def test_database_initialization(test_db):
     assert 'songs' in tables
     assert 'user_ratings' in tables
     assert 'user_preferences' in tables
-    conn.close()
 
 def test_seed_sample_data(test_db):
     """Test if sample data is seeded correctly"""
@@ -42,4 +40,145 @@ def test_add_and_get_ratings(test_db):
     
     assert len(ratings) == 1
     assert ratings.iloc[0]['song_id'] == 1
-    assert ratings.iloc[0]['rating'] == 5
\ No newline at end of file
+    assert ratings.iloc[0]['rating'] == 5
+
+def test_memory_database_persists_between_calls(test_db):
+    """Test that an in-memory database keeps its data across method calls"""
+    test_db.add_rating("test_user", 2, 4)
+    assert len(test_db.get_all_songs()) == 20
+    assert len(test_db.get_user_ratings("test_user")) == 1
+
+def test_transaction_rollback(test_db):
+    """Test that a failed transaction leaves no partial writes"""
+    with pytest.raises(sqlite3.IntegrityError):
+        with test_db.transaction() as conn:
+            conn.execute("INSERT INTO user_ratings (user_id, song_id, rating) VALUES ('u', 1, 3)")
+            conn.execute("INSERT INTO user_ratings (user_id, song_id, rating) VALUES ('u', 2, 9)")
+    assert len(test_db.get_user_ratings("u")) == 0
+
+def test_file_database_uses_wal(tmp_path):
+    """Test WAL journaling and per-thread connection reuse on file databases"""
+    db = MusicDatabase(str(tmp_path / "wal.db"))
+    assert db.connection.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert db.connection is db.connection
+    db.close()
+
+def _write_catalog(path, n_rows):
+    lines = ["title,artist,genre,year,duration,energy,danceability,valence,acousticness,popularity"]
+    for i in range(n_rows):
+        lines.append(f"Song {i},Artist {i % 7},Rock,{1990 + i % 30},200,0.5,0.5,0.5,0.5,{i % 100}")
+    path.write_text("\n".join(lines) + "\n")
+
+def test_import_songs_validates_rows(test_db, tmp_path):
+    """Test bulk import inserts valid rows and skips invalid ones"""
+    path = tmp_path / "songs.csv"
+    _write_catalog(path, 50)
+    with open(path, "a") as f:
+        f.write(",No Title,Rock,2000,200,0.5,0.5,0.5,0.5,50\n")
+        f.write("Loud,Band,Rock,2000,200,1.5,0.5,0.5,0.5,50\n")
+
+    report = test_db.import_songs(str(path), chunk_size=8)
+    assert report['rows_inserted'] == 50
+    assert report['rows_skipped'] == 2
+    assert report['rows_per_sec'] > 0
+    assert len(test_db.get_all_songs()) == 70
+
+def test_import_songs_resumes_and_rebuilds_indexes(test_db, tmp_path):
+    """Test an interrupted import resumes after the last committed chunk"""
+    test_db.connection.execute("CREATE INDEX idx_test_genre ON songs(genre)")
+    path = tmp_path / "songs.jsonl"
+    path.write_text("".join(
+        '{"title": "S%d", "artist": "A", "genre": "Pop", "popularity": 10}\n' % i for i in range(30)))
+
+    def interrupt(report):
+        if report['rows_read'] == 20:
+            raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        test_db.import_songs(str(path), chunk_size=10, progress=interrupt)
+    assert len(test_db.get_all_songs()) == 40
+
+    report = test_db.import_songs(str(path), chunk_size=10)
+    assert report['resumed_from_row'] == 20
+    assert len(test_db.get_all_songs()) == 50
+    indexes = [row[0] for row in test_db.connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'songs'")]
+    assert 'idx_test_genre' in indexes
+
+def test_rerating_updates_in_place(test_db):
+    """Test that rating a song again replaces the earlier rating"""
+    test_db.add_rating("test_user", 1, 2)
+    test_db.add_rating("test_user", 1, 5)
+    ratings = test_db.get_user_ratings("test_user")
+    assert len(ratings) == 1
+    assert ratings.iloc[0]['rating'] == 5
+
+def test_migration_dedupes_legacy_ratings(tmp_path):
+    """Test that an unversioned database is deduped and indexed on open"""
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE user_ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            song_id INTEGER,
+            rating INTEGER CHECK(rating >= 1 AND rating <= 5),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany("INSERT INTO user_ratings (user_id, song_id, rating) VALUES (?, ?, ?)",
+                     [('u', 1, 2), ('u', 1, 4), ('u', 2, 3)])
+    conn.commit()
+    conn.close()
+
+    db = MusicDatabase(path)
+    assert db.connection.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert db.get_latest_user_ratings('u') == ([1, 2], [4, 3])
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO user_ratings (user_id, song_id, rating) VALUES ('u', 1, 5)")
+    db.close()
+
+@pytest.mark.parametrize("sql, params, index", [
+    (SELECT_USER_RATINGS, ('u',), 'idx_user_ratings_user_song'),
+    (SELECT_PREVIOUS_RATING, ('u', 1), 'idx_user_ratings_user_song'),
+    ("SELECT user_id FROM user_ratings WHERE song_id = ?", (1,), 'idx_user_ratings_song'),
+    ("SELECT id FROM songs WHERE genre = ? ORDER BY popularity DESC LIMIT 10", ('Rock',),
+     'idx_songs_genre_popularity'),
+    ("SELECT id FROM songs ORDER BY popularity DESC LIMIT 10", (), 'idx_songs_popularity'),
+])
+def test_hot_queries_use_indexes(test_db, sql, params, index):
+    """Test the query plans of the hot queries"""
+    plan = " ".join(row[-1] for row in test_db.connection.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    assert index in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_reopening_current_database_skips_writes(tmp_path, monkeypatch):
+    """Test that opening an initialized, seeded database takes no write transaction"""
+    path = str(tmp_path / "reopen.db")
+    MusicDatabase(path).close()
+
+    monkeypatch.setattr(MusicDatabase, 'transaction', lambda self: pytest.fail("unexpected write"))
+    db = MusicDatabase(path)
+    assert len(db.get_all_songs()) == 20
+    db.close()
+
+def test_import_ratings_upserts_and_keeps_newest(test_db, tmp_path):
+    """Test the rating log import: upserts by timestamp, skips invalid rows, drops stale taste"""
+    test_db.add_rating("alice", 1, 2)
+    test_db.save_user_taste("alice", {'model_version': 'v', 'text_vector': [0.0], 'audio_vector': [0.0],
+                                      'weight': 1.0})
+    path = tmp_path / "ratings.csv"
+    path.write_text("user_id,song_id,rating,timestamp\n"
+                    "alice,1,5,2030-01-01T00:00:00\n"
+                    "alice,1,1,2000-01-01T00:00:00\n"
+                    "bob,2,4,1700000000\n"
+                    "bob,3,9,\n"
+                    "carol,4,3,\n")
+
+    report = test_db.import_ratings(str(path), chunk_size=2)
+    assert report['rows_inserted'] == 4
+    assert report['rows_skipped'] == 1
+    assert test_db.get_latest_user_ratings("alice") == ([1], [5])
+    assert test_db.get_latest_user_ratings("bob") == ([2], [4])
+    assert test_db.get_rated_song_ids("carol") == [4]
+    assert test_db.get_user_taste("alice") is None
@@ -0,0 +1,60 @@
+import threading
+from frontend.dispatcher import BackgroundDispatcher
+
+class FakeRoot:
+    """Stands in for tk.Tk: after() callbacks run when pump() is called"""
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def pump(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+def _wait_for(dispatcher, root, condition):
+    for _ in range(1000):
+        root.pump()
+        if condition():
+            return
+        threading.Event().wait(0.005)
+    raise AssertionError("dispatcher did not deliver in time")
+
+def test_results_delivered_on_polling_thread():
+    """Test work runs on a worker and its result is delivered via root.after"""
+    root = FakeRoot()
+    busy_changes, results = [], []
+    dispatcher = BackgroundDispatcher(root, on_busy_change=busy_changes.append)
+    dispatcher.submit('recs', threading.current_thread, results.append)
+    _wait_for(dispatcher, root, lambda: results)
+
+    assert results[0] is not threading.current_thread()
+    assert busy_changes == [True, False]
+    dispatcher.shutdown()
+
+def test_stale_results_are_dropped():
+    """Test a newer submission on a channel supersedes an older, slower one"""
+    root = FakeRoot()
+    release = threading.Event()
+    results, errors = [], []
+    dispatcher = BackgroundDispatcher(root)
+    dispatcher.submit('recs', lambda: release.wait(5) and 'old', results.append)
+    dispatcher.submit('recs', lambda: 'new', results.append)
+    dispatcher.submit('other', lambda: 1 / 0, results.append, errors.append)
+    release.set()
+    _wait_for(dispatcher, root, lambda: dispatcher._pending == 0)
+
+    assert results == ['new']
+    assert isinstance(errors[0], ZeroDivisionError)
+    dispatcher.shutdown()
+
+def test_callback_may_shut_down_dispatcher():
+    """Test that a delivered callback can close the window without a poll being rescheduled"""
+    root = FakeRoot()
+    dispatcher = BackgroundDispatcher(root)
+    dispatcher.submit('ready', lambda: 'ready', lambda result: dispatcher.shutdown())
+    dispatcher.submit('late', lambda: 'late', lambda result: None)
+    _wait_for(dispatcher, root, lambda: dispatcher._closed)
+    assert root.callbacks == []
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from backend.genre_index import GenreIndex, genre_keys
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+def test_genre_keys_normalize_names():
+    """Test case folding, punctuation and parent genres"""
+    known = {"alternative", "pop", "rock"}
+    assert genre_keys("Alternative Rock", known) == ["alternative rock", "alternative"]
+    assert genre_keys(" POP ", known) == ["pop"]
+    assert genre_keys("Hip-Hop", known) == ["hip hop"]
+    assert genre_keys("Indie Pop", known) == ["indie pop"]
+    assert genre_keys("Drum and Bass", known) == ["drum and bass"]
+    assert genre_keys("Alternative Rock") == ["alternative rock"]
+
+def test_top_rows_merges_sorted_lists():
+    """Test the k-way merge against sorting the matching rows directly"""
+    rng = np.random.default_rng(0)
+    genres = np.array(rng.choice(["Rock", "Pop", "Indie Pop", "Jazz"], 500), dtype=object)
+    popularity = rng.integers(0, 100, 500).astype(np.float64)
+    codes, names = pd.factorize(genres)
+    index = GenreIndex(codes, np.asarray(names, dtype=object), popularity)
+
+    requested = ["rock", "Indie Pop", "Rock"]
+    matching = np.flatnonzero(np.isin(genres, ["Rock", "Indie Pop"]))
+    expected = matching[np.argsort(-popularity[matching], kind='stable')][:25]
+    assert index.top_rows(requested, 25).tolist() == expected.tolist()
+    assert index.popular(3).tolist() == np.argsort(-popularity, kind='stable')[:3].tolist()
+    assert len(index.top_rows(["Metal"], 5)) == 0
+    assert "indie" not in index.postings
+
+def test_engine_genre_matching(tmp_path):
+    """Test that a parent genre also matches its compound genres"""
+    engine = AIRecommendationEngine(MusicDatabase(str(tmp_path / "genres.db")))
+    recs = engine.get_genre_based_recommendations(["alternative"], 5)
+    assert {r['title'] for r in recs} == {"Bad Guy", "Radioactive"}
+    assert [r['popularity'] for r in recs] == sorted((r['popularity'] for r in recs), reverse=True)
+
+    popular = engine.get_popular_recommendations(3)
+    assert [r['popularity'] for r in popular] == [98, 96, 95]
+    assert engine.get_genre_based_recommendations(["Polka"], 3) == popular
@@ -0,0 +1,55 @@
+import pytest
+from backend import metrics
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+# Fixture enabling a clean process-wide registry for one test
+@pytest.fixture
+def recording():
+    metrics.registry.reset()
+    metrics.enable(slow_query_seconds=0.0)
+    yield metrics.registry
+    metrics.disable()
+    metrics.registry.reset()
+    metrics.registry.slow_query_seconds = 0.1
+
+def test_engine_and_queries_are_recorded(recording, tmp_path):
+    """Test call latencies, statement timings, slow queries and load_data phases"""
+    db = MusicDatabase(str(tmp_path / "metrics.db"))
+    engine = AIRecommendationEngine(db, cache_size=0)
+    engine.get_popular_recommendations(3)
+    engine.get_popular_recommendations(3)
+    db.get_user_ratings("nobody")
+
+    data = recording.to_dict()
+    calls = data['histograms']['call']
+    assert calls['AIRecommendationEngine.get_popular_recommendations']['count'] == 2
+    assert calls['AIRecommendationEngine.load_data']['count'] == 1
+    assert {'load_data.sql_read', 'load_data.tfidf_fit', 'load_data.scaling'} <= set(data['histograms']['phase'])
+    assert any(label.startswith("SELECT * FROM songs") for label in data['histograms']['query'])
+    songs_read = next(q for q in data['slow_queries'] if q['sql'] == "SELECT * FROM songs")
+    assert songs_read['rows'] == 20
+    db.close()
+
+def test_prometheus_export(recording):
+    """Test the exposition format of histograms and error counters"""
+    class Failing:
+        @metrics.timed
+        def run(self):
+            raise ValueError("boom")
+    with pytest.raises(ValueError):
+        Failing().run()
+
+    text = recording.to_prometheus()
+    assert '# TYPE simisong_call_seconds histogram' in text
+    assert 'simisong_call_seconds_bucket{name="test_prometheus_export.<locals>.Failing.run",le="+Inf"} 1' in text
+    assert 'simisong_errors_total{name="test_prometheus_export.<locals>.Failing.run"} 1' in text
+
+def test_disabled_registry_records_nothing(tmp_path):
+    """Test that nothing is recorded and plain connections are used while disabled"""
+    metrics.registry.reset()
+    db = MusicDatabase(str(tmp_path / "off.db"))
+    AIRecommendationEngine(db, cache_size=0).get_popular_recommendations(3)
+    assert type(db.connection).__name__ == 'Connection'
+    assert metrics.registry.to_dict() == {'histograms': {}, 'counters': {}, 'slow_queries': []}
+    db.close()
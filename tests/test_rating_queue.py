@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+import time
+import pytest
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+
+# Fixture to create a file database whose ratings go through the write-behind queue
+@pytest.fixture
+def db(tmp_path):
+    db = MusicDatabase(str(tmp_path / "queue.db"))
+    yield db
+    db.close()
+
+def test_burst_is_group_committed(db):
+    """Test that queued ratings are written in one batch"""
+    queue = db.start_write_behind(max_batch=100, max_delay=0.5)
+    futures = [db.queue_rating(f"user_{i}", i % 20 + 1, 4) for i in range(30)]
+    queue.flush()
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert queue.stats()['batches'] == 1
+    assert db.get_rated_song_ids("user_29") == [10]
+
+def test_reader_sees_own_queued_rating(db):
+    """Test read-your-writes without waiting out the batch delay"""
+    db.start_write_behind(max_delay=30.0)
+    db.queue_rating("alice", 3, 5)
+    start = time.perf_counter()
+    assert db.get_rated_song_ids("alice") == [3]
+    assert time.perf_counter() - start < 5.0
+
+def test_invalid_rating_does_not_fail_its_batch(db):
+    """Test that a rejected rating fails alone"""
+    queue = db.start_write_behind(max_delay=0.5)
+    good = db.queue_rating("alice", 1, 5)
+    bad = db.queue_rating("alice", 2, 9)
+    queue.flush()
+    assert good.exception() is None
+    assert isinstance(bad.exception(), sqlite3.IntegrityError)
+    assert db.get_rated_song_ids("alice") == [1]
+
+def test_close_flushes_queued_ratings(tmp_path):
+    """Test the flush-on-shutdown guarantee"""
+    path = str(tmp_path / "shutdown.db")
+    db = MusicDatabase(path)
+    db.start_write_behind(max_delay=30.0)
+    db.queue_rating("alice", 1, 5)
+    db.queue_rating("bob", 2, 4)
+    db.close()
+
+    reopened = MusicDatabase(path)
+    assert reopened.get_rated_song_ids("alice") == [1]
+    assert reopened.get_rated_song_ids("bob") == [2]
+    reopened.close()
+
+def test_cached_results_reflect_queued_rating(db):
+    """Test that a user's cached recommendations are refreshed by their queued rating"""
+    engine = AIRecommendationEngine(db)
+    db.add_rating("alice", 1, 5)
+    before = engine.get_hybrid_recommendations("alice", 5)
+    db.start_write_behind(max_delay=30.0)
+    db.queue_rating("alice", before[0]['id'], 5)
+    after = engine.get_hybrid_recommendations("alice", 5)
+    assert before[0]['id'] not in [r['id'] for r in after]
+
+def test_synchronous_rating_after_queued_rating(db):
+    """Test that add_rating neither deadlocks on nor overtakes a user's queued rating"""
+    engine = AIRecommendationEngine(db)
+    db.start_write_behind(max_delay=30.0)
+    db.queue_rating("alice", 1, 2)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (db.add_rating("alice", 1, 5), db.add_rating("alice", 3, 4),
+                                              done.set()), daemon=True)
+    thread.start()
+    assert done.wait(10.0)
+    assert db.get_latest_user_ratings("alice") == ([1, 3], [5, 4])
+    assert engine.profiles.get("alice")['weight'] == engine.profiles.rebuild("alice")['weight'] == 3.0
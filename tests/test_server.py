@@ -0,0 +1,77 @@
+import asyncio
+import json
+from backend.database import MusicDatabase
+from backend.ai_engine import AIRecommendationEngine
+from benchmarks.load_test import request_mix, run_load, _send
+from server import RecommendationServer
+
+def _serve(tmp_path, scenario):
+    """Run scenario(server, request) against a server on a free port"""
+    engine = AIRecommendationEngine(MusicDatabase(str(tmp_path / "server.db")))
+
+    async def main():
+        server = RecommendationServer(engine, workers=2, max_concurrency=4)
+        await server.start('127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+
+        async def request(method, path, body=None):
+            status, data = await _send(reader, writer, '127.0.0.1', method, path, body)
+            return status, json.loads(data)
+        try:
+            return await scenario(server, request)
+        finally:
+            writer.close()
+            await server.close()
+    return engine, asyncio.run(main())
+
+def test_routes(tmp_path):
+    """Test each operation and the error statuses over one keep-alive connection"""
+    async def scenario(server, request):
+        status, similar = await request('GET', '/similar?song_id=1&n=3')
+        assert status == 200 and len(similar) == 3
+        status, genre = await request('GET', '/genre?genres=Rock,Pop&n=4')
+        assert status == 200 and {song['genre'] for song in genre} <= {'Rock', 'Pop'}
+        status, _ = await request('POST', '/rate', {'user_id': 'web', 'song_id': 1, 'rating': 5})
+        assert status == 200
+        status, personal = await request('GET', '/personal?user_id=web&n=5')
+        assert status == 200 and 1 not in [song['id'] for song in personal]
+        assert (await request('GET', '/popular?n=0'))[0] == 400
+        assert (await request('GET', '/similar?song_id=999'))[0] == 404
+        assert (await request('POST', '/rate', {'user_id': 'web', 'song_id': 1, 'rating': 9}))[0] == 400
+        assert (await request('GET', '/rate'))[0] == 405
+        assert (await request('GET', '/nowhere'))[0] == 404
+    engine, _ = _serve(tmp_path, scenario)
+    assert engine.db.get_latest_user_ratings('web') == ([1], [5])
+
+def test_load_generator(tmp_path):
+    """Test concurrent clients with a share of writes"""
+    requests = request_mix(200, write_ratio=0.2, seed=1)
+    writes = {(body['user_id'], body['song_id']) for method, _, body in requests if method == 'POST'}
+
+    async def scenario(server, request):
+        return await run_load('127.0.0.1', server.port, requests, concurrency=16)
+    engine, report = _serve(tmp_path, scenario)
+    assert report['requests'] == 200
+    assert report['errors'] == 0
+    assert report['requests_per_sec'] > 0
+    stored = sum(len(engine.db.get_latest_user_ratings(user_id)[0]) for user_id in {u for u, _ in writes})
+    assert stored == len(writes)
+
+def test_malformed_requests_and_internal_errors(tmp_path, monkeypatch):
+    """Test 400s for bad headers and a generic 500 body that hides the exception"""
+    async def raw(server, data):
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        writer.write(data)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        writer.close()
+        return status
+
+    async def scenario(server, request):
+        assert await raw(server, b"GET /popular HTTP/1.1\r\nContent-Length: -5\r\n\r\n") == 400
+        assert await raw(server, b"GET /popular HTTP/1.1\r\nX-Long: " + b"a" * 100000 + b"\r\n\r\n") == 400
+        monkeypatch.setattr(server.engine, 'get_popular_recommendations',
+                            lambda n: (_ for _ in ()).throw(RuntimeError("secret detail")))
+        return await request('GET', '/popular?n=3')
+    _, (status, payload) = _serve(tmp_path, scenario)
+    assert status == 500 and 'secret' not in payload['error']
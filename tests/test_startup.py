@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+import main
+from backend import metrics
+
+def test_gui_import_defers_heavy_modules():
+    """Test that the window can open before pandas, scikit-learn and the engine are imported"""
+    code = ("import sys, main, frontend.gui; "
+            "print(sorted(m for m in ('pandas', 'sklearn', 'scipy', 'backend.ai_engine') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(main.__file__)))
+    assert result.stdout.strip() == "[]"
+
+def test_startup_report_lists_stages_in_order():
+    """Test the --profile-startup report"""
+    metrics.registry.reset()
+    metrics.enable()
+    try:
+        for stage in ('startup.engine', 'startup.window', 'load_data.tfidf_fit'):
+            with metrics.phase(stage):
+                pass
+        report = main.startup_report(1.5)
+    finally:
+        metrics.disable()
+        metrics.registry.reset()
+
+    names = [line.split()[0] for line in report.splitlines()[1:]]
+    assert names == ['startup.window', 'startup.engine', 'load_data.tfidf_fit', 'ready']
+    assert report.splitlines()[-1].endswith("1500.0 ms")